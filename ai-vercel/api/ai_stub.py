@@ -2,27 +2,202 @@ import re
 import json
 import os
 import csv
+import time
+import tempfile
+import threading
+from collections import namedtuple
 from typing import List, Dict
 
+from api import metrics
+
 INTENT_LIST = [
     "cari_rekomendasi_paket","estimasi_budget","cari_venue","tanya_kemungkinan","cari_dekor","cari_vendor","cari_catering"
 ]
 
 _initialized = False
 _init_started = False
-_dataset_rows: List[Dict] = []
-_vocab: Dict[str, int] = {}
-_doc_vectors: List[List[int]] = []
-_clusters: Dict[int, List[int]] = {}
-_centroids: List[List[float]] = []
+# Dataset rows, token vocabulary, dense count vectors, k-means clusters
+# (centroid -> row indices) and centroids. Built once and then only ever
+# replaced as a whole, so readers take one reference and see a consistent set.
+RetrievalIndex = namedtuple('RetrievalIndex', 'rows vocab vectors clusters centroids')
+_index = RetrievalIndex([], {}, [], {}, [])
 _sk_model = None
 _sk_model_loaded = False
+_student_model = None
 _init_thread = None
+# incremental model versions published by tools/update_intent.py
+_model_version = None
+_manifest_path = None
+_manifest_mtime = None
+_manifest_checked = 0.0
+_base_rows = 0
+_reload_lock = threading.Lock()
+_RELOAD_INTERVAL_S = float(os.environ.get('AI_STUB_RELOAD_S', '30'))
+# init progress, mirrored to a JSON file so api/health.py can answer readiness
+# without importing this module (or sklearn/torch)
+STATE_PATH = os.environ.get('AI_STUB_STATE_PATH', os.path.join(tempfile.gettempdir(), 'ai_stub_state.json'))
+_state = {'phase': 'not_started', 'phases_s': {}}
+_phase_t0 = None
+# predict()'s confidence for the keyword fallback: a fixed, low prior so
+# callers that gate on confidence (api/cascade.py) treat it as a guess
+KEYWORD_FALLBACK_CONFIDENCE = 0.2
+# k-means at init is fitted on at most this many dataset rows
+_KMEANS_SAMPLE = int(os.environ.get('AI_STUB_KMEANS_SAMPLE', '5000'))
+
+def _write_state():
+    try:
+        tmp = f'{STATE_PATH}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(_state, f)
+        os.replace(tmp, STATE_PATH)
+    except Exception:
+        pass
+
+def _set_phase(phase, **extra):
+    """Close the current init phase (recording its duration) and start `phase`."""
+    global _phase_t0
+    now = time.time()
+    prev = _state['phase']
+    if _phase_t0 is not None and prev not in ('not_started', 'ready'):
+        _state['phases_s'][prev] = round(now - _phase_t0, 4)
+    _phase_t0 = now
+    _state.update(extra)
+    _state.update({'phase': phase, 'updated': now, 'pid': os.getpid()})
+    _write_state()
+
+def init_state():
+    return json.loads(json.dumps(_state))
+
+def _manifest_candidates():
+    return [
+        os.environ.get('AI_STUB_MANIFEST'),
+        os.path.join(os.path.dirname(__file__), '..', 'models', 'intent_manifest.json'),
+        os.path.join(os.path.dirname(__file__), '..', '..', 'models', 'intent_manifest.json'),
+        os.path.join(os.getcwd(), 'models', 'intent_manifest.json'),
+    ]
+
+def _nearest_centroid(vec, centroids):
+    best_ci = None
+    best_d = None
+    for ci, c in enumerate(centroids):
+        d = 0.0
+        for a, b in zip(vec, c):
+            diff = a - b
+            d += diff * diff
+        if best_d is None or d < best_d:
+            best_d = d
+            best_ci = ci
+    return best_ci
+
+def index_without(texts) -> RetrievalIndex:
+    """The current retrieval index minus the rows whose text is in `texts`.
+
+    Used to score held-out queries (api/cascade.py calibration) without the
+    dataset match finding the query itself; centroids are kept as they are.
+    """
+    index = _index
+    drop = {t.strip() for t in texts}
+    keep = [i for i, r in enumerate(index.rows) if (r.get('text') or '').strip() not in drop]
+    remap = {old: new for new, old in enumerate(keep)}
+    clusters = {ci: [remap[i] for i in members if i in remap] for ci, members in index.clusters.items()}
+    return RetrievalIndex([index.rows[i] for i in keep], index.vocab, [index.vectors[i] for i in keep], clusters, index.centroids)
+
+def _apply_manifest(path):
+    """Load the model and extra retrieval rows a manifest points to.
+
+    Extra rows are vectorized over the existing vocabulary and assigned to
+    their nearest k-means centroid, so the retrieval index grows without
+    re-clustering. The new index replaces the old one in a single assignment.
+    """
+    global _sk_model, _sk_model_loaded, _model_version, _manifest_path, _index
+    import joblib
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    root = os.path.dirname(path)
+    model = joblib.load(os.path.join(root, manifest['model']))
+    base = _index
+    vocab = base.vocab
+    rows = base.rows[:_base_rows]
+    vectors = base.vectors[:_base_rows]
+    clusters = {ci: [i for i in members if i < _base_rows] for ci, members in base.clusters.items()}
+    extra_path = manifest.get('retrieval_extra') and os.path.join(root, manifest['retrieval_extra'])
+    if extra_path and os.path.exists(extra_path):
+        V = len(vocab)
+        with open(extra_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue
+                text = (r.get('text') or '').strip()
+                if not text:
+                    continue
+                norm = re.sub(r'[^0-9a-zA-Z\\s]', ' ', text.lower()).strip()
+                r['_norm'] = norm
+                r['_tokens'] = [t for t in norm.split() if t]
+                vec = [0] * V
+                for t in r['_tokens']:
+                    if t in vocab:
+                        vec[vocab[t]] += 1
+                rows.append(r)
+                vectors.append(vec)
+                if base.centroids:
+                    ci = _nearest_centroid(vec, base.centroids)
+                    if ci is not None:
+                        clusters.setdefault(ci, []).append(len(rows) - 1)
+    _index = RetrievalIndex(rows, vocab, vectors, clusters, base.centroids)
+    _sk_model = model
+    _sk_model_loaded = True
+    _model_version = manifest.get('name') or str(manifest.get('version'))
+    _manifest_path = path
+
+def maybe_reload():
+    """Switch to a newly published manifest version, if any.
+
+    Checked at most every AI_STUB_RELOAD_S seconds (a stat call); returns
+    True when a new version was loaded.
+    """
+    global _manifest_checked, _manifest_mtime
+    if not _initialized:
+        return False
+    now = time.time()
+    if now - _manifest_checked < _RELOAD_INTERVAL_S:
+        return False
+    _manifest_checked = now
+    path = _manifest_path or next((p for p in _manifest_candidates() if p and os.path.exists(p)), None)
+    if not path:
+        return False
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+    if mtime == _manifest_mtime:
+        return False
+    with _reload_lock:
+        if mtime == _manifest_mtime:
+            return False
+        # remember the mtime even on failure so a bad version is not retried per request
+        _manifest_mtime = mtime
+        try:
+            _apply_manifest(path)
+        except Exception:
+            return False
+        _state.update({'last_reload': time.time(), 'model_version': _model_version, 'retrieval_rows': len(_index.rows)})
+        _write_state()
+        return True
+
+def model_version():
+    return _model_version
 
 def _do_init():
-    global _initialized, _dataset_rows, _vocab, _doc_vectors, _clusters, _centroids, _sk_model, _sk_model_loaded
+    global _initialized, _index, _sk_model, _sk_model_loaded, _student_model
+    global _base_rows, _model_version, _manifest_mtime
+    t_init = time.time()
+    _set_phase('dataset', started=t_init)
+    dataset_rows = []
     try:
         candidates = [
+            os.environ.get('AI_STUB_DATASET'),
             os.path.join(os.path.dirname(__file__), 'data', 'dataset_pertanyaan_wedding.csv'),
             os.path.join(os.path.dirname(__file__), '..', 'dataset_pertanyaan_wedding.csv'),
             os.path.join(os.getcwd(), 'dataset_pertanyaan_wedding.csv'),
@@ -39,12 +214,13 @@ def _do_init():
                         tokens = [t for t in norm.split() if t]
                         r['_norm'] = norm
                         r['_tokens'] = tokens
-                        _dataset_rows.append(r)
+                        dataset_rows.append(r)
                 break
-        if _dataset_rows:
+        if dataset_rows:
+            _set_phase('vectorize', dataset_rows=len(dataset_rows))
             vocab = {}
             vectors = []
-            for r in _dataset_rows:
+            for r in dataset_rows:
                 counts = {}
                 for t in r.get('_tokens', []):
                     counts[t] = counts.get(t, 0) + 1
@@ -59,10 +235,9 @@ def _do_init():
                 for t, c in counts.items():
                     vec[vocab[t]] = c
                 docvecs.append(vec)
-            _vocab.update(vocab)
-            _doc_vectors.extend(docvecs)
+            clusters, centroids = {}, []
             try:
-                def _train_kmeans(docvecs, k=8, iters=40, seed=42):
+                def _train_kmeans(docvecs, k=8, iters=40, seed=42, sample=_KMEANS_SAMPLE):
                     import random
                     random.seed(seed)
                     n = len(docvecs)
@@ -70,43 +245,73 @@ def _do_init():
                         return {}, []
                     k = min(k, n)
                     centroids = [list(map(float, docvecs[i])) for i in random.sample(range(n), k)]
+                    # rows are sparse: |v - c|^2 = |c|^2 + sum over v's nonzeros of (v_j - c_j)^2 - c_j^2,
+                    # so a distance costs O(tokens in the row) instead of O(vocab)
+                    nonzero = [[(j, x) for j, x in enumerate(v) if x] for v in docvecs]
+
+                    def closest(row, norms):
+                        best_i = 0
+                        best_d = None
+                        for ci, c in enumerate(centroids):
+                            d = norms[ci]
+                            for j, x in row:
+                                cj = c[j]
+                                d += (x - cj) * (x - cj) - cj * cj
+                            if best_d is None or d < best_d:
+                                best_d = d
+                                best_i = ci
+                        return best_i
+
+                    # large datasets: fit on a fixed-size sample, then assign every row once
+                    fit_rows = range(n) if n <= sample else sorted(random.sample(range(n), sample))
+                    assigned = None
                     for _ in range(iters):
+                        norms = [sum(x * x for x in c) for c in centroids]
                         clusters = {i: [] for i in range(len(centroids))}
-                        for idx, v in enumerate(docvecs):
-                            best_i = 0
-                            best_d = None
-                            for ci, c in enumerate(centroids):
-                                d = 0.0
-                                for a, b in zip(v, c):
-                                    diff = a - b
-                                    d += diff * diff
-                                if best_d is None or d < best_d:
-                                    best_d = d
-                                    best_i = ci
-                            clusters[best_i].append(idx)
+                        labels = []
+                        for idx in fit_rows:
+                            ci = closest(nonzero[idx], norms)
+                            clusters[ci].append(idx)
+                            labels.append(ci)
+                        if labels == assigned:
+                            # converged: the update would reproduce the same centroids
+                            break
+                        assigned = labels
                         for ci in range(len(centroids)):
                             members = clusters[ci]
                             if not members:
                                 continue
                             newc = [0.0] * len(centroids[ci])
                             for m in members:
-                                mv = docvecs[m]
-                                for j in range(len(newc)):
-                                    newc[j] += mv[j]
+                                for j, x in nonzero[m]:
+                                    newc[j] += x
                             inv = 1.0 / len(members)
                             for j in range(len(newc)):
                                 newc[j] *= inv
                             centroids[ci] = newc
+                    if n > sample:
+                        norms = [sum(x * x for x in c) for c in centroids]
+                        clusters = {i: [] for i in range(len(centroids))}
+                        for idx in range(n):
+                            clusters[closest(nonzero[idx], norms)].append(idx)
                     return clusters, centroids
-                clusters, centroids = _train_kmeans(_doc_vectors, k=min(12, max(2, int(len(_doc_vectors)**0.5))))
-                _clusters.clear()
-                for ci, members in clusters.items():
-                    _clusters[ci] = members[:]
-                _centroids.clear()
-                _centroids.extend(centroids)
+                _set_phase('kmeans', vocab=len(vocab))
+                clusters, centroids = _train_kmeans(docvecs, k=min(12, max(2, int(len(docvecs)**0.5))))
             except Exception:
-                _clusters.clear()
-                _centroids.clear()
+                clusters, centroids = {}, []
+            _index = RetrievalIndex(dataset_rows, vocab, docvecs, clusters, centroids)
+        _base_rows = len(dataset_rows)
+        _set_phase('manifest')
+        # newest incrementally updated version first, then the static model
+        for mf in _manifest_candidates():
+            if mf and os.path.exists(mf):
+                try:
+                    _manifest_mtime = os.stat(mf).st_mtime_ns
+                    _apply_manifest(mf)
+                except Exception:
+                    pass
+                break
+        _set_phase('model')
         try:
             try:
                 import joblib
@@ -117,25 +322,47 @@ def _do_init():
                 os.path.join(os.path.dirname(__file__), '..', '..', 'models', 'intent_tfidf_logreg.joblib'),
                 os.path.join(os.getcwd(), 'models', 'intent_tfidf_logreg.joblib'),
             ]
-            if joblib is not None:
+            if joblib is not None and not _sk_model_loaded:
                 for mp in candidate_model_paths:
                     if mp and os.path.exists(mp):
                         try:
                             _sk_model = joblib.load(mp)
                             _sk_model_loaded = True
+                            _model_version = os.path.basename(mp)
                             break
                         except Exception:
                             _sk_model = None
                             _sk_model_loaded = False
-            else:
+            elif not _sk_model_loaded:
                 _sk_model = None
-                _sk_model_loaded = False
         except Exception:
             _sk_model = None
             _sk_model_loaded = False
-    except Exception:
-        pass
+        # distilled student (JSON, pure python) for deployments without sklearn
+        _set_phase('student')
+        try:
+            from api.hashed_linear import HashedLinearModel
+            candidate_student_paths = [
+                os.environ.get('AI_STUB_STUDENT_PATH'),
+                os.path.join(os.path.dirname(__file__), 'data', 'intent_distilled.json'),
+                os.path.join(os.path.dirname(__file__), '..', 'models', 'intent_distilled.json'),
+                os.path.join(os.getcwd(), 'models', 'intent_distilled.json'),
+            ]
+            for sp in candidate_student_paths:
+                if sp and os.path.exists(sp):
+                    try:
+                        _student_model = HashedLinearModel.load(sp)
+                        break
+                    except Exception:
+                        _student_model = None
+        except Exception:
+            _student_model = None
+    except Exception as e:
+        _state['error'] = repr(e)
     _initialized = True
+    _set_phase('ready', ready_at=time.time(), init_total_s=round(time.time() - t_init, 4), retrieval_rows=len(_index.rows),
+               clusters=len(_index.centroids), sk_model_loaded=_sk_model_loaded, student_loaded=_student_model is not None,
+               model_version=_model_version)
 
 def ensure_initialized(sync=True):
     """Ensure background initialization runs. If sync=False, start init asynchronously and return False.
@@ -156,6 +383,7 @@ def ensure_initialized(sync=True):
     _do_init()
     return True
 
+@metrics.timed('slot_extraction')
 def extract_slots_by_rule(text: str):
     lower = text.lower()
     slots = {
@@ -228,9 +456,116 @@ def extract_slots_by_rule(text: str):
         pass
     return slots
 
-def predict(text: str):
-    # naive keyword-based intent detection
+# keyword rules in priority order: the first group with a hit wins
+KEYWORD_RULES = [
+    ('estimasi_budget', ['berapa','estimasi','estimasi budget','budget']),
+    ('cari_venue', ['venue','tempat','lokasi']),
+    ('cari_dekor', ['dekor','dekorasi']),
+    ('cari_vendor', ['vendor','penyedia']),
+    ('cari_catering', ['catering','makanan','menu']),
+    ('tanya_kemungkinan', ['apa','apakah','berapakah','bisa']),
+]
+
+def predict_by_rules(text: str):
+    """Keyword-only intent and a confidence in [0, 1].
+
+    Confidence is the share of all keyword hits that belong to the winning
+    group, so a query that also triggers other groups scores lower; 0.0
+    means no keyword matched and the default intent was used.
+    """
     lower = text.lower()
+    intent = None
+    hits_total = 0
+    hits_winner = 0
+    for label, words in KEYWORD_RULES:
+        hits = sum(1 for w in words if w in lower)
+        hits_total += hits
+        if hits and intent is None:
+            intent = label
+            hits_winner = hits
+    if intent is None:
+        return 'cari_rekomendasi_paket', 0.0
+    return intent, hits_winner / hits_total
+
+@metrics.timed('retrieval')
+def _best_match(tokens, qvec=None, index=None):
+    """Dataset row with the highest token Jaccard score, and that score.
+
+    With a query vector (built over `index.vocab`), only the nearest k-means
+    cluster is scanned. `index` defaults to the current retrieval index.
+    """
+    index = index or _index
+    rows = index.rows
+    best = None
+    best_score = 0.0
+    # choose which rows to compare: nearest cluster if available
+    candidate_rows = range(len(rows))
+    try:
+        if qvec is not None and index.centroids:
+            best_ci = _nearest_centroid(qvec, index.centroids)
+            if best_ci is not None and index.clusters.get(best_ci):
+                candidate_rows = index.clusters.get(best_ci)
+    except Exception:
+        candidate_rows = range(len(rows))
+
+    for idx in candidate_rows:
+        r = rows[idx]
+        rtoks = set(r.get('_tokens', []))
+        if not rtoks:
+            continue
+        inter = tokens.intersection(rtoks)
+        union = tokens.union(rtoks)
+        score = len(inter) / (len(union) or 1)
+        if score > best_score:
+            best_score = score
+            best = r
+    return best, best_score
+
+def _model_predict(model, text: str, tokens, reason: str):
+    pred_label = model.predict([text])[0]
+    probs = {}
+    confidence = None
+    try:
+        proba = model.predict_proba([text])[0]
+        classes = list(model.classes_)
+        probs = {str(c): float(p) for c, p in zip(classes, proba)}
+        confidence = probs.get(str(pred_label))
+    except Exception:
+        # no calibrated probabilities: report the label, not a confidence
+        probs = {str(pred_label): 1.0}
+    # extract user slots and fill missing from best dataset match (if available)
+    slots = extract_slots_by_rule(text) or {}
+    # quick best-match search to fill missing slots (non-destructive)
+    best2, best_score2 = _best_match(tokens)
+    if best2 and best_score2 >= 0.25:
+        for k in ('tema', 'lokasi', 'budget_min', 'budget_max', 'jumlah_tamu', 'tipe_acara', 'venue', 'waktu'):
+            if (slots.get(k) is None or slots.get(k) == []) and best2.get(k):
+                try:
+                    if k in ('budget_min', 'budget_max', 'jumlah_tamu') and best2.get(k):
+                        slots[k] = int(best2.get(k))
+                    else:
+                        slots[k] = best2.get(k)
+                except Exception:
+                    slots[k] = best2.get(k)
+    return {
+        'text': text,
+        'intent_pred': str(pred_label),
+        'probs': probs,
+        'slots': slots,
+        'overridden': False,
+        'override_reason': reason,
+        'confidence': confidence,
+    }
+
+def predict(text: str):
+    """Intent, probabilities and slots for `text`.
+
+    `confidence` is the model's probability for the predicted intent, the
+    Jaccard score on a dataset match, KEYWORD_FALLBACK_CONFIDENCE on the
+    keyword fallback, or None when the model gives no probabilities.
+    `probs` stays one-hot on the non-model paths.
+    """
+    maybe_reload()
     # try dataset matching first (token overlap / simple fuzzy)
     try:
         # normalize numeric forms like '500juta' or '500jt' -> '500 juta'
@@ -240,98 +575,29 @@ def predict(text: str):
         norm = re.sub(r'[^0-9a-zA-Z\s]', ' ', pre).strip()
         tokens = set([t for t in norm.split() if t])
         # build quick vector for query (same vocab)
+        # one reference for the whole call: a reload may swap _index meanwhile
+        index = _index
+        vocab = index.vocab
         qvec = None
-        if _vocab:
-            qvec = [0] * len(_vocab)
+        if vocab:
+            qvec = [0] * len(vocab)
             for t in tokens:
-                if t in _vocab:
-                    qvec[_vocab[t]] += 1
-        # If a trained sklearn intent model is available, use it first
-        try:
-            global _sk_model, _sk_model_loaded
-            if _sk_model_loaded and _sk_model is not None:
-                try:
-                    pred_label = _sk_model.predict([text])[0]
-                    probs = {}
-                    try:
-                        proba = _sk_model.predict_proba([text])[0]
-                        classes = list(_sk_model.classes_)
-                        probs = {str(c): float(p) for c, p in zip(classes, proba)}
-                    except Exception:
-                        probs = {str(pred_label): 1.0}
-                    # extract user slots and fill missing from best dataset match (if available)
-                    slots = extract_slots_by_rule(text) or {}
-                    # quick best-match search to fill missing slots (non-destructive)
-                    best2 = None
-                    best_score2 = 0.0
-                    for idx in range(len(_dataset_rows)):
-                        r = _dataset_rows[idx]
-                        rtoks = set(r.get('_tokens', []))
-                        if not rtoks:
-                            continue
-                        inter = tokens.intersection(rtoks)
-                        union = tokens.union(rtoks)
-                        score = len(inter) / (len(union) or 1)
-                        if score > best_score2:
-                            best_score2 = score
-                            best2 = r
-                    if best2 and best_score2 >= 0.25:
-                        for k in ('tema', 'lokasi', 'budget_min', 'budget_max', 'jumlah_tamu', 'tipe_acara', 'venue', 'waktu'):
-                            if (slots.get(k) is None or slots.get(k) == []) and best2.get(k):
-                                try:
-                                    if k in ('budget_min', 'budget_max', 'jumlah_tamu') and best2.get(k):
-                                        slots[k] = int(best2.get(k))
-                                    else:
-                                        slots[k] = best2.get(k)
-                                except Exception:
-                                    slots[k] = best2.get(k)
-                    return {
-                        'text': text,
-                        'intent_pred': str(pred_label),
-                        'probs': probs,
-                        'slots': slots,
-                        'overridden': False,
-                        'override_reason': 'model_pred',
-                    }
-                except Exception:
-                    # on model failure, fall back to dataset matching below
-                    pass
-        except Exception:
-            pass
-        best = None
-        best_score = 0.0
-        # choose which rows to compare: nearest cluster if available
-        candidate_rows = list(range(len(_dataset_rows)))
-        try:
-            if qvec is not None and _centroids:
-                # find nearest centroid
-                best_ci = None
-                best_d = None
-                for ci, c in enumerate(_centroids):
-                    # compute squared euclidean but only up to min(len(qvec), len(c))
-                    d = 0.0
-                    for a, b in zip(qvec, c):
-                        diff = a - b
-                        d += diff * diff
-                    if best_d is None or d < best_d:
-                        best_d = d
-                        best_ci = ci
-                if best_ci is not None and _clusters.get(best_ci):
-                    candidate_rows = _clusters.get(best_ci)
-        except Exception:
-            candidate_rows = list(range(len(_dataset_rows)))
-
-        for idx in candidate_rows:
-            r = _dataset_rows[idx]
-            rtoks = set(r.get('_tokens', []))
-            if not rtoks:
-                continue
-            inter = tokens.intersection(rtoks)
-            union = tokens.union(rtoks)
-            score = len(inter) / (len(union) or 1)
-            if score > best_score:
-                best_score = score
-                best = r
+                if t in vocab:
+                    qvec[vocab[t]] += 1
+        # If a trained sklearn intent model is available, use it first;
+        # otherwise the distilled pure-python student (no sklearn needed)
+        if _sk_model_loaded and _sk_model is not None:
+            try:
+                return _model_predict(_sk_model, text, tokens, 'model_pred')
+            except Exception:
+                # on model failure, fall back to the student / dataset matching below
+                pass
+        if _student_model is not None:
+            try:
+                return _model_predict(_student_model, text, tokens, 'distilled_pred')
+            except Exception:
+                pass
+        best, best_score = _best_match(tokens, qvec, index)
         # if sufficiently similar, use dataset intent and populate slots
         # lower threshold to accept more fuzzy matches from the dataset
         if best and best_score >= 0.25:
@@ -367,23 +633,12 @@ def predict(text: str):
                 'slots': slots,
                 'overridden': True,
                 'override_reason': f'matched_dataset:{best_score:.2f}',
+                'confidence': best_score,
             }
     except Exception:
         pass
     probs = {lbl: 0.0 for lbl in INTENT_LIST}
-    intent = 'cari_rekomendasi_paket'
-    if any(w in lower for w in ['berapa','estimasi','estimasi budget','budget']):
-        intent = 'estimasi_budget'
-    elif any(w in lower for w in ['venue','tempat','lokasi']):
-        intent = 'cari_venue'
-    elif any(w in lower for w in ['dekor','dekorasi']):
-        intent = 'cari_dekor'
-    elif any(w in lower for w in ['vendor','penyedia']):
-        intent = 'cari_vendor'
-    elif any(w in lower for w in ['catering','makanan','menu']):
-        intent = 'cari_catering'
-    elif any(w in lower for w in ['apa','apakah','berapakah','bisa']):
-        intent = 'tanya_kemungkinan'
+    intent, _ = predict_by_rules(text)
     probs[intent] = 1.0
     slots = extract_slots_by_rule(text)
     return {
@@ -393,4 +648,5 @@ def predict(text: str):
         'slots': slots,
         'overridden': False,
         'override_reason': None,
+        'confidence': KEYWORD_FALLBACK_CONFIDENCE,
     }
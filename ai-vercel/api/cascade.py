@@ -0,0 +1,340 @@
+import json
+import os
+import queue
+import random
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from api import ai_stub
+
+# Cheapest first. Each stage answers only when its confidence clears the
+# per-intent threshold for the intent it predicted; otherwise the query is
+# escalated. A stage with no threshold at all is not run. The last available
+# stage always answers.
+STAGES = ('rules', 'model', 'transformer')
+
+# Used when no calibrated thresholds file is present, and for stages the file
+# leaves out: rules never answer on their own, the TF-IDF/student model
+# answers above 0.6.
+DEFAULT_THRESHOLDS = {
+    'rules': {'*': None},
+    'model': {'*': 0.6},
+    'transformer': {'*': 0.0},
+}
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+THRESHOLDS_CANDIDATES = [
+    os.environ.get('AI_CASCADE_THRESHOLDS'),
+    os.path.join(os.path.dirname(__file__), 'data', 'cascade_thresholds.json'),
+    os.path.join(_ROOT, 'models', 'cascade_thresholds.json'),
+    os.path.join(_ROOT, '..', 'models', 'cascade_thresholds.json'),
+]
+TRANSFORMER_CANDIDATES = [
+    os.environ.get('LOCAL_TRANSFORMER_DIR'),
+    os.path.join(_ROOT, 'models', 'local_transformer_intent'),
+    os.path.join(_ROOT, '..', 'models', 'local_transformer_intent'),
+]
+# Batch concurrent transformer escalations through one forward pass
+# (transformers_swp/micro_batch.py). Only pays off with a threaded server,
+# where several requests in one process reach the transformer together.
+MICRO_BATCH = os.environ.get('AI_CASCADE_MICRO_BATCH', '0') == '1'
+MICRO_BATCH_MAX = int(os.environ.get('AI_CASCADE_MICRO_BATCH_MAX', '16'))
+MICRO_BATCH_WAIT_MS = float(os.environ.get('AI_CASCADE_MICRO_BATCH_WAIT_MS', '5'))
+MICRO_BATCH_TIMEOUT_S = 10.0
+
+_thresholds = None
+# ai_stub path the file's model-stage thresholds were calibrated on (None: any)
+_thresholds_model_path = None
+_transformer = None
+_transformer_tried = False
+_batcher = None
+_lock = threading.Lock()
+_stats = {s: 0 for s in STAGES}
+_stats['total'] = 0
+
+
+def load_thresholds() -> Dict:
+    global _thresholds, _thresholds_model_path
+    if _thresholds is None:
+        loaded = dict(DEFAULT_THRESHOLDS)
+        for p in THRESHOLDS_CANDIDATES:
+            if p and os.path.exists(p):
+                try:
+                    with open(p, encoding='utf-8') as f:
+                        data = json.load(f)
+                    loaded.update(data.get('thresholds', {}))
+                    _thresholds_model_path = data.get('model_path')
+                    break
+                except Exception:
+                    loaded = dict(DEFAULT_THRESHOLDS)
+        _thresholds = loaded
+    return _thresholds
+
+
+def model_path() -> str:
+    """Which ai_stub path currently serves the model stage."""
+    if ai_stub._sk_model_loaded and ai_stub._sk_model is not None:
+        return 'sklearn_model'
+    if ai_stub._student_model is not None:
+        return 'distilled_model'
+    return 'dataset_match'
+
+
+def _stage_thresholds(stage: str) -> Dict:
+    per_stage = load_thresholds().get(stage) or {}
+    # Jaccard-calibrated thresholds say nothing about sklearn probabilities, and vice versa
+    if stage == 'model' and _thresholds_model_path and _thresholds_model_path != model_path():
+        return DEFAULT_THRESHOLDS['model']
+    return per_stage
+
+
+def _threshold(stage: str, intent: str) -> Optional[float]:
+    per_stage = _stage_thresholds(stage)
+    return per_stage.get(intent, per_stage.get('*'))
+
+
+def _can_answer(stage: str) -> bool:
+    return any(t is not None for t in _stage_thresholds(stage).values())
+
+
+def _get_transformer():
+    # lazy: only paid for by the first query that actually escalates this far
+    global _transformer, _transformer_tried, _batcher
+    if _transformer_tried:
+        return _transformer
+    with _lock:
+        if _transformer_tried:
+            return _transformer
+        try:
+            ts_path = os.path.join(_ROOT, 'transformers_swp')
+            if ts_path not in sys.path:
+                sys.path.insert(0, ts_path)
+            from local_transformer_intent import LocalIntentPipeline
+            for d in TRANSFORMER_CANDIDATES:
+                if d and os.path.exists(os.path.join(d, 'model.pt')):
+                    _transformer = LocalIntentPipeline(d, device='cpu')
+                    break
+            if _transformer is not None and MICRO_BATCH:
+                from micro_batch import MicroBatchServer
+                _batcher = MicroBatchServer(_transformer, max_batch=MICRO_BATCH_MAX, max_wait_ms=MICRO_BATCH_WAIT_MS).start()
+        except Exception:
+            _transformer = None
+            _batcher = None
+        _transformer_tried = True
+    return _transformer
+
+
+def _rules_stage(text: str) -> Dict:
+    # slots are filled in by predict() only if this answer is accepted
+    intent, conf = ai_stub.predict_by_rules(text)
+    probs = {lbl: 0.0 for lbl in ai_stub.INTENT_LIST}
+    probs[intent] = 1.0
+    return {
+        'text': text,
+        'intent_pred': intent,
+        'probs': probs,
+        'overridden': False,
+        'override_reason': 'rules',
+        'stage_confidence': conf,
+    }
+
+
+def _model_stage(text: str) -> Dict:
+    res = ai_stub.predict(text)
+    # not probs[intent_pred]: that is one-hot on the dataset-match and keyword paths
+    res['stage_confidence'] = float(res.get('confidence') or 0.0)
+    return res
+
+
+def _transformer_stage(text: str) -> Optional[Dict]:
+    pipe = _get_transformer()
+    if pipe is None:
+        return None
+    batcher = _batcher
+    res = None
+    if batcher is not None:
+        try:
+            res = batcher.predict(text, timeout=MICRO_BATCH_TIMEOUT_S)
+        except queue.Full:
+            # queue saturated: answer inline rather than wait behind it
+            res = None
+    if res is None:
+        res = pipe.predict(text)
+    # after the tanya_kemungkinan rule override probs is one-hot: no model confidence to report
+    res['confidence'] = None if res.get('overridden') else max(res['probs'].values())
+    res['stage_confidence'] = res['confidence']
+    return res
+
+
+STAGE_FNS = {'rules': _rules_stage, 'model': _model_stage, 'transformer': _transformer_stage}
+
+
+def run_stages(text: str, stages=STAGES) -> List[Dict]:
+    """Every available stage's result (no gating); used by calibration."""
+    out = []
+    for s in stages:
+        res = STAGE_FNS[s](text)
+        if res is not None:
+            res['stage'] = s
+            out.append(res)
+    return out
+
+
+def predict(text: str, stages=STAGES) -> Dict:
+    """Classify `text` with the cheapest stage that is confident enough.
+
+    The result is the answering stage's usual dict plus `stage`,
+    `stage_confidence` and `escalations` (stages tried before it).
+    """
+    ai_stub.ensure_initialized(sync=False)
+    tried = []
+    skipped = []
+    last = None
+    for s in stages:
+        if s != stages[-1] and not _can_answer(s):
+            skipped.append(s)
+            continue
+        res = STAGE_FNS[s](text)
+        if res is None:
+            continue
+        res['stage'] = s
+        last = res
+        t = _threshold(s, res['intent_pred'])
+        if t is not None and res['stage_confidence'] is not None and res['stage_confidence'] >= t:
+            break
+        tried.append(s)
+    # nothing ran (or the last stage is unavailable): the most expensive skipped stage answers
+    for s in reversed(skipped):
+        if last is not None:
+            break
+        last = STAGE_FNS[s](text)
+        if last is not None:
+            last['stage'] = s
+    if last is None:
+        last = _rules_stage(text)
+        last['stage'] = 'rules'
+    if 'slots' not in last:
+        last['slots'] = ai_stub.extract_slots_by_rule(text)
+    if tried and tried[-1] == last['stage']:
+        tried.pop()
+    last['escalations'] = tried
+    with _lock:
+        _stats['total'] += 1
+        _stats[last['stage']] += 1
+    return last
+
+
+def stats() -> Dict:
+    with _lock:
+        out = dict(_stats)
+    total = out['total'] or 1
+    out['share'] = {s: out[s] / total for s in STAGES}
+    if _batcher is not None:
+        out['micro_batch'] = _batcher.stats()
+    return out
+
+
+@contextmanager
+def _held_out(texts):
+    """Score `texts` against ai_stub's retrieval index with those rows removed."""
+    saved = ai_stub._index
+    ai_stub._index = ai_stub.index_without(texts)
+    try:
+        yield
+    finally:
+        ai_stub._index = saved
+
+
+def held_out_folds(rows: List[Dict], folds: int = 5, seed: int = 42):
+    """Yield `folds` disjoint slices of rows, each inside _held_out.
+
+    The bundled CSV is also ai_stub's retrieval set, where every row matches
+    itself with Jaccard 1.0; scoring each fold with its own rows removed
+    gives the confidences unseen queries would get. folds <= 1 yields all
+    rows against the full index (for a CSV that is already held out).
+    """
+    if folds <= 1:
+        yield rows
+        return
+    order = list(rows)
+    random.Random(seed).shuffle(order)
+    for k in range(folds):
+        part = order[k::folds]
+        with _held_out([r['text'] for r in part]):
+            yield part
+
+
+def calibrate(rows: List[Dict], target_precision: float = 0.95, min_support: int = 5, stages=STAGES, folds: int = 5) -> Dict:
+    """Per-stage, per-intent confidence thresholds from labelled rows.
+
+    For every intent a stage predicts, the threshold is the lowest confidence
+    at which that stage's precision on the accepted queries is still at
+    least `target_precision` (with at least `min_support` accepted).
+    Intents that never reach it get None, i.e. always escalate. Rows are
+    scored out-of-fold (see held_out_folds).
+    """
+    per_stage = {s: [] for s in stages}
+    for part in held_out_folds(rows, folds):
+        for r in part:
+            for res in run_stages(r['text'], stages):
+                per_stage[res['stage']].append((res['intent_pred'], res['stage_confidence'] or 0.0, res['intent_pred'] == r['intent']))
+
+    thresholds = {}
+    report = {}
+    for s, preds in per_stage.items():
+        if not preds:
+            continue
+        thresholds[s] = {}
+        accepted = 0
+        for intent in ai_stub.INTENT_LIST:
+            scored = sorted(((c, ok) for p, c, ok in preds if p == intent), key=lambda x: -x[0])
+            best = None
+            correct = 0
+            for i, (c, ok) in enumerate(scored, 1):
+                correct += ok
+                # only cut between distinct confidence values
+                if i < len(scored) and scored[i][0] == c:
+                    continue
+                if i >= min_support and correct / i >= target_precision:
+                    best = (c, i)
+            thresholds[s][intent] = best[0] if best else None
+            accepted += best[1] if best else 0
+        report[s] = {'evaluated': len(preds), 'would_answer': accepted, 'coverage': accepted / len(preds)}
+    return {'target_precision': target_precision, 'min_support': min_support, 'folds': folds, 'thresholds': thresholds, 'report': report}
+
+
+if __name__ == '__main__':
+    import argparse
+    import csv
+    parser = argparse.ArgumentParser(description='Calibrate or evaluate the rules -> model -> transformer cascade')
+    parser.add_argument('--csv', default=os.path.join(os.path.dirname(__file__), 'data', 'dataset_pertanyaan_wedding.csv'),
+                        help='labelled text,intent rows (default: the bundled dataset, scored out-of-fold)')
+    parser.add_argument('--folds', type=int, default=5,
+                        help='score each fold with its rows removed from the retrieval index; 1 for a CSV that is already held out')
+    parser.add_argument('--calibrate', action='store_true')
+    parser.add_argument('--target_precision', type=float, default=0.95)
+    parser.add_argument('--min_support', type=int, default=5)
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'data', 'cascade_thresholds.json'))
+    args = parser.parse_args()
+
+    ai_stub.ensure_initialized(sync=True)
+    with open(args.csv, newline='', encoding='utf-8') as f:
+        rows = [r for r in csv.DictReader(f) if r.get('text') and r.get('intent')]
+    if args.calibrate:
+        result = calibrate(rows, args.target_precision, args.min_support, folds=args.folds)
+        # the model stage's confidences depend on which model served them
+        result['model_path'] = model_path()
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        _thresholds = dict(DEFAULT_THRESHOLDS, **result['thresholds'])
+        _thresholds_model_path = result['model_path']
+        print(json.dumps(result['report'], indent=2))
+        print('Saved thresholds to', args.out)
+    correct = 0
+    for part in held_out_folds(rows, args.folds):
+        for r in part:
+            correct += predict(r['text'])['intent_pred'] == r['intent']
+    print(json.dumps({'accuracy': correct / max(1, len(rows)), 'stages': stats()}, indent=2))
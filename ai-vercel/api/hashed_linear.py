@@ -0,0 +1,132 @@
+import base64
+import json
+import math
+import os
+import re
+import sys
+import zlib
+from array import array
+from typing import Dict, List
+
+# Pure-python linear intent model over hashed word/char n-grams. It has no
+# numpy/sklearn dependency so it can ship inside the serverless bundle; the
+# weights are trained elsewhere (transformers_swp/distill_student.py).
+FORMAT = 'hashed_linear_v1'
+
+_norm_re = re.compile(r'[^0-9a-z\s]')
+
+
+def _le_bytes(a: array) -> bytes:
+    # array.tobytes() is native byte order; the file format is little-endian
+    if sys.byteorder == 'big':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def normalize(text: str) -> str:
+    pre = (text or '').lower()
+    pre = re.sub(r"(\d+)\s*jt\b", r"\1 juta", pre)
+    pre = re.sub(r"(\d+)juta\b", r"\1 juta", pre)
+    return _norm_re.sub(' ', pre).strip()
+
+
+def features(text: str, n_buckets: int, word_ngrams: int = 2, char_ngrams: int = 0) -> Dict[int, float]:
+    """Hashed bag of word (and optional char) n-grams, L2 normalized."""
+    tokens = normalize(text).split()
+    counts: Dict[int, float] = {}
+    for n in range(1, word_ngrams + 1):
+        for i in range(len(tokens) - n + 1):
+            h = zlib.crc32(('w%d:' % n + ' '.join(tokens[i:i + n])).encode('utf-8')) % n_buckets
+            counts[h] = counts.get(h, 0.0) + 1.0
+    if char_ngrams:
+        for tok in tokens:
+            padded = '<' + tok + '>'
+            for i in range(len(padded) - char_ngrams + 1):
+                h = zlib.crc32(('c:' + padded[i:i + char_ngrams]).encode('utf-8')) % n_buckets
+                counts[h] = counts.get(h, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values()))
+    if norm:
+        for h in counts:
+            counts[h] /= norm
+    return counts
+
+
+class HashedLinearModel:
+    """Softmax regression over `features()`; sklearn-like predict/predict_proba.
+
+    Weights are stored bucket-major (`weights[h * n_classes + c]`) so scoring
+    a text touches one contiguous row per active feature.
+    """
+
+    def __init__(self, classes: List[str], weights, bias, n_buckets: int, word_ngrams: int = 2, char_ngrams: int = 0, meta: Dict = None):
+        self.classes_ = list(classes)
+        self.n_classes = len(self.classes_)
+        self.weights = weights if isinstance(weights, array) else array('f', weights)
+        self.bias = list(bias)
+        self.n_buckets = n_buckets
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+        self.meta = meta or {}
+        if len(self.weights) != n_buckets * self.n_classes:
+            raise ValueError('weights size does not match n_buckets * n_classes')
+
+    def decision_function_one(self, text: str) -> List[float]:
+        scores = list(self.bias)
+        C = self.n_classes
+        w = self.weights
+        for h, v in features(text, self.n_buckets, self.word_ngrams, self.char_ngrams).items():
+            base = h * C
+            for c in range(C):
+                scores[c] += w[base + c] * v
+        return scores
+
+    def predict_proba_one(self, text: str) -> List[float]:
+        scores = self.decision_function_one(text)
+        m = max(scores)
+        exps = [math.exp(s - m) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict_proba(self, texts: List[str]) -> List[List[float]]:
+        return [self.predict_proba_one(t) for t in texts]
+
+    def predict(self, texts: List[str]) -> List[str]:
+        out = []
+        for p in self.predict_proba(texts):
+            out.append(self.classes_[max(range(len(p)), key=p.__getitem__)])
+        return out
+
+    def to_dict(self) -> Dict:
+        return {
+            'format': FORMAT,
+            'classes': self.classes_,
+            'n_buckets': self.n_buckets,
+            'word_ngrams': self.word_ngrams,
+            'char_ngrams': self.char_ngrams,
+            'bias': self.bias,
+            # float32 little-endian, base64 so the JSON stays compact
+            'weights_f32_b64': base64.b64encode(_le_bytes(self.weights)).decode('ascii'),
+            'meta': self.meta,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'HashedLinearModel':
+        if d.get('format') != FORMAT:
+            raise ValueError(f"unsupported model format: {d.get('format')}")
+        weights = array('f')
+        weights.frombytes(base64.b64decode(d['weights_f32_b64']))
+        if sys.byteorder == 'big':
+            weights.byteswap()
+        return cls(d['classes'], weights, d['bias'], d['n_buckets'], d.get('word_ngrams', 2), d.get('char_ngrams', 0), d.get('meta'))
+
+    def save(self, path: str):
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'HashedLinearModel':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
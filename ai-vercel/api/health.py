@@ -1,34 +1,151 @@
 from flask import Flask, jsonify
+import json
 import os
-import sys
+import tempfile
+import time
 
 app = Flask(__name__)
 
-# Ensure transformers_swp is importable
+# Health must stay cheap: no transformers_swp / ai_stub / torch / sklearn
+# imports here. Readiness reads the state file ai_stub writes during init,
+# unless the caller already has ai_stub loaded (see api/process.py). The file
+# is trusted only while its writer pid is alive and predates the stamp, and
+# an unfinished init that has not progressed in STATE_STALE_S is stale; with
+# several workers it describes whichever one wrote last.
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-TS_PATH = os.path.join(ROOT, 'transformers_swp')
-if TS_PATH not in sys.path:
-    sys.path.insert(0, TS_PATH)
-
-try:
-    import importlib
-    ts_app = importlib.import_module('app')
-except Exception:
+STATE_PATH = os.environ.get('AI_STUB_STATE_PATH', os.path.join(tempfile.gettempdir(), 'ai_stub_state.json'))
+STATE_STALE_S = float(os.environ.get('AI_STUB_STATE_STALE_S', '900'))
+MODEL_DEST = os.environ.get('MODEL_DEST', '/tmp/model.pt')
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'data', 'vendors.json')
+MODEL_FILES = {
+    'intent_manifest': [os.environ.get('AI_STUB_MANIFEST'), os.path.join(ROOT, 'models', 'intent_manifest.json'),
+                        os.path.join(ROOT, '..', 'models', 'intent_manifest.json')],
+    'intent_tfidf_logreg': [os.path.join(ROOT, 'models', 'intent_tfidf_logreg.joblib'),
+                            os.path.join(ROOT, '..', 'models', 'intent_tfidf_logreg.joblib')],
+    'intent_distilled': [os.environ.get('AI_STUB_STUDENT_PATH'), os.path.join(ROOT, 'api', 'data', 'intent_distilled.json'),
+                         os.path.join(ROOT, 'models', 'intent_distilled.json')],
+    'transformer': [MODEL_DEST, os.path.join(ROOT, 'models', 'local_transformer_intent', 'model.pt')],
+}
+
+_STARTED = time.time()
+_catalog_cache = {'mtime': None, 'info': None}
+
+
+def _pid_started(pid):
+    """Start time (epoch seconds) of process `pid`, or None without /proc."""
+    try:
+        with open(f'/proc/{pid}/stat', encoding='ascii') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat', encoding='ascii') as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return btime + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+def _state_problem(state):
+    """Why a state file cannot be trusted, or None."""
+    pid = state.get('pid')
+    if not pid:
+        return 'no writer pid'
+    if pid != os.getpid():
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return f'writer pid {pid} has exited'
+        except PermissionError:
+            pass
+    started = _pid_started(pid)
+    if started is not None and state.get('started') and started > state['started'] + 1:
+        return f'writer pid {pid} was reused'
+    if state.get('phase') != 'ready' and time.time() - state.get('updated', 0) > STATE_STALE_S:
+        return f'no init progress for over {STATE_STALE_S:.0f}s'
+    return None
+
+
+def _read_state():
+    """(state, problem): the validated state file, or ({}, reason) when missing or untrusted."""
+    try:
+        with open(STATE_PATH, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}, None
+    problem = _state_problem(state) if isinstance(state, dict) else 'malformed'
+    return ({}, problem) if problem else (state, None)
+
+
+def _catalog():
+    # parsed once per vendors.json mtime
     try:
-        ts_app = importlib.import_module('transformers_swp.app')
-    except Exception:
-        ts_app = None
+        mtime = os.stat(CATALOG_PATH).st_mtime_ns
+    except OSError:
+        return {'ok': False, 'error': 'vendors.json missing'}
+    if _catalog_cache['mtime'] != mtime:
+        try:
+            with open(CATALOG_PATH, encoding='utf-8') as f:
+                data = json.load(f)
+            info = {'ok': isinstance(data, dict) and bool(data), 'categories': {k: len(v) for k, v in data.items() if isinstance(v, list)}}
+        except Exception as e:
+            info = {'ok': False, 'error': str(e)}
+        _catalog_cache.update(mtime=mtime, info=info)
+    return _catalog_cache['info']
+
+
+def _models_on_disk():
+    return {name: next((p for p in paths if p and os.path.exists(p)), None) for name, paths in MODEL_FILES.items()}
 
 
 @app.route('/health', methods=['GET'])
 @app.route('/api/health', methods=['GET'])
 def health():
-    if ts_app is None:
-        return jsonify({'status': 'ok', 'initialized': False, 'initializing': False, 'note': 'transformers_swp module not available'}), 200
+    """Liveness: the process answers. Never touches the model stack."""
+    state, _ = _read_state()
+    phase = state.get('phase', 'not_started')
+    return jsonify({
+        'status': 'ok',
+        'uptime_s': round(time.time() - _STARTED, 3),
+        'initialized': phase == 'ready',
+        'initializing': phase not in ('ready', 'not_started'),
+    }), 200
+
+
+@app.route('/ready', methods=['GET'])
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness: ai_stub finished init and the vendor catalog loads.
+
+    503 until then; the body carries the init phase, per-phase durations,
+    the last model reload and which model files are on disk.
+    """
+    state, problem = _read_state()
+    return readiness(state, source='state_file', state_problem=problem)
+
+
+def readiness(state, source='in_process', state_problem=None):
+    """(body, status) of a readiness answer for an ai_stub init state dict."""
     try:
-        initialized = getattr(ts_app, 'ai_pipeline', None) is not None
-        initializing = getattr(ts_app, 'init_in_progress', False)
-        return jsonify({'status': 'ok', 'initialized': bool(initialized), 'initializing': bool(initializing)}), 200
+        catalog = _catalog()
+        checks = {
+            'ai_stub_initialized': state.get('phase') == 'ready',
+            'catalog_loaded': catalog.get('ok', False),
+        }
+        is_ready = all(checks.values())
+        body = {
+            'status': 'ready' if is_ready else 'not_ready',
+            'checks': checks,
+            'phase': state.get('phase', 'not_started'),
+            'state_source': source,
+            'state_pid': state.get('pid'),
+            'phases_s': state.get('phases_s', {}),
+            'state_age_s': round(time.time() - state['updated'], 3) if state.get('updated') else None,
+            'models_on_disk': _models_on_disk(),
+            'catalog': catalog,
+        }
+        for k in ('init_total_s', 'last_reload', 'model_version', 'sk_model_loaded', 'student_loaded', 'retrieval_rows', 'error'):
+            body[k] = state.get(k)
+        if state_problem:
+            body['state_ignored'] = state_problem
+        return jsonify(body), 200 if is_ready else 503
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
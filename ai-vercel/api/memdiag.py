@@ -0,0 +1,304 @@
+"""Memory diagnostics for long-lived API workers.
+
+Wraps tracemalloc (start/stop, named snapshots, top allocation sites and
+snapshot diffs), GC generation stats, RSS, the sizes of the usual
+suspects (ai_stub's dataset rows / vectors, torch's allocator if it is
+already imported) and optional per-request allocated bytes.
+
+Served at /api/memory (guarded by PROFILE_SECRET, see api/profiling.py):
+    GET /api/memory?action=status
+    GET /api/memory?action=start&frames=25      then  action=snapshot&name=a
+    GET /api/memory?action=diff&a=a&b=b&top=20&key=lineno
+    GET /api/memory?action=track_on              per-request bytes in status
+
+CLI, replaying requests in-process and diffing snapshots around them:
+    python -m api.memdiag --requests 2000 --target app
+"""
+import gc
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Dict, List, Optional
+
+MAX_SNAPSHOTS = int(os.environ.get('MEMDIAG_MAX_SNAPSHOTS', '4'))
+
+_snapshots: Dict[str, tracemalloc.Snapshot] = {}
+_snapshot_order: List[str] = []
+_lock = threading.Lock()
+tracking = False
+_requests = deque(maxlen=200)
+_request_totals = {'count': 0, 'net_bytes': 0, 'peak_bytes_max': 0}
+
+# tracemalloc's own bookkeeping, import machinery and this module are noise in every report
+_FILTERS = [
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # peak, not current, where /proc is unavailable (kB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except Exception:
+        return None
+
+
+def start(frames: int = 25) -> Dict:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return status()
+
+
+def stop() -> Dict:
+    global tracking
+    tracking = False
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+        _snapshot_order.clear()
+    return status()
+
+
+def take_snapshot(name: Optional[str] = None) -> str:
+    """Store a filtered snapshot under `name`; only the newest MAX_SNAPSHOTS are kept."""
+    if not tracemalloc.is_tracing():
+        raise RuntimeError('tracemalloc is not running; start it first')
+    name = name or time.strftime('%H%M%S')
+    snap = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    with _lock:
+        if name in _snapshots:
+            _snapshot_order.remove(name)
+        _snapshots[name] = snap
+        _snapshot_order.append(name)
+        while len(_snapshot_order) > MAX_SNAPSHOTS:
+            _snapshots.pop(_snapshot_order.pop(0), None)
+    return name
+
+
+def _site(stat) -> str:
+    frame = stat.traceback[0]
+    return f'{frame.filename}:{frame.lineno}'
+
+
+def top(name: Optional[str] = None, limit: int = 20, key: str = 'lineno') -> List[Dict]:
+    """Largest allocation sites in a stored snapshot (newest when `name` is None)."""
+    with _lock:
+        if not _snapshot_order:
+            raise RuntimeError('no snapshots taken')
+        snap = _snapshots[name or _snapshot_order[-1]]
+    out = []
+    for stat in snap.statistics(key)[:limit]:
+        row = {'site': _site(stat), 'size': stat.size, 'count': stat.count}
+        if key == 'traceback':
+            row['traceback'] = stat.traceback.format()
+        out.append(row)
+    return out
+
+
+def diff(a: str, b: str, limit: int = 20, key: str = 'lineno') -> List[Dict]:
+    """Allocation sites that grew the most between snapshots `a` and `b`."""
+    with _lock:
+        old, new = _snapshots[a], _snapshots[b]
+    out = []
+    for stat in new.compare_to(old, key)[:limit]:
+        row = {'site': _site(stat), 'size_diff': stat.size_diff, 'size': stat.size,
+               'count_diff': stat.count_diff, 'count': stat.count}
+        if key == 'traceback':
+            row['traceback'] = stat.traceback.format()
+        out.append(row)
+    return out
+
+
+def gc_stats() -> Dict:
+    return {
+        'counts': gc.get_count(),
+        'thresholds': gc.get_threshold(),
+        'generations': gc.get_stats(),
+        'garbage': len(gc.garbage),
+    }
+
+
+def object_counts(limit: int = 20) -> List[Dict]:
+    """Live object counts by type name (walks every tracked object; slow)."""
+    counts = {}
+    for obj in gc.get_objects():
+        t = type(obj).__name__
+        counts[t] = counts.get(t, 0) + 1
+    return [{'type': t, 'count': n} for t, n in sorted(counts.items(), key=lambda x: -x[1])[:limit]]
+
+
+def suspects() -> Dict:
+    """Sizes of the structures that usually explain RSS growth."""
+    out = {}
+    stub = sys.modules.get('api.ai_stub')
+    if stub is not None:
+        index = stub._index
+        rows = index.rows
+        out['ai_stub'] = {
+            'dataset_rows': len(rows),
+            # the dicts themselves plus their _norm string and _tokens list
+            'dataset_rows_bytes': sum(sys.getsizeof(r) + sys.getsizeof(r.get('_norm', '')) + sys.getsizeof(r.get('_tokens', []))
+                                      + sum(sys.getsizeof(t) for t in r.get('_tokens', [])) for r in rows),
+            'vocab': len(index.vocab),
+            'doc_vector_cells': len(index.vectors) * len(index.vocab),
+            'clusters': len(index.clusters),
+        }
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        try:
+            info = {'num_threads': torch.get_num_threads()}
+            if torch.cuda.is_available():
+                info['cuda_allocated'] = torch.cuda.memory_allocated()
+                info['cuda_reserved'] = torch.cuda.memory_reserved()
+            out['torch'] = info
+        except Exception:
+            pass
+    return out
+
+
+def track(view, label=None):
+    """Call a view and record the bytes it left allocated and its peak.
+
+    tracemalloc counts every thread, so with concurrent requests the
+    numbers include their neighbours' allocations.
+    """
+    if not tracemalloc.is_tracing():
+        return view()
+    before, _ = tracemalloc.get_traced_memory()
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    try:
+        return view()
+    finally:
+        after, peak = tracemalloc.get_traced_memory()
+        rec = {'ts': time.time(), 'label': label, 'net_bytes': after - before, 'peak_bytes': max(0, peak - before)}
+        with _lock:
+            _requests.append(rec)
+            _request_totals['count'] += 1
+            _request_totals['net_bytes'] += rec['net_bytes']
+            _request_totals['peak_bytes_max'] = max(_request_totals['peak_bytes_max'], rec['peak_bytes'])
+
+
+def status() -> Dict:
+    out = {
+        'tracing': tracemalloc.is_tracing(),
+        'rss_bytes': rss_bytes(),
+        'gc': gc_stats(),
+        'suspects': suspects(),
+        'tracking_requests': tracking,
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        out.update({'traced_bytes': current, 'traced_peak_bytes': peak, 'frames': tracemalloc.get_traceback_limit(),
+                    'tracemalloc_overhead_bytes': tracemalloc.get_tracemalloc_memory()})
+    with _lock:
+        out['snapshots'] = list(_snapshot_order)
+        if _request_totals['count']:
+            out['requests'] = dict(_request_totals, mean_net_bytes=_request_totals['net_bytes'] / _request_totals['count'],
+                                   recent=list(_requests)[-20:])
+    return out
+
+
+def handle(args) -> Dict:
+    """Dispatch an /api/memory query (a dict-like of string args)."""
+    global tracking
+    action = args.get('action', 'status')
+    limit = int(args.get('top', 20))
+    key = args.get('key', 'lineno')
+    if action == 'start':
+        return start(int(args.get('frames', 25)))
+    if action == 'stop':
+        return stop()
+    if action == 'snapshot':
+        name = take_snapshot(args.get('name'))
+        return {'snapshot': name, 'top': top(name, limit, key)}
+    if action == 'top':
+        return {'top': top(args.get('name'), limit, key)}
+    if action == 'diff':
+        return {'a': args['a'], 'b': args['b'], 'diff': diff(args['a'], args['b'], limit, key)}
+    if action == 'objects':
+        return {'objects': object_counts(limit)}
+    if action == 'gc':
+        collected = gc.collect()
+        return {'collected': collected, 'gc': gc_stats(), 'rss_bytes': rss_bytes()}
+    if action in ('track_on', 'track_off'):
+        if action == 'track_on' and not tracemalloc.is_tracing():
+            start(int(args.get('frames', 1)))
+        tracking = action == 'track_on'
+        return status()
+    return status()
+
+
+if __name__ == '__main__':
+    import argparse
+    import csv
+    import json
+    import random
+    parser = argparse.ArgumentParser(description='Replay dataset queries and report allocation growth')
+    parser.add_argument('--csv', default=os.path.join(os.path.dirname(__file__), 'data', 'dataset_pertanyaan_wedding.csv'))
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100, help='requests before the first snapshot (caches, lazy imports)')
+    parser.add_argument('--target', choices=('app', 'stub'), default='app', help='full Flask view (needs flask) or ai_stub.predict only')
+    parser.add_argument('--frames', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--key', default='lineno', choices=('lineno', 'filename', 'traceback'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='write the report as JSON')
+    args = parser.parse_args()
+
+    with open(args.csv, newline='', encoding='utf-8') as f:
+        texts = [r['text'] for r in csv.DictReader(f) if r.get('text')]
+    rng = random.Random(args.seed)
+    if args.target == 'app':
+        from api.process import app
+        client = app.test_client()
+
+        def send(t):
+            client.post('/api/process', json={'text': t})
+    else:
+        from api import ai_stub
+        ai_stub.ensure_initialized(sync=True)
+
+        def send(t):
+            ai_stub.predict(t)
+
+    start(args.frames)
+    for _ in range(args.warmup):
+        send(rng.choice(texts))
+    gc.collect()
+    rss0 = rss_bytes()
+    take_snapshot('before')
+    for _ in range(args.requests):
+        track(lambda: send(rng.choice(texts)))
+    gc.collect()
+    take_snapshot('after')
+    report = {
+        'requests': args.requests,
+        'rss_before': rss0,
+        'rss_after': rss_bytes(),
+        'diff': diff('before', 'after', args.top, args.key),
+        'status': status(),
+    }
+    report['status'].get('requests', {}).pop('recent', None)
+    print(json.dumps(report, indent=2, default=str))
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
@@ -0,0 +1,291 @@
+"""Request metrics for the API in Prometheus text format.
+
+Per-stage latency histograms (`api_stage_seconds{stage=...}`) and request
+counters by intent and prediction path, kept in plain dicts so there is no
+extra dependency. With several worker processes set
+PROMETHEUS_MULTIPROC_DIR (or API_METRICS_DIR): each process then dumps its
+values there from a background thread every API_METRICS_DUMP_S seconds
+(when they changed) and at exit, and /api/metrics sums the files of all
+live processes (files left by exited workers are removed).
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('API_METRICS_DIR')
+DUMP_INTERVAL_S = float(os.environ.get('API_METRICS_DUMP_S', '1'))
+
+HELP = {
+    'api_stage_seconds': ('histogram', 'Time spent in each stage of /api/process'),
+    'api_request_seconds': ('histogram', 'Total /api/process handling time'),
+    'api_requests_total': ('counter', 'Processed /api/process requests by predicted intent and prediction path'),
+    'api_errors_total': ('counter', 'Failed /api/process requests by reason'),
+    'request_log_written_total': ('counter', 'Request log records written to disk'),
+    'request_log_dropped_total': ('counter', 'Request log records dropped because the write queue was full'),
+    'request_log_rotations_total': ('counter', 'Request log file rotations'),
+    'request_log_errors_total': ('counter', 'Request log write or rotation failures'),
+}
+
+_lock = threading.Lock()
+# (name, ((label, value), ...)) -> [bucket counts..., sum, count]
+_histograms: Dict[tuple, List[float]] = {}
+_counters: Dict[tuple, float] = {}
+_last_dump = 0.0
+_dirty = False
+# pid that owns the dump thread; a forked worker starts its own
+_dumper_pid = None
+# per-request stage durations for the Server-Timing header (see begin_request)
+_local = threading.local()
+
+# Server-Timing metric -> stages summed into it
+SERVER_TIMING = (
+    ('init', ('init_wait',)),
+    ('predict', ('ai_predict',)),
+    ('retrieval', ('retrieval',)),
+    ('slots', ('slot_extraction',)),
+    ('recommendation', ('vendor_load', 'recommendation')),
+    ('serialize', ('serialize',)),
+)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name: str, seconds: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, b in enumerate(BUCKETS):
+            if seconds <= b:
+                h[i] += 1
+                break
+        h[-2] += seconds
+        h[-1] += 1
+    _mark_dirty()
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _mark_dirty()
+
+
+@contextmanager
+def timer(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        observe('api_stage_seconds', dt, stage=stage)
+        stages = getattr(_local, 'stages', None)
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + dt
+
+
+def begin_request():
+    """Start collecting this thread's stage durations."""
+    _local.stages = {}
+
+
+def end_request() -> Dict[str, float]:
+    """Stage -> seconds since begin_request (repeated stages are summed)."""
+    stages = getattr(_local, 'stages', None) or {}
+    _local.stages = None
+    return stages
+
+
+def server_timing(stages: Dict[str, float], total_s: Optional[float] = None) -> str:
+    """`Server-Timing` header value in milliseconds; nested stages overlap."""
+    parts = []
+    for name, members in SERVER_TIMING:
+        if any(m in stages for m in members):
+            parts.append(f'{name};dur={sum(stages.get(m, 0.0) for m in members) * 1000:.2f}')
+    if total_s is not None:
+        parts.append(f'total;dur={total_s * 1000:.2f}')
+    return ', '.join(parts)
+
+
+def timed(stage: str):
+    """Decorator form of `timer`, for stages that run inside other modules."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def prediction_path(result: Dict) -> str:
+    """Which code path produced an ai_predict result."""
+    stage = result.get('stage')
+    if stage in ('rules', 'transformer'):
+        return stage
+    reason = result.get('override_reason') or ''
+    if reason == 'model_pred':
+        return 'sklearn_model'
+    if reason == 'distilled_pred':
+        return 'distilled_model'
+    if reason.startswith('matched_dataset'):
+        return 'dataset_match'
+    return 'keyword_fallback'
+
+
+def snapshot() -> Dict:
+    with _lock:
+        return {
+            'counters': [[name, list(labels), v] for (name, labels), v in _counters.items()],
+            'histograms': [[name, list(labels), list(h)] for (name, labels), h in _histograms.items()],
+        }
+
+
+def _mark_dirty():
+    global _dirty
+    if MULTIPROC_DIR:
+        with _lock:
+            _dirty = True
+        if _dumper_pid != os.getpid():
+            _start_dumper()
+
+
+def _start_dumper():
+    global _dumper_pid
+    with _lock:
+        if _dumper_pid == os.getpid():
+            return
+        _dumper_pid = os.getpid()
+    threading.Thread(target=_dump_loop, name='metrics-dump', daemon=True).start()
+    atexit.register(maybe_dump, True)
+
+
+def _dump_loop():
+    # so a worker's last requests reach the file even if it then goes idle
+    while True:
+        time.sleep(DUMP_INTERVAL_S)
+        with _lock:
+            dirty = _dirty
+        if dirty:
+            maybe_dump(force=True)
+
+
+def maybe_dump(force: bool = False) -> bool:
+    """Write this process's values to MULTIPROC_DIR (throttled unless `force`)."""
+    global _last_dump, _dirty
+    if not MULTIPROC_DIR:
+        return False
+    now = time.time()
+    with _lock:
+        if not force and now - _last_dump < DUMP_INTERVAL_S:
+            return False
+        _last_dump = now
+        _dirty = False
+    try:
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+        path = os.path.join(MULTIPROC_DIR, f'metrics_{os.getpid()}.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        return False
+
+
+def _merge(snaps: List[Dict]):
+    counters = {}
+    histograms = {}
+    for s in snaps:
+        for name, labels, v in s.get('counters', []):
+            key = (name, tuple(tuple(x) for x in labels))
+            counters[key] = counters.get(key, 0) + v
+        for name, labels, h in s.get('histograms', []):
+            key = (name, tuple(tuple(x) for x in labels))
+            if key not in histograms:
+                histograms[key] = list(h)
+            else:
+                histograms[key] = [a + b for a, b in zip(histograms[key], h)]
+    return counters, histograms
+
+
+def _fmt_labels(labels, extra=None) -> str:
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in items) + '}'
+
+
+def render(snaps: Optional[List[Dict]] = None) -> str:
+    counters, histograms = _merge(snaps if snaps is not None else [snapshot()])
+    lines = []
+    names = sorted({k[0] for k in counters} | {k[0] for k in histograms})
+    for name in names:
+        kind, doc = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {doc}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (n, labels), v in sorted(counters.items()):
+            if n == name:
+                lines.append(f'{name}{_fmt_labels(labels)} {v}')
+        for (n, labels), h in sorted(histograms.items()):
+            if n != name:
+                continue
+            cum = 0
+            for b, c in zip(BUCKETS, h):
+                cum += c
+                lines.append(f'{name}_bucket{_fmt_labels(labels, [("le", repr(b))])} {cum}')
+            lines.append(f'{name}_bucket{_fmt_labels(labels, [("le", "+Inf")])} {h[-1]}')
+            lines.append(f'{name}_sum{_fmt_labels(labels)} {h[-2]}')
+            lines.append(f'{name}_count{_fmt_labels(labels)} {h[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def exposition() -> str:
+    """Text for /api/metrics: this process, or all processes in MULTIPROC_DIR."""
+    if not MULTIPROC_DIR:
+        return render()
+    maybe_dump(force=True)
+    snaps = []
+    try:
+        files = [f for f in os.listdir(MULTIPROC_DIR) if f.startswith('metrics_') and f.endswith('.json')]
+    except OSError:
+        files = []
+    for f in files:
+        path = os.path.join(MULTIPROC_DIR, f)
+        try:
+            pid = int(f[len('metrics_'):-len('.json')])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            # left behind by an exited worker
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path, encoding='utf-8') as fh:
+                snaps.append(json.load(fh))
+        except Exception:
+            continue
+    return render(snaps)
@@ -9,6 +9,9 @@ import shutil
 import json
 import random
 
+from api import memdiag, metrics, profiling
+from api.health import readiness
+
 app = Flask(__name__)
 CORS(app)
 
@@ -40,13 +43,187 @@ def _load_json_file(name):
         return None
 
 
+VENDOR_CATEGORIES = ('wo', 'mua', 'decoration', 'documentation', 'entertainment', 'catering')
+# used when vendors.json is missing a category
+DEFAULT_VENDORS = {
+    'wo': ['Sepasang Wedding Planner', 'SepasangWP Team', 'SWP Organizer'],
+    'mua': ['Make Up By Yuliana Dewi', 'Giskavina', 'Kemalia Kentina'],
+    'decoration': ['GP Florist', 'Sadiqa Decoration', 'Aksen Dekorasi'],
+    'documentation': ['Alura Photography', 'The Couple Studio', 'Dearpict'],
+    'entertainment': ['Bio Music Pro', 'Amazingdays', 'DMT Music'],
+    'catering': ['Sedap Catering', 'Asparagus Catering', 'Kartika Catering'],
+}
+
+
+def load_vendor_lists():
+    """Raw vendor entries per category from data/vendors.json (may be empty lists)."""
+    vendors_data = _load_json_file('vendors.json') or {}
+    if not isinstance(vendors_data, dict):
+        vendors_data = {}
+    lists = {cat: vendors_data.get(cat) or [] for cat in VENDOR_CATEGORIES}
+    if not lists['decoration']:
+        lists['decoration'] = vendors_data.get('decor') or []
+    return lists
+
+
+def _vendor_dict(item):
+    # vendor entries are either dicts or bare names
+    if isinstance(item, dict):
+        return {'name': item.get('name'), 'url': item.get('url'), 'image': item.get('image'), 'contact': item.get('contact')}
+    return {'name': item, 'url': None, 'image': None, 'contact': None}
+
+
+def _safe_int(v):
+    try:
+        if v is None:
+            return None
+        iv = int(v)
+        return iv if iv > 0 else None
+    except Exception:
+        return None
+
+
+def _budget_range(slots):
+    # treat missing or zero as unspecified; if only max is given, min is 50% of it
+    bmin_slot = _safe_int(slots.get('budget_min'))
+    bmax_slot = _safe_int(slots.get('budget_max'))
+    if bmin_slot is None and bmax_slot is not None:
+        bmin = max(1_000_000, int(bmax_slot * 0.5))
+    else:
+        bmin = bmin_slot if bmin_slot is not None else 5_000_000
+    bmax = bmax_slot if bmax_slot is not None else 20_000_000
+    return bmin, bmax
+
+
+def _sample_budget(bmin_val, bmax_val):
+    """Per-package budget variation around the requested range."""
+    try:
+        if bmin_val is None and bmax_val is None:
+            return None, None
+        if bmin_val is None:
+            bmin_val = int(max(1_000_000, int(bmax_val * 0.5)))
+        if bmax_val is None:
+            bmax_val = int(max(bmin_val, 20_000_000))
+        # if equal, create a small spread
+        if bmin_val == bmax_val:
+            low = int(bmin_val * 0.85)
+            high = int(bmax_val * 1.15)
+        else:
+            low = max(1, int(bmin_val * random.uniform(0.8, 1.05)))
+            high = int(bmax_val * random.uniform(0.95, 1.25))
+        if low > high:
+            low, high = high, low
+        return int(low), int(high)
+    except Exception:
+        return bmin_val, bmax_val
+
+
+def _package(vendor_items, tema, loc, budget_min, budget_max, tamu, waktu):
+    wo = vendor_items['wo']
+    pkg = {'name': wo['name']}
+    for cat in VENDOR_CATEGORIES:
+        pkg[cat] = dict(vendor_items[cat])
+    pkg.update({
+        'tema': tema,
+        'lokasi': loc,
+        'budget_min': budget_min,
+        'budget_max': budget_max,
+        'jumlah_tamu': tamu,
+        'tipe_acara': 'Resepsi',
+        'venue': f"{wo['name']} Venue, {loc}",
+        'waktu': waktu,
+        'demo': False,
+    })
+    return pkg
+
+
+def build_recommendations(slots, vendors):
+    """Composite packages (one vendor per category) for each requested location.
+
+    Vendors are shuffled and combined at random, deduplicated on
+    (wo, mua, decoration, catering), up to 8 packages per location.
+    Returns nothing when any category is missing from vendors.json, leaving
+    those requests to build_fallback_recommendations and its defaults.
+    """
+    lokasi_slot = slots.get('lokasi') or 'Bandung'
+    # support multiple requested locations (list) -> generate recommendations per-location
+    locations = lokasi_slot if isinstance(lokasi_slot, list) else [lokasi_slot]
+    tema = slots.get('tema') or 'Classic'
+    bmin, bmax = _budget_range(slots)
+    tamu = slots.get('jumlah_tamu')
+    lists = {}
+    for cat in VENDOR_CATEGORIES:
+        if not vendors.get(cat):
+            return []
+        lst = [_vendor_dict(item) for item in vendors[cat]]
+        random.shuffle(lst)
+        lists[cat] = lst
+    desired_per_location = min(8, max(1, *(len(lst) for lst in lists.values())))
+    recommendations = []
+    seen = set()
+    for loc in locations:
+        attempts = 0
+        created = 0
+        # try random combinations until we have enough or hit attempt limit
+        while created < desired_per_location and attempts < desired_per_location * 6:
+            attempts += 1
+            items = {cat: random.choice(lists[cat]) for cat in VENDOR_CATEGORIES}
+            key = (items['wo']['name'], items['mua']['name'], items['decoration']['name'], items['catering']['name'])
+            if key in seen:
+                continue
+            seen.add(key)
+            lbmin, lbmax = _sample_budget(bmin, bmax)
+            recommendations.append(_package(
+                items, tema, loc,
+                int(lbmin) if lbmin is not None else None,
+                int(lbmax) if lbmax is not None else None,
+                tamu, slots.get('waktu') or None,
+            ))
+            created += 1
+    return recommendations
+
+
+def build_fallback_recommendations(slots, vendors):
+    """Deterministic round-robin packages, used when build_recommendations produced nothing."""
+    slots = slots or {}
+    lokal_slot = slots.get('lokasi')
+    if isinstance(lokal_slot, list):
+        locations = lokal_slot
+    elif lokal_slot:
+        locations = [lokal_slot]
+    else:
+        locations = ['Bandung']
+    tema = slots.get('tema') or 'Classic'
+    bmin, bmax = _budget_range(slots)
+    tamu = slots.get('jumlah_tamu')
+    lists = {cat: vendors.get(cat) or DEFAULT_VENDORS[cat] for cat in VENDOR_CATEGORIES}
+    per_loc = max(1, *(len(lst) for lst in lists.values()))
+    recommendations = []
+    for loc_idx, loc in enumerate(locations):
+        for sub_idx in range(per_loc):
+            idx = loc_idx * per_loc + sub_idx
+            items = {cat: _vendor_dict(lst[idx % len(lst)]) for cat, lst in lists.items()}
+            recommendations.append(_package(items, tema, loc, int(bmin), int(bmax), tamu, slots.get('waktu') or None))
+    return recommendations
+
+
 @app.route('/api/process', methods=['POST'])
 def process_endpoint():
     """Wrapper endpoint suitable for Vercel serverless (Flask WSGI app).
 
     It delegates to the logic inside `transformers_swp/app.py` while ensuring
-    lazy initialization is respected.
+    lazy initialization is respected. See api/profiling.py for the opt-in
+    per-request profiler.
     """
+    mode = profiling.requested(request)
+    if mode is not None:
+        return profiling.profile_view(request, mode, _process)
+    if memdiag.tracking:
+        return memdiag.track(_process, request.content_length)
+    return _process()
+
+
+def _process():
     # use lightweight ai_stub regardless of transformers_swp availability
 
     # support preflight checks from browsers
@@ -59,9 +236,13 @@ def process_endpoint():
         }
         return resp, 204, headers
 
-    data = request.get_json(force=True)
+    t_request = time.perf_counter()
+    metrics.begin_request()
+    with metrics.timer('json_parse'):
+        data = request.get_json(force=True)
     text = data.get('text', '') if isinstance(data, dict) else ''
     if not text:
+        metrics.inc('api_errors_total', reason='text_empty')
         r = jsonify({'error': 'text_empty'})
         r.headers['Access-Control-Allow-Origin'] = '*'
         r.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
@@ -70,24 +251,39 @@ def process_endpoint():
 
     # initialize lightweight ai stub (import lazily so missing deps don't crash module import)
     try:
-        from api.ai_stub import ensure_initialized, predict as ai_predict
+        from api.ai_stub import ensure_initialized, model_version
+        from api.request_log import log_request, log_slow
+        # rules -> TF-IDF/student -> transformer, escalating on low confidence
+        from api.cascade import predict as ai_predict
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
         return jsonify({'error': 'ai_import_failed', 'message': str(e), 'trace': tb}), 500
     # Start background initialization but do not block the request on Vercel
     try:
-        ensure_initialized(sync=False)
+        with metrics.timer('init_wait'):
+            ensure_initialized(sync=False)
     except Exception:
         # ignore init failures here; ai_predict will still run with rule-based fallbacks
         pass
 
     start = time.time()
     try:
-        ai_result = ai_predict(text)
+        with metrics.timer('ai_predict'):
+            ai_result = ai_predict(text)
+        # the model's own answer, before the package-search override below; this is what gets logged for retraining
+        model_intent = ai_result.get('intent_pred')
+        path = metrics.prediction_path(ai_result)
+        # the raw probability, only when a probabilistic model answered; rule, keyword and
+        # dataset-match confidences are heuristics and must not be read as pseudo-label scores
+        model_prob = None
+        if path in ('sklearn_model', 'distilled_model', 'transformer') and not ai_result.get('overridden'):
+            # None as well when a rule overrode the model's answer
+            model_prob = ai_result.get('confidence')
         # If using the lightweight stub and the intent is package search,
         # synthesize a few demo recommendations so the frontend shows results.
         recommendations = []
+        vendors = None
         try:
             intent = ai_result.get('intent_pred')
             # normalize intent: treat related queries as package search
@@ -99,154 +295,10 @@ def process_endpoint():
                 intent = 'cari_rekomendasi_paket'
             slots = ai_result.get('slots') or {}
             if intent == 'cari_rekomendasi_paket':
-                # derive some basic fields from slots
-                lokasi_slot = slots.get('lokasi') or 'Bandung'
-                # support multiple requested locations (list) -> generate recommendations per-location
-                if isinstance(lokasi_slot, list):
-                    locations = lokasi_slot
-                else:
-                    locations = [lokasi_slot]
-                tema = slots.get('tema') or 'Classic'
-                # Interpret budget slots more robustly:
-                # - treat missing or zero as unspecified
-                # - if only max is provided, derive a reasonable min (50% of max)
-                def _safe_int(v):
-                    try:
-                        if v is None:
-                            return None
-                        iv = int(v)
-                        return iv if iv > 0 else None
-                    except Exception:
-                        return None
-
-                bmin_slot = _safe_int(slots.get('budget_min'))
-                bmax_slot = _safe_int(slots.get('budget_max'))
-                if bmin_slot is None and bmax_slot is not None:
-                    bmin = max(1_000_000, int(bmax_slot * 0.5))
-                else:
-                    bmin = bmin_slot if bmin_slot is not None else 5_000_000
-                bmax = bmax_slot if bmax_slot is not None else 20_000_000
-                # preserve None if user didn't specify jumlah_tamu
-                tamu = slots.get('jumlah_tamu') if slots.get('jumlah_tamu') is not None else None
-                # try to load vendor lists shipped with the backend and build
-                # composite package recommendations that include one vendor
-                # from several categories (WO, MUA, Decoration, Catering, Documentation/Entertainment).
-                vendors_data = _load_json_file('vendors.json') or {}
-                wo_list = vendors_data.get('wo') or vendors_data.get('wo', []) if isinstance(vendors_data, dict) else []
-                mua_list = vendors_data.get('mua') or []
-                decor_list = vendors_data.get('decoration') or vendors_data.get('decor') or []
-                doc_list = vendors_data.get('documentation') or []
-                entert_list = vendors_data.get('entertainment') or []
-                catering_list = vendors_data.get('catering') or []
-
-                # normalize vendor entries to dicts {'name', 'url', 'image', 'contact'} for consistent handling
-                def _normalize(lst):
-                    out = []
-                    for item in lst:
-                        if isinstance(item, dict):
-                            out.append({
-                                'name': item.get('name'),
-                                'url': item.get('url'),
-                                'image': item.get('image'),
-                                'contact': item.get('contact'),
-                            })
-                        else:
-                            out.append({'name': item, 'url': None, 'image': None, 'contact': None})
-                    return out
-
-                wo_list = _normalize(wo_list)
-                mua_list = _normalize(mua_list)
-                decor_list = _normalize(decor_list)
-                doc_list = _normalize(doc_list)
-                entert_list = _normalize(entert_list)
-                catering_list = _normalize(catering_list)
-
-                # shuffle lists to increase diversity of generated combinations
-                random.shuffle(wo_list)
-                random.shuffle(mua_list)
-                random.shuffle(decor_list)
-                random.shuffle(doc_list)
-                random.shuffle(entert_list)
-                random.shuffle(catering_list)
-
-                # fallback defaults if lists are empty
-                if not wo_list:
-                    wo_list = ['Sepasang Wedding Planner', 'SepasangWP Team', 'SWP Organizer']
-                if not mua_list:
-                    mua_list = ['Make Up By Yuliana Dewi', 'Giskavina', 'Kemalia Kentina']
-                if not decor_list:
-                    decor_list = ['GP Florist', 'Sadiqa Decoration', 'Aksen Dekorasi']
-                if not doc_list:
-                    doc_list = ['Alura Photography', 'The Couple Studio', 'Dearpict']
-                if not entert_list:
-                    entert_list = ['Bio Music Pro', 'Amazingdays', 'DMT Music']
-                if not catering_list:
-                    catering_list = ['Sedap Catering', 'Asparagus Catering', 'Kartika Catering']
-
-                # create recommendations: sample limited number per location, combine randomly and deduplicate
-                desired_per_location = min(8, max(1, len(wo_list), len(mua_list), len(decor_list), len(doc_list), len(entert_list), len(catering_list)))
-                seen = set()
-                for loc in locations:
-                    attempts = 0
-                    created = 0
-                    # try random combinations until we have enough or hit attempt limit
-                    while created < desired_per_location and attempts < desired_per_location * 6:
-                        attempts += 1
-                        wo_item = random.choice(wo_list)
-                        mua_item = random.choice(mua_list) if mua_list else {'name': None, 'url': None, 'image': None, 'contact': None}
-                        decor_item = random.choice(decor_list) if decor_list else {'name': None, 'url': None, 'image': None, 'contact': None}
-                        doc_item = random.choice(doc_list) if doc_list else {'name': None, 'url': None, 'image': None, 'contact': None}
-                        entert_item = random.choice(entert_list) if entert_list else {'name': None, 'url': None, 'image': None, 'contact': None}
-                        catering_item = random.choice(catering_list) if catering_list else {'name': None, 'url': None, 'image': None, 'contact': None}
-
-                        key = (wo_item.get('name'), mua_item.get('name'), decor_item.get('name'), catering_item.get('name'))
-                        if key in seen:
-                            continue
-                        seen.add(key)
-
-                        # sample per-vendor budget variation around requested budget
-                        def _sample_budget(bmin_val, bmax_val):
-                            try:
-                                if bmin_val is None and bmax_val is None:
-                                    return None, None
-                                # fallbacks
-                                if bmin_val is None:
-                                    bmin_val = int(max(1_000_000, int(bmax_val * 0.5)))
-                                if bmax_val is None:
-                                    bmax_val = int(max(bmin_val, 20_000_000))
-                                # if equal, create a small spread
-                                if bmin_val == bmax_val:
-                                    low = int(bmin_val * 0.85)
-                                    high = int(bmax_val * 1.15)
-                                else:
-                                    low = max(1, int(bmin_val * random.uniform(0.8, 1.05)))
-                                    high = int(bmax_val * random.uniform(0.95, 1.25))
-                                if low > high:
-                                    low, high = high, low
-                                return int(low), int(high)
-                            except Exception:
-                                return bmin_val, bmax_val
-                        lbmin, lbmax = _sample_budget(bmin, bmax)
-
-                        recommendations.append({
-                            'name': wo_item.get('name'),
-                            'wo': {'name': wo_item.get('name'), 'url': wo_item.get('url'), 'image': wo_item.get('image'), 'contact': wo_item.get('contact')},
-                            'mua': {'name': mua_item.get('name'), 'url': mua_item.get('url'), 'image': mua_item.get('image'), 'contact': mua_item.get('contact')},
-                            'decoration': {'name': decor_item.get('name'), 'url': decor_item.get('url'), 'image': decor_item.get('image'), 'contact': decor_item.get('contact')},
-                            'documentation': {'name': doc_item.get('name'), 'url': doc_item.get('url'), 'image': doc_item.get('image'), 'contact': doc_item.get('contact')},
-                            'entertainment': {'name': entert_item.get('name'), 'url': entert_item.get('url'), 'image': entert_item.get('image'), 'contact': entert_item.get('contact')},
-                            'catering': {'name': catering_item.get('name'), 'url': catering_item.get('url'), 'image': catering_item.get('image'), 'contact': catering_item.get('contact')},
-                            'tema': tema,
-                            'lokasi': loc,
-                            'budget_min': int(lbmin) if lbmin is not None else None,
-                            'budget_max': int(lbmax) if lbmax is not None else None,
-                            'jumlah_tamu': tamu,
-                            'tipe_acara': 'Resepsi',
-                            'venue': f"{wo_item.get('name')} Venue, {loc}",
-                            'waktu': slots.get('waktu') or None,
-                            'demo': False,
-                        })
-                        created += 1
+                with metrics.timer('vendor_load'):
+                    vendors = load_vendor_lists()
+                with metrics.timer('recommendation'):
+                    recommendations = build_recommendations(slots, vendors)
         except Exception:
             recommendations = []
         # ensure ai_result reflects any intent/slot overrides so frontend sees them
@@ -270,92 +322,12 @@ def process_endpoint():
         try:
             text_lower = text.lower() if isinstance(text, str) else ''
             if (not recommendations) and any(k in text_lower for k in ('rekomendasi', 'paket', 'mua', 'venue', 'dekor', 'catering', 'vendor', 'cari')):
-                # regenerate recommendations using slots (safely recompute local vars)
                 try:
-                    # compute local slot values with safe defaults
-                    lokal_slot = slots.get('lokasi') if slots else None
-                    if isinstance(lokal_slot, list):
-                        locations = lokal_slot
-                    elif lokal_slot:
-                        locations = [lokal_slot]
-                    else:
-                        locations = ['Bandung']
-                    tema_local = slots.get('tema') if slots and slots.get('tema') else 'Classic'
-                    def _safe_int_local(v):
-                        try:
-                            if v is None:
-                                return None
-                            iv = int(v)
-                            return iv if iv > 0 else None
-                        except Exception:
-                            return None
-
-                    bmin_local_slot = _safe_int_local(slots.get('budget_min') if slots else None)
-                    bmax_local_slot = _safe_int_local(slots.get('budget_max') if slots else None)
-                    if bmin_local_slot is None and bmax_local_slot is not None:
-                        bmin_local = max(1_000_000, int(bmax_local_slot * 0.5))
-                    else:
-                        bmin_local = bmin_local_slot if bmin_local_slot is not None else 5_000_000
-                    bmax_local = bmax_local_slot if bmax_local_slot is not None else 20_000_000
-                    tamu_local = slots.get('jumlah_tamu') if slots and slots.get('jumlah_tamu') is not None else None
-
-                    vendors_data = _load_json_file('vendors.json') or {}
-                    wo_list = vendors_data.get('wo') or []
-                    mua_list = vendors_data.get('mua') or []
-                    decor_list = vendors_data.get('decoration') or vendors_data.get('decor') or []
-                    doc_list = vendors_data.get('documentation') or []
-                    entert_list = vendors_data.get('entertainment') or []
-                    catering_list = vendors_data.get('catering') or []
-                    if not wo_list:
-                        wo_list = ['Sepasang Wedding Planner', 'SepasangWP Team', 'SWP Organizer']
-                    if not mua_list:
-                        mua_list = ['Make Up By Yuliana Dewi', 'Giskavina', 'Kemalia Kentina']
-                    if not decor_list:
-                        decor_list = ['GP Florist', 'Sadiqa Decoration', 'Aksen Dekorasi']
-                    if not doc_list:
-                        doc_list = ['Alura Photography', 'The Couple Studio', 'Dearpict']
-                    if not entert_list:
-                        entert_list = ['Bio Music Pro', 'Amazingdays', 'DMT Music']
-                    if not catering_list:
-                        catering_list = ['Sedap Catering', 'Asparagus Catering', 'Kartika Catering']
-                    per_loc = max(1, len(wo_list), len(mua_list), len(decor_list), len(doc_list), len(entert_list), len(catering_list))
-                    for loc_idx, loc in enumerate(locations):
-                        for sub_idx in range(per_loc):
-                            def _vendor_fields(item):
-                                if isinstance(item, dict):
-                                    return item.get('name'), item.get('url'), item.get('image'), item.get('contact')
-                                return (item, None, None, None)
-                            idx = loc_idx * per_loc + sub_idx
-                            wo_item = wo_list[idx % len(wo_list)]
-                            mua_item = mua_list[idx % len(mua_list)]
-                            decor_item = decor_list[idx % len(decor_list)]
-                            doc_item = doc_list[idx % len(doc_list)]
-                            entert_item = entert_list[idx % len(entert_list)]
-                            catering_item = catering_list[idx % len(catering_list)]
-                            wo_name, wo_url, wo_image, wo_contact = _vendor_fields(wo_item)
-                            mua_name, mua_url, mua_image, mua_contact = _vendor_fields(mua_item)
-                            decor_name, decor_url, decor_image, decor_contact = _vendor_fields(decor_item)
-                            doc_name, doc_url, doc_image, doc_contact = _vendor_fields(doc_item)
-                            entert_name, entert_url, entert_image, entert_contact = _vendor_fields(entert_item)
-                            catering_name, catering_url, catering_image, catering_contact = _vendor_fields(catering_item)
-                            recommendations.append({
-                                'name': f"{wo_name}",
-                                'wo': {'name': wo_name, 'url': wo_url, 'image': wo_image, 'contact': wo_contact},
-                                'mua': {'name': mua_name, 'url': mua_url, 'image': mua_image, 'contact': mua_contact},
-                                'decoration': {'name': decor_name, 'url': decor_url, 'image': decor_image, 'contact': decor_contact},
-                                'documentation': {'name': doc_name, 'url': doc_url, 'image': doc_image, 'contact': doc_contact},
-                                'entertainment': {'name': entert_name, 'url': entert_url, 'image': entert_image, 'contact': entert_contact},
-                                'catering': {'name': catering_name, 'url': catering_url, 'image': catering_image, 'contact': catering_contact},
-                                'tema': tema_local,
-                                'lokasi': loc,
-                                'budget_min': int(bmin_local),
-                                'budget_max': int(bmax_local),
-                                'jumlah_tamu': tamu_local,
-                                'tipe_acara': 'Resepsi',
-                                'venue': f"{wo_name} Venue, {loc}",
-                                'waktu': slots.get('waktu') or None,
-                                'demo': False,
-                            })
+                    if vendors is None:
+                        with metrics.timer('vendor_load'):
+                            vendors = load_vendor_lists()
+                    with metrics.timer('recommendation'):
+                        recommendations = build_fallback_recommendations(slots, vendors)
                 except Exception:
                     pass
         except Exception:
@@ -366,6 +338,7 @@ def process_endpoint():
             'intent': ai_result.get('intent_pred'),
             'slots': ai_result.get('slots'),
             'probabilities': ai_result.get('probs'),
+            'stage': ai_result.get('stage'),
             'recommendations': recommendations,
             'wedding_package': None,
             'assistant_reply': None,
@@ -373,18 +346,85 @@ def process_endpoint():
             'torch_available': torch_available,
         }
         response['_processing_time_ms'] = int((time.time() - start) * 1000)
-        r = jsonify(response)
+        # enqueue only; written by the request_log background thread
+        log_request({
+            'ts': time.time(),
+            'text': text,
+            'intent': model_intent,
+            'response_intent': response['intent'],
+            'slots': response['slots'],
+            'stage': response['stage'],
+            'source': path,
+            'model_prob': model_prob,
+            'latency_ms': response['_processing_time_ms'],
+            'model_version': model_version(),
+            'n_recommendations': len(recommendations),
+        })
+        with metrics.timer('serialize'):
+            r = jsonify(response)
         r.headers['Access-Control-Allow-Origin'] = '*'
         r.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
         r.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+        total_s = time.perf_counter() - t_request
+        stages = metrics.end_request()
+        r.headers['Server-Timing'] = metrics.server_timing(stages, total_s)
+        # lets cross-origin frontends see Server-Timing in devtools / PerformanceResourceTiming
+        r.headers['Timing-Allow-Origin'] = '*'
+        log_slow({
+            'ts': time.time(),
+            'total_ms': round(total_s * 1000, 2),
+            'stages_ms': {k: round(v * 1000, 2) for k, v in stages.items()},
+            'text': text[:2000],
+            'text_chars': len(text),
+            'text_tokens': len(text.split()),
+            'body_bytes': request.content_length,
+            'intent': model_intent,
+            'path': path,
+            'n_recommendations': len(recommendations),
+            'response_bytes': r.calculate_content_length(),
+        }, total_s * 1000)
+        metrics.inc('api_requests_total', intent=model_intent or 'unknown', path=path)
+        metrics.observe('api_request_seconds', total_s)
         return r
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
+        metrics.end_request()
+        metrics.inc('api_errors_total', reason='internal_error')
         print('Error in serverless wrapper (stub):', tb)
         return jsonify({'error': 'internal_error', 'message': str(e), 'trace': tb}), 500
 
 
+@app.route('/api/ready', methods=['GET'])
+def ready_endpoint():
+    """Readiness of this process's own ai_stub (api/health.py's checks, without the shared state file)."""
+    # a probe on a cold instance starts the background init it is waiting for
+    try:
+        from api.ai_stub import ensure_initialized, init_state
+        ensure_initialized(sync=False)
+        state = init_state()
+    except Exception as e:
+        state = {'error': repr(e)}
+    return readiness(state)
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of the per-stage histograms and request counters."""
+    return metrics.exposition(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@app.route('/api/memory', methods=['GET'])
+def memory_endpoint():
+    """tracemalloc / GC diagnostics; see api/memdiag.py for the actions."""
+    if not profiling.authorized(request):
+        return jsonify({'error': 'forbidden'}), 403
+    try:
+        return jsonify(memdiag.handle(request.args))
+    except (KeyError, RuntimeError, ValueError) as e:
+        return jsonify({'error': 'bad_request', 'message': str(e)}), 400
+
+
 @app.route('/api/model-status', methods=['GET'])
 def model_status():
     """Return whether model is present on disk and start background download if missing.
@@ -515,8 +555,10 @@ def root_index():
             <p>Available endpoints:</p>
             <ul>
                 <li><a href="/api/health">/api/health</a></li>
+                <li><a href="/api/ready">/api/ready</a></li>
                 <li><a href="/api/model-status">/api/model-status</a></li>
                 <li><a href="/api/process">/api/process</a> (POST)</li>
+                <li><a href="/api/metrics">/api/metrics</a></li>
                 <li><a href="/api/landing-page">/api/landing-page</a></li>
                 <li><a href="/api/our-events">/api/our-events</a></li>
                 <li><a href="/api/testimonials">/api/testimonials</a></li>
@@ -0,0 +1,160 @@
+"""Opt-in per-request profiling for /api/process.
+
+Disabled unless PROFILE_SECRET is set. A request is profiled when it
+carries `X-Profile: cprofile|sample|all` (or `?profile=...`) together with
+`X-Profile-Token: <PROFILE_SECRET>` (or `?profile_token=...`). The profile
+is returned in the JSON body under `_profile` or, with
+`X-Profile-Output: store`, written to PROFILE_DIR:
+
+  cprofile - pstats text sorted by cumulative time (+ binary .prof when stored)
+  sample   - collapsed stacks from a wall-clock sampler, one
+             `frame;frame;... count` line per stack (flamegraph.pl / speedscope)
+  all      - both
+
+With PROFILE_SECRET unset the check costs one global test per request.
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/profiles')
+SAMPLE_INTERVAL_S = float(os.environ.get('PROFILE_SAMPLE_MS', '1')) / 1000.0
+PSTATS_TOP = int(os.environ.get('PROFILE_TOP', '60'))
+MODES = ('cprofile', 'sample', 'all')
+
+# cProfile (sys.setprofile / sys.monitoring) allows one active profiler per process
+_busy = threading.Lock()
+
+
+def authorized(req) -> bool:
+    """Whether a Flask request carries PROFILE_SECRET (also guards api/memdiag.py)."""
+    if not PROFILE_SECRET:
+        return False
+    token = req.headers.get('X-Profile-Token') or req.args.get('profile_token') or ''
+    return hmac.compare_digest(token.encode('utf-8'), PROFILE_SECRET.encode('utf-8'))
+
+
+def requested(req) -> Optional[str]:
+    """Profiling mode asked for by a Flask request, or None."""
+    if not PROFILE_SECRET:
+        return None
+    mode = req.headers.get('X-Profile') or req.args.get('profile')
+    if not mode or not authorized(req):
+        return None
+    mode = mode.lower()
+    return mode if mode in MODES else 'all'
+
+
+class StackSampler:
+    """Samples one thread's Python stack every `interval` seconds."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL_S):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return '\n'.join(f'{stack} {n}' for stack, n in self.counts.most_common()) + '\n'
+
+
+def run(mode: str, fn, *args, **kwargs):
+    """Call fn under the profiler(s) for `mode`; returns (result, profile dict)."""
+    if not _busy.acquire(blocking=False):
+        return fn(*args, **kwargs), {'error': 'another profiled request is running'}
+    try:
+        prof = cProfile.Profile() if mode in ('cprofile', 'all') else None
+        sampler = StackSampler(threading.get_ident()).start() if mode in ('sample', 'all') else None
+        t0 = time.perf_counter()
+        try:
+            result = prof.runcall(fn, *args, **kwargs) if prof is not None else fn(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - t0
+            if sampler is not None:
+                sampler.stop()
+        out = {'id': f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}', 'mode': mode, 'wall_ms': wall * 1000}
+        if prof is not None:
+            buf = io.StringIO()
+            stats = pstats.Stats(prof, stream=buf)
+            stats.sort_stats('cumulative').print_stats(PSTATS_TOP)
+            out['pstats'] = buf.getvalue()
+            out['_prof'] = prof
+        if sampler is not None:
+            out['collapsed'] = sampler.collapsed()
+            out['samples'] = sampler.samples
+            out['sample_interval_ms'] = sampler.interval * 1000
+        return result, out
+    finally:
+        _busy.release()
+
+
+def store(profile: dict) -> dict:
+    """Write a profile to PROFILE_DIR; returns a summary with the file paths."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile['id'])
+    files = []
+    if 'pstats' in profile:
+        with open(base + '.pstats.txt', 'w', encoding='utf-8') as f:
+            f.write(profile['pstats'])
+        files.append(base + '.pstats.txt')
+        profile['_prof'].dump_stats(base + '.prof')
+        files.append(base + '.prof')
+    if 'collapsed' in profile:
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            f.write(profile['collapsed'])
+        files.append(base + '.collapsed')
+    summary = {k: v for k, v in profile.items() if k not in ('pstats', 'collapsed', '_prof')}
+    summary['files'] = files
+    return summary
+
+
+def profile_view(req, mode: str, view):
+    """Run a Flask view under the profiler and attach the profile to its response."""
+    rv, profile = run(mode, view)
+    if 'error' not in profile:
+        if (req.headers.get('X-Profile-Output') or req.args.get('profile_output')) == 'store':
+            profile = store(profile)
+        else:
+            profile.pop('_prof', None)
+    resp, rest = (rv[0], rv[1:]) if isinstance(rv, tuple) else (rv, ())
+    try:
+        body = resp.get_json(silent=True)
+        if isinstance(body, dict):
+            body['_profile'] = profile
+            resp.set_data(json.dumps(body, ensure_ascii=False, default=str))
+        resp.headers['X-Profile-Id'] = profile.get('id', '')
+    except AttributeError:
+        pass
+    return (resp, *rest) if rest else resp
@@ -0,0 +1,256 @@
+"""Buffered JSONL log of /api/process requests.
+
+`log_request` only does a `put_nowait` on a bounded queue; a daemon thread
+writes records in batches and rotates the file by size or age (optionally
+gzipping the rotated file). When the queue is full the record is dropped
+and counted, so a slow disk never adds latency to a request.
+
+Records hold the raw user text, so the request log is off unless
+REQUEST_LOG=1; tools/update_intent.py has nothing to learn from until it
+is enabled. Records are read back there (`text`, `intent`, `stage`,
+`source`, `model_prob`, `slots`). With several worker processes, put
+`{pid}` in REQUEST_LOG_PATH so each one rotates its own file. The slow log
+keeps its stage timings either way but drops `text` while REQUEST_LOG is off.
+
+Written, dropped, rotated and failed counts are exported as
+`request_log_*_total{log=...}` counters on /api/metrics.
+"""
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Dict, Optional
+
+from api import metrics
+
+# /tmp is the only writable location on Vercel
+LOG_PATH = os.environ.get('REQUEST_LOG_PATH', '/tmp/requests.jsonl')
+ENABLED = os.environ.get('REQUEST_LOG', '').lower() in ('1', 'true', 'yes')
+MAX_BYTES = int(os.environ.get('REQUEST_LOG_MAX_BYTES', str(50 * 1024 * 1024)))
+MAX_AGE_S = float(os.environ.get('REQUEST_LOG_MAX_AGE_S', '86400'))
+COMPRESS = os.environ.get('REQUEST_LOG_GZIP', '').lower() in ('1', 'true', 'yes')
+QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE', '10000'))
+KEEP_ROTATED = int(os.environ.get('REQUEST_LOG_KEEP', '10'))
+# requests slower than SLOW_REQUEST_MS also go to the slow log, with their stage breakdown
+SLOW_LOG_PATH = os.environ.get('SLOW_LOG_PATH', '/tmp/slow_requests.jsonl')
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '500'))
+
+_STOP = object()
+
+
+class RequestLogger:
+    def __init__(self, path: str, name: str = 'requests', max_bytes: int = MAX_BYTES, max_age_s: float = MAX_AGE_S, compress: bool = COMPRESS,
+                 queue_size: int = QUEUE_SIZE, batch_size: int = 256, flush_interval_s: float = 1.0, keep: int = KEEP_ROTATED):
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.compress = compress
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.keep = keep
+        self._q = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._fh = None
+        self._opened_at = None
+        self._stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'rotations': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+        self._thread.start()
+
+    def log(self, record: Dict) -> bool:
+        """Enqueue a record; False (and a counted drop) if the queue is full."""
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            metrics.inc('request_log_dropped_total', log=self.name)
+            return False
+        with self._lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+        out['queue_depth'] = self._q.qsize()
+        out['path'] = self.path
+        return out
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything enqueued so far is on disk."""
+        deadline = time.time() + timeout
+        while self._q.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+        return not self._q.unfinished_tasks
+
+    def close(self, timeout: float = 5.0):
+        if not self._thread.is_alive():
+            return
+        try:
+            self._q.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = []
+            stop = False
+            try:
+                item = self._q.get(timeout=self.flush_interval_s)
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+                while not stop and len(batch) < self.batch_size:
+                    item = self._q.get_nowait()
+                    if item is _STOP:
+                        stop = True
+                    else:
+                        batch.append(item)
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self._write(batch)
+                self._maybe_rotate()
+            except Exception:
+                with self._lock:
+                    self._stats['errors'] += 1
+                metrics.inc('request_log_errors_total', log=self.name)
+                self._close_fh()
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._q.task_done()
+            if stop:
+                self._close_fh()
+                return
+
+    def _open(self):
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._fh = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+
+    def _close_fh(self):
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+        self._fh = None
+
+    def _write(self, batch):
+        if self._fh is None:
+            self._open()
+        self._fh.write(''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in batch))
+        self._fh.flush()
+        with self._lock:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+        metrics.inc('request_log_written_total', len(batch), log=self.name)
+
+    def _maybe_rotate(self):
+        if self._fh is None:
+            return
+        size = self._fh.tell()
+        if not size:
+            return
+        too_big = self.max_bytes and size >= self.max_bytes
+        too_old = self.max_age_s and time.time() - self._opened_at >= self.max_age_s
+        if too_big or too_old:
+            self._rotate()
+
+    def _rotate(self):
+        self._close_fh()
+        base = f'{self.path}.{time.strftime("%Y%m%d-%H%M%S")}'
+        dest = base
+        n = 1
+        while os.path.exists(dest) or os.path.exists(dest + '.gz'):
+            dest = f'{base}.{n}'
+            n += 1
+        os.replace(self.path, dest)
+        if self.compress:
+            with open(dest, 'rb') as src, gzip.open(dest + '.gz', 'wb') as out:
+                shutil.copyfileobj(src, out)
+            os.remove(dest)
+        with self._lock:
+            self._stats['rotations'] += 1
+        metrics.inc('request_log_rotations_total', log=self.name)
+        self._prune()
+
+    def _prune(self):
+        if self.keep is None or self.keep < 0:
+            return
+        parent = os.path.dirname(self.path) or '.'
+        prefix = os.path.basename(self.path) + '.'
+        rotated = sorted(
+            (os.path.join(parent, f) for f in os.listdir(parent) if f.startswith(prefix) and not f.endswith('.tmp')),
+            key=os.path.getmtime,
+        )
+        for old in rotated[:max(0, len(rotated) - self.keep)]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+_logger = None
+_slow_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_logger() -> Optional[RequestLogger]:
+    global _logger
+    if not ENABLED:
+        return None
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = RequestLogger(LOG_PATH.format(pid=os.getpid()))
+                atexit.register(_logger.close)
+    return _logger
+
+
+def get_slow_logger() -> Optional[RequestLogger]:
+    global _slow_logger
+    if SLOW_REQUEST_MS <= 0:
+        return None
+    if _slow_logger is None:
+        with _logger_lock:
+            if _slow_logger is None:
+                _slow_logger = RequestLogger(SLOW_LOG_PATH.format(pid=os.getpid()), name='slow', queue_size=1000)
+                atexit.register(_slow_logger.close)
+    return _slow_logger
+
+
+def log_request(record: Dict) -> bool:
+    logger = get_logger()
+    if logger is None:
+        return False
+    try:
+        return logger.log(record)
+    except Exception:
+        return False
+
+
+def log_slow(record: Dict, total_ms: float) -> bool:
+    """Log `record` to the slow log if `total_ms` is over SLOW_REQUEST_MS."""
+    if SLOW_REQUEST_MS <= 0 or total_ms < SLOW_REQUEST_MS:
+        return False
+    if not ENABLED:
+        record = {k: v for k, v in record.items() if k != 'text'}
+    try:
+        return get_slow_logger().log(record)
+    except Exception:
+        return False
+
+
+def stats() -> Optional[Dict]:
+    return _logger.stats() if _logger is not None else None
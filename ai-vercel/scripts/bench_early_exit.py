@@ -0,0 +1,103 @@
+"""Accuracy / average depth / latency of early-exit inference per threshold.
+
+Needs a model trained with --early_exit. Usage (from ai-vercel/):
+    python scripts/bench_early_exit.py --model_dir models/local_transformer_intent \
+        --csv api/data/dataset_pertanyaan_wedding.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import torch
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TS_PATH = os.path.join(ROOT, 'transformers_swp')
+if TS_PATH not in sys.path:
+    sys.path.insert(0, TS_PATH)
+
+from local_transformer_intent import LocalIntentPipeline, INTENT_LIST, INTENT_TO_ID  # noqa: E402
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def run(pipe, texts, labels, threshold, max_len, batch_size):
+    """Single-query latency plus batched accuracy/depth at one threshold (None = full depth)."""
+    model = pipe.model
+    n_layers = len(model.encoder.layers)
+    correct = 0
+    depth = 0
+    with torch.no_grad():
+        for i in range(0, len(texts), batch_size):
+            enc = pipe.tokenizer.encode_batch(texts[i:i + batch_size], max_len=max_len)
+            if threshold is None:
+                logits = model(enc['input_ids'], enc['attention_mask'])
+                layers = torch.full((logits.size(0),), n_layers)
+            else:
+                logits, layers = model.forward_early_exit(enc['input_ids'], enc['attention_mask'], threshold)
+            correct += (logits.argmax(dim=-1) == torch.tensor(labels[i:i + batch_size])).sum().item()
+            depth += layers.sum().item()
+        lat = []
+        for t in texts:
+            enc = pipe.tokenizer.encode_batch([t], max_len=max_len)
+            t0 = time.perf_counter()
+            if threshold is None:
+                model(enc['input_ids'], enc['attention_mask'])
+            else:
+                model.forward_early_exit(enc['input_ids'], enc['attention_mask'], threshold)
+            lat.append((time.perf_counter() - t0) * 1000.0)
+    n = max(1, len(texts))
+    return {
+        'threshold': threshold,
+        'accuracy': correct / n,
+        'avg_layers': depth / n,
+        'layers_total': n_layers,
+        'latency_ms_p50': _percentile(lat, 50),
+        'latency_ms_p95': _percentile(lat, 95),
+        'latency_ms_mean': sum(lat) / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_dir', default=os.path.join(ROOT, 'models', 'local_transformer_intent'))
+    parser.add_argument('--csv', default=os.path.join(ROOT, 'api', 'data', 'dataset_pertanyaan_wedding.csv'))
+    parser.add_argument('--thresholds', default='0.5,0.6,0.7,0.8,0.9,0.95,0.99')
+    parser.add_argument('--max_len', type=int, default=64)
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--num_threads', type=int, default=1)
+    parser.add_argument('--out', default='bench_early_exit.json')
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.num_threads)
+    pipe = LocalIntentPipeline(args.model_dir, device='cpu')
+    if pipe.model.exit_heads is None:
+        sys.exit('model has no early-exit heads; train with --early_exit')
+    with open(args.csv, newline='', encoding='utf-8') as f:
+        rows = [r for r in csv.DictReader(f) if r.get('text') and r.get('intent') in INTENT_TO_ID]
+    texts = [r['text'] for r in rows]
+    labels = [INTENT_TO_ID[r['intent']] for r in rows]
+
+    results = {'model_dir': os.path.abspath(args.model_dir), 'n': len(rows), 'torch_threads': torch.get_num_threads(), 'labels': INTENT_LIST, 'curve': []}
+    baseline = run(pipe, texts, labels, None, args.max_len, args.batch_size)
+    results['full_depth'] = baseline
+    print(json.dumps(baseline))
+    for th in [float(x) for x in args.thresholds.split(',') if x]:
+        row = run(pipe, texts, labels, th, args.max_len, args.batch_size)
+        row['speedup_p50'] = baseline['latency_ms_p50'] / row['latency_ms_p50'] if row['latency_ms_p50'] else None
+        row['accuracy_delta'] = row['accuracy'] - baseline['accuracy']
+        results['curve'].append(row)
+        print(json.dumps(row))
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print('Saved', args.out)
+
+
+if __name__ == '__main__':
+    main()
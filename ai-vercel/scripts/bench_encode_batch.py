@@ -0,0 +1,95 @@
+"""Examples/s of per-example encode+collate vs SimpleTokenizer.encode_batch.
+
+Usage (from ai-vercel/):
+    python scripts/bench_encode_batch.py --csv api/data/dataset_pertanyaan_wedding.csv
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+
+import torch
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TS_PATH = os.path.join(ROOT, 'transformers_swp')
+if TS_PATH not in sys.path:
+    sys.path.insert(0, TS_PATH)
+
+from local_transformer_intent import SimpleTokenizer, INTENT_TO_ID  # noqa: E402
+
+
+def legacy_collate(texts, labels, tokenizer, max_len):
+    # the original path: one tensor per example, torch.cat padding, then torch.stack
+    items = [torch.tensor(tokenizer.encode(t, max_len=max_len), dtype=torch.long) for t in texts]
+    T = max(x.size(0) for x in items)
+    input_ids, attention_mask = [], []
+    for ids in items:
+        pad_len = T - ids.size(0)
+        if pad_len > 0:
+            ids = torch.cat([ids, torch.full((pad_len,), tokenizer.pad_id, dtype=torch.long)])
+        input_ids.append(ids)
+        attention_mask.append((ids != tokenizer.pad_id).long())
+    return torch.stack(input_ids), torch.stack(attention_mask), torch.stack([torch.tensor(y) for y in labels])
+
+
+def batched_collate(texts, labels, tokenizer, max_len):
+    enc = tokenizer.encode_batch(texts, max_len=max_len)
+    return enc['input_ids'], enc['attention_mask'], torch.tensor(labels, dtype=torch.long)
+
+
+def run(fn, texts, labels, tokenizer, max_len, batch_size, min_time):
+    n = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < min_time:
+        for i in range(0, len(texts) - batch_size + 1, batch_size):
+            fn(texts[i:i + batch_size], labels[i:i + batch_size], tokenizer, max_len)
+            n += batch_size
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default=os.path.join(ROOT, 'api', 'data', 'dataset_pertanyaan_wedding.csv'))
+    parser.add_argument('--batch_sizes', default='32,64,128,256,512,1024')
+    parser.add_argument('--max_len', type=int, default=64)
+    parser.add_argument('--min_time', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='bench_encode_batch.json')
+    args = parser.parse_args()
+
+    with open(args.csv, newline='', encoding='utf-8') as f:
+        rows = [r for r in csv.DictReader(f) if r.get('text')]
+    base_texts = [r['text'] for r in rows]
+    base_labels = [INTENT_TO_ID.get(r['intent'], 0) for r in rows]
+    tokenizer = SimpleTokenizer(SimpleTokenizer.build_vocab(base_texts, min_freq=1))
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',') if b]
+    rng = random.Random(args.seed)
+    n_needed = max(batch_sizes) * 4
+    idx = [rng.randrange(len(base_texts)) for _ in range(n_needed)]
+    texts = [base_texts[i] for i in idx]
+    labels = [base_labels[i] for i in idx]
+
+    # sanity check: both paths agree on non-empty texts
+    a = legacy_collate(texts[:32], labels[:32], tokenizer, args.max_len)
+    b = batched_collate(texts[:32], labels[:32], tokenizer, args.max_len)
+    assert all(torch.equal(x, y) for x, y in zip(a, b)), 'encode_batch output differs from legacy collate'
+
+    results = {'torch_threads': torch.get_num_threads(), 'max_len': args.max_len, 'batches': []}
+    for bs in batch_sizes:
+        legacy = run(legacy_collate, texts, labels, tokenizer, args.max_len, bs, args.min_time)
+        batched = run(batched_collate, texts, labels, tokenizer, args.max_len, bs, args.min_time)
+        row = {'batch_size': bs, 'legacy_examples_per_s': legacy, 'encode_batch_examples_per_s': batched, 'speedup': batched / legacy if legacy else None}
+        results['batches'].append(row)
+        print(json.dumps(row))
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print('Saved', args.out)
+
+
+if __name__ == '__main__':
+    main()
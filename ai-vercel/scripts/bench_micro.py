@@ -0,0 +1,350 @@
+"""Microbenchmarks for the serving hot paths, with regression checks.
+
+Covers ai_stub.extract_slots_by_rule, ai_stub.predict on each path
+(sklearn model, dataset match, keyword fallback), ai_stub._do_init
+(vectorizing + k-means) on synthetic datasets of increasing size,
+LocalIntentPipeline.extract_slots_by_rule / predict, collate_fn, and the
+recommendation builder behind /api/process. Inputs come from fixed seeds.
+Benchmarks whose dependencies (sklearn, torch, flask) are missing are
+recorded as skipped.
+
+Each _do_init size runs in a fresh subprocess (module globals, clean
+heap) under --init_timeout. k-means is fitted on at most
+AI_STUB_KMEANS_SAMPLE rows and then assigns every row once, so init grows
+about linearly with the dataset (~10 s at 100k rows on a laptop-class CPU).
+
+Usage (from ai-vercel/):
+    python scripts/bench_micro.py --out bench_micro.json
+    python scripts/bench_micro.py --only ai_stub --compare bench_micro.json --max_regression 0.15
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TS_PATH = os.path.join(ROOT, 'transformers_swp')
+for p in (ROOT, TS_PATH):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+CSV_PATH = os.path.join(ROOT, 'api', 'data', 'dataset_pertanyaan_wedding.csv')
+
+CITIES = ['Bandung', 'Jakarta', 'Bogor', 'Bekasi', 'Depok', 'Cimahi', 'Garut', 'Surabaya', 'Yogyakarta', 'Sumedang']
+THEMES = ['rustic', 'modern', 'sunda', 'jawa', 'garden', 'minimalis', 'klasik', 'internasional', 'adat', 'glamour']
+TEMPLATES = {
+    'cari_rekomendasi_paket': 'cari paket pernikahan tema {tema} di {kota} untuk {tamu} tamu budget {budget} juta',
+    'estimasi_budget': 'berapa kira kira biaya nikahan {tamu} orang di {kota} tema {tema}',
+    'cari_venue': 'ada rekomendasi venue {tema} di {kota} kapasitas {tamu} orang',
+    'tanya_kemungkinan': 'bisa gak nikahan tema {tema} di {kota} dengan budget {budget} juta',
+    'cari_dekor': 'butuh dekorasi {tema} untuk resepsi di {kota}',
+    'cari_vendor': 'cari vendor mua dan dokumentasi di {kota} budget {budget} juta',
+    'cari_catering': 'catering untuk {tamu} tamu di {kota} menu {tema}',
+}
+# filler words make the vocabulary grow with the dataset, like real traffic
+FILLERS = [f'kata{i}' for i in range(400)]
+
+
+def synthetic_rows(n, seed):
+    rng = random.Random(seed)
+    intents = sorted(TEMPLATES)
+    rows = []
+    for _ in range(n):
+        intent = rng.choice(intents)
+        tema, kota = rng.choice(THEMES), rng.choice(CITIES)
+        tamu, budget = rng.choice([50, 100, 200, 300, 500]), rng.choice([15, 25, 50, 100])
+        text = TEMPLATES[intent].format(tema=tema, kota=kota, tamu=tamu, budget=budget)
+        text += ' ' + ' '.join(rng.choice(FILLERS[:rng.randint(20, len(FILLERS))]) for _ in range(rng.randint(0, 3)))
+        rows.append({'text': text.strip(), 'intent': intent, 'tema': tema, 'lokasi': kota, 'jumlah_tamu': tamu,
+                     'budget_min': budget * 500_000, 'budget_max': budget * 1_000_000})
+    return rows
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+
+def bench(fn, args_cycle, min_time=0.2, repeat=5):
+    """Per-call timings of fn over a cycle of argument tuples.
+
+    The inner loop count is calibrated so one round takes ~min_time; the
+    result is the distribution of per-call times across `repeat` rounds.
+    """
+    n_args = len(args_cycle)
+    fn(*args_cycle[0])  # warm caches / lazy imports
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for i in range(number):
+            fn(*args_cycle[i % n_args])
+        dt = time.perf_counter() - t0
+        if dt >= min_time or number >= 1 << 22:
+            break
+        number *= 2 if dt < min_time / 8 else max(2, int(min_time / max(dt, 1e-9)))
+    rounds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(number):
+            fn(*args_cycle[i % n_args])
+        rounds.append((time.perf_counter() - t0) / number)
+    us = [r * 1e6 for r in rounds]
+    median = statistics.median(us)
+    return {
+        'number': number,
+        'repeat': repeat,
+        'us_per_call_median': median,
+        'us_per_call_min': min(us),
+        'us_per_call_mean': statistics.mean(us),
+        'us_per_call_stdev': statistics.stdev(us) if len(us) > 1 else 0.0,
+        'ops_per_s': 1e6 / median if median else None,
+    }
+
+
+def load_queries(seed, n=64):
+    with open(CSV_PATH, newline='', encoding='utf-8') as f:
+        texts = [r['text'] for r in csv.DictReader(f) if r.get('text')]
+    rng = random.Random(seed)
+    return [rng.choice(texts) for _ in range(n)], texts
+
+
+# --- suites ---------------------------------------------------------------
+
+def suite_ai_stub(args, results):
+    from api import ai_stub
+    ai_stub.ensure_initialized(sync=True)
+    queries, texts = load_queries(args.seed)
+    cycle = [(q,) for q in queries]
+    results['ai_stub.extract_slots_by_rule'] = bench(ai_stub.extract_slots_by_rule, cycle, args.min_time, args.repeat)
+
+    saved = (ai_stub._sk_model, ai_stub._sk_model_loaded, ai_stub._student_model)
+    try:
+        # sklearn path: a small TF-IDF + LogisticRegression fitted on the corpus
+        try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from sklearn.linear_model import LogisticRegression
+            from sklearn.pipeline import Pipeline
+            with open(CSV_PATH, newline='', encoding='utf-8') as f:
+                rows = [r for r in csv.DictReader(f) if r.get('text') and r.get('intent')]
+            model = Pipeline([('tfidf', TfidfVectorizer(ngram_range=(1, 2))), ('clf', LogisticRegression(max_iter=1000))])
+            model.fit([r['text'] for r in rows], [r['intent'] for r in rows])
+            ai_stub._sk_model, ai_stub._sk_model_loaded, ai_stub._student_model = model, True, None
+            assert ai_stub.predict(queries[0])['override_reason'] == 'model_pred'
+            results['ai_stub.predict[sklearn_model]'] = bench(ai_stub.predict, cycle, args.min_time, args.repeat)
+        except ImportError as e:
+            results['ai_stub.predict[sklearn_model]'] = {'skipped': str(e)}
+
+        ai_stub._sk_model, ai_stub._sk_model_loaded, ai_stub._student_model = None, False, None
+        # dataset texts match themselves with Jaccard 1.0
+        assert ai_stub.predict(queries[0])['override_reason'].startswith('matched_dataset')
+        results['ai_stub.predict[dataset_match]'] = bench(ai_stub.predict, cycle, args.min_time, args.repeat)
+
+        rng = random.Random(args.seed)
+        unseen = [(' '.join(rng.choice(FILLERS) for _ in range(6)) + ' budget',) for _ in range(64)]
+        assert ai_stub.predict(unseen[0][0])['override_reason'] is None
+        results['ai_stub.predict[keyword_fallback]'] = bench(ai_stub.predict, unseen, args.min_time, args.repeat)
+    finally:
+        ai_stub._sk_model, ai_stub._sk_model_loaded, ai_stub._student_model = saved
+
+
+def init_worker(csv_path):
+    """Subprocess body for the _do_init benchmark; prints one JSON line."""
+    os.environ['AI_STUB_DATASET'] = csv_path
+    os.environ['AI_STUB_MANIFEST'] = os.devnull
+    t0 = time.perf_counter()
+    from api import ai_stub
+    t_import = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    ai_stub._do_init()
+    print(json.dumps({
+        'import_s': t_import,
+        'init_s': time.perf_counter() - t0,
+        'rows': len(ai_stub._index.rows),
+        'vocab': len(ai_stub._index.vocab),
+        'clusters': len(ai_stub._index.centroids),
+    }))
+
+
+def suite_init(args, results):
+    tmp = tempfile.mkdtemp(prefix='bench_init_')
+    for n in [int(x) for x in args.init_sizes.split(',') if x]:
+        path = os.path.join(tmp, f'rows_{n}.csv')
+        write_csv(synthetic_rows(n, args.seed), path)
+        name = f'ai_stub._do_init[{n}]'
+        runs = []
+        for _ in range(args.init_repeat):
+            try:
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), '--init_worker', path], cwd=ROOT,
+                                     capture_output=True, text=True, timeout=args.init_timeout)
+            except subprocess.TimeoutExpired:
+                runs = None
+                break
+            if out.returncode != 0:
+                results[name] = {'error': out.stderr.strip().splitlines()[-1:]}
+                break
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        else:
+            times = [r['init_s'] for r in runs]
+            results[name] = dict(runs[-1], init_s_median=statistics.median(times), init_s_min=min(times), repeat=len(runs),
+                                 us_per_call_median=statistics.median(times) * 1e6)
+        if runs is None:
+            results[name] = {'timed_out': True, 'timeout_s': args.init_timeout}
+        print(name, json.dumps(results[name]))
+
+
+def _random_pipeline(tmp):
+    """A LocalIntentPipeline with random weights (architecture cost, not accuracy)."""
+    import torch
+    from local_transformer_intent import LocalIntentPipeline, LocalTransformerClassifier, SimpleTokenizer, INTENT_LIST
+    _, texts = load_queries(0)
+    vocab = SimpleTokenizer.build_vocab(texts, min_freq=1)
+    model = LocalTransformerClassifier(vocab_size=len(vocab), num_labels=len(INTENT_LIST), pad_id=vocab.get('<pad>', 1))
+    torch.save({'vocab': vocab, 'state_dict': model.state_dict(), 'config': {}}, os.path.join(tmp, 'model.pt'))
+    return LocalIntentPipeline(tmp, device='cpu')
+
+
+def suite_transformer(args, results):
+    try:
+        import torch
+        from local_transformer_intent import LocalIntentPipeline, collate_fn
+    except ImportError as e:
+        for name in ('LocalIntentPipeline.extract_slots_by_rule', 'LocalIntentPipeline.predict', 'collate_fn[32]'):
+            results[name] = {'skipped': str(e)}
+        return
+    torch.manual_seed(args.seed)
+    torch.set_num_threads(args.num_threads)
+    queries, _ = load_queries(args.seed)
+    cycle = [(q,) for q in queries]
+    results['LocalIntentPipeline.extract_slots_by_rule'] = bench(LocalIntentPipeline.extract_slots_by_rule, cycle, args.min_time, args.repeat)
+
+    if args.model_dir and os.path.exists(os.path.join(args.model_dir, 'model.pt')):
+        pipe = LocalIntentPipeline(args.model_dir, device='cpu')
+    else:
+        pipe = _random_pipeline(tempfile.mkdtemp(prefix='bench_pipe_'))
+    results['LocalIntentPipeline.predict'] = bench(pipe.predict, cycle, args.min_time, args.repeat)
+
+    g = torch.Generator().manual_seed(args.seed)
+    batches = []
+    for _ in range(8):
+        lengths = torch.randint(4, 64, (32,), generator=g).tolist()
+        batches.append(([{'input_ids': torch.randint(2, 1000, (n,), generator=g), 'label': torch.tensor(0)} for n in lengths],))
+    results['collate_fn[32]'] = bench(collate_fn, batches, args.min_time, args.repeat)
+
+
+def suite_recommendations(args, results):
+    try:
+        from api.process import build_recommendations, load_vendor_lists
+    except ImportError as e:
+        results['process.build_recommendations'] = {'skipped': str(e)}
+        return
+    random.seed(args.seed)
+    vendors = load_vendor_lists()
+    slot_sets = [
+        ({'lokasi': 'Bandung', 'tema': 'rustic', 'budget_max': 50_000_000, 'jumlah_tamu': 300}, vendors),
+        ({'lokasi': ['Jakarta', 'Bogor', 'Depok'], 'budget_min': 20_000_000}, vendors),
+        ({}, vendors),
+    ]
+    results['process.load_vendor_lists'] = bench(load_vendor_lists, [()], args.min_time, args.repeat)
+    results['process.build_recommendations'] = bench(build_recommendations, slot_sets, args.min_time, args.repeat)
+
+
+SUITES = {
+    'ai_stub': suite_ai_stub,
+    'init': suite_init,
+    'transformer': suite_transformer,
+    'recommendations': suite_recommendations,
+}
+
+
+def compare(results, baseline_path, max_regression):
+    """Benchmarks whose median per-call time grew by more than max_regression."""
+    with open(baseline_path, encoding='utf-8') as f:
+        base = json.load(f).get('benchmarks', {})
+    report = {}
+    for name, cur in results.items():
+        old = base.get(name) or {}
+        if 'us_per_call_median' not in cur or not old.get('us_per_call_median'):
+            continue
+        ratio = cur['us_per_call_median'] / old['us_per_call_median']
+        report[name] = {'baseline_us': old['us_per_call_median'], 'current_us': cur['us_per_call_median'],
+                        'ratio': ratio, 'regression': ratio > 1.0 + max_regression}
+    return report
+
+
+def _git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for the serving hot paths')
+    parser.add_argument('--only', default=','.join(SUITES), help='comma-separated suites: ' + ', '.join(SUITES))
+    parser.add_argument('--min_time', type=float, default=0.2, help='seconds per timing round')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--init_sizes', default='100,10000,100000')
+    parser.add_argument('--init_repeat', type=int, default=1)
+    parser.add_argument('--init_timeout', type=float, default=300.0, help='per _do_init run; recorded as timed_out when exceeded')
+    parser.add_argument('--model_dir', default=None, help='trained LocalIntentPipeline dir (random weights when omitted)')
+    parser.add_argument('--num_threads', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--compare', default=None, help='previous bench_micro.json to compare against')
+    parser.add_argument('--max_regression', type=float, default=0.15, help='allowed slowdown of the median, as a fraction')
+    parser.add_argument('--out', default='bench_micro.json')
+    parser.add_argument('--init_worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.init_worker:
+        init_worker(args.init_worker)
+        return
+
+    results = {}
+    for name in [s for s in args.only.split(',') if s]:
+        t0 = time.perf_counter()
+        SUITES[name](args, results)
+        print(f'[{name}] {time.perf_counter() - t0:.1f}s')
+    for name, r in results.items():
+        if 'us_per_call_min' in r:
+            print(f'{name:48s} {r["us_per_call_median"]:12.2f} us/call  (min {r["us_per_call_min"]:.2f}, sd {r["us_per_call_stdev"]:.2f})')
+        elif 'init_s_median' not in r:
+            print(f'{name:48s} {json.dumps(r)}')
+
+    out = {
+        'meta': {
+            'created': time.time(),
+            'git': _git_rev(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'min_time': args.min_time,
+            'repeat': args.repeat,
+        },
+        'benchmarks': results,
+    }
+    regressions = []
+    if args.compare:
+        out['comparison'] = compare(results, args.compare, args.max_regression)
+        regressions = [n for n, c in out['comparison'].items() if c['regression']]
+        for n, c in out['comparison'].items():
+            flag = 'REGRESSION' if c['regression'] else ''
+            print(f'{n:48s} x{c["ratio"]:.2f} {flag}')
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(out, f, indent=2)
+    print('Saved', args.out)
+    if regressions:
+        print(f'FAIL: {len(regressions)} benchmark(s) slower than baseline by more than {args.max_regression:.0%}:', ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Padded forward vs nested-tensor forward_fast on mixed-length batches.
+
+Checks that forward_fast matches forward, then reports examples/s for:
+  padded    - forward() with the encoder's nested-tensor path disabled
+  no_grad   - forward() under torch.no_grad() (what predict_batch used before)
+  fast      - forward_fast() (inference_mode, nested tensors, trimmed columns)
+
+Usage (from ai-vercel/):
+    python scripts/bench_nested_fast_path.py                 # random weights
+    python scripts/bench_nested_fast_path.py --model_dir models/local_transformer_intent
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+import torch
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TS_PATH = os.path.join(ROOT, 'transformers_swp')
+if TS_PATH not in sys.path:
+    sys.path.insert(0, TS_PATH)
+
+from local_transformer_intent import LocalTransformerClassifier, LocalIntentPipeline, INTENT_LIST  # noqa: E402
+
+
+@contextlib.contextmanager
+def nested_disabled(model):
+    enc = model.encoder
+    saved = (getattr(enc, 'enable_nested_tensor', None), getattr(enc, 'use_nested_tensor', None))
+    enc.enable_nested_tensor = False
+    if saved[1] is not None:
+        enc.use_nested_tensor = False
+    try:
+        yield
+    finally:
+        enc.enable_nested_tensor = saved[0]
+        if saved[1] is not None:
+            enc.use_nested_tensor = saved[1]
+
+
+def make_batch(rng, batch_size, max_len, vocab_size, pad_id, short_frac):
+    # mostly short queries with a long tail, like real traffic
+    lengths = [rng.randint(2, 8) if rng.random() < short_frac else rng.randint(max_len // 2, max_len) for _ in range(batch_size)]
+    T = max(lengths)
+    ids = torch.full((batch_size, T), pad_id, dtype=torch.long)
+    mask = torch.zeros((batch_size, T), dtype=torch.long)
+    for i, n in enumerate(lengths):
+        ids[i, :n] = torch.randint(2, vocab_size, (n,))
+        mask[i, :n] = 1
+    return ids, mask, 1.0 - sum(lengths) / float(batch_size * T)
+
+
+def throughput(fn, batches, min_time):
+    n = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < min_time:
+        for ids, mask, _ in batches:
+            fn(ids, mask)
+            n += ids.size(0)
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_dir', default=None, help='trained model dir; random weights when omitted')
+    parser.add_argument('--batch_sizes', default='8,32,128')
+    parser.add_argument('--max_len', type=int, default=64)
+    parser.add_argument('--short_frac', type=float, default=0.8, help='share of 2-8 token queries in each batch')
+    parser.add_argument('--n_batches', type=int, default=8)
+    parser.add_argument('--min_time', type=float, default=2.0)
+    parser.add_argument('--atol', type=float, default=1e-4)
+    parser.add_argument('--num_threads', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='bench_nested_fast_path.json')
+    args = parser.parse_args()
+
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    torch.manual_seed(args.seed)
+    if args.model_dir:
+        model = LocalIntentPipeline(args.model_dir, device='cpu').model
+    else:
+        model = LocalTransformerClassifier(vocab_size=5000, num_labels=len(INTENT_LIST))
+    model.eval()
+    vocab_size = model.embed.num_embeddings
+    pad_id = model.embed.padding_idx if model.embed.padding_idx is not None else 1
+
+    blockers = model.fast_path_blockers()
+    results = {'torch': torch.__version__, 'torch_threads': torch.get_num_threads(), 'fast_path_blockers': blockers, 'batches': []}
+    if blockers:
+        print('fast path not eligible:', blockers)
+
+    rng = random.Random(args.seed)
+
+    def padded(ids, mask):
+        with torch.no_grad(), nested_disabled(model):
+            return model(ids, mask)
+
+    def no_grad(ids, mask):
+        with torch.no_grad():
+            return model(ids, mask)
+
+    for bs in [int(b) for b in args.batch_sizes.split(',') if b]:
+        batches = [make_batch(rng, bs, args.max_len, vocab_size, pad_id, args.short_frac) for _ in range(args.n_batches)]
+        # correctness: fast path vs the padded reference on every batch
+        max_diff = 0.0
+        for ids, mask, _ in batches:
+            ref = padded(ids, mask)
+            fast = model.forward_fast(ids, mask)
+            max_diff = max(max_diff, (ref - fast).abs().max().item())
+        assert max_diff <= args.atol, f'forward_fast differs from forward by {max_diff:.2e} (> {args.atol})'
+        row = {
+            'batch_size': bs,
+            'padding_fraction': sum(b[2] for b in batches) / len(batches),
+            'max_abs_diff': max_diff,
+            'padded_examples_per_s': throughput(padded, batches, args.min_time),
+            'no_grad_examples_per_s': throughput(no_grad, batches, args.min_time),
+            'fast_examples_per_s': throughput(model.forward_fast, batches, args.min_time),
+        }
+        row['speedup_vs_padded'] = row['fast_examples_per_s'] / row['padded_examples_per_s']
+        results['batches'].append(row)
+        print(json.dumps(row))
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print('Saved', args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Throughput / peak-RSS / accuracy for fp32, bf16, grad accumulation and checkpointing.
+
+Each variant trains in its own subprocess; peak RSS comes from that child's
+rusage. The run fails (exit 1) if any variant's best val_acc falls more than
+--tolerance below the fp32 baseline.
+
+Usage (from ai-vercel/):
+    python scripts/bench_train_precision.py --csv api/data/dataset_pertanyaan_wedding.csv
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCRIPT = os.path.join(ROOT, 'transformers_swp', 'local_transformer_intent.py')
+
+
+def run_variant(args, extra):
+    with tempfile.TemporaryDirectory() as save_dir:
+        cmd = [
+            sys.executable, SCRIPT, '--mode', 'train',
+            '--csv', args.csv, '--save_dir', save_dir,
+            '--epochs', str(args.epochs), '--lr', str(args.lr),
+        ] + extra
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL if args.quiet else None)
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.perf_counter() - t0
+        if proc.returncode != 0:
+            raise RuntimeError(f'variant {extra} exited with {proc.returncode}')
+        with open(os.path.join(save_dir, 'train_summary.json'), encoding='utf-8') as f:
+            summary = json.load(f)
+    summary['wall_s'] = wall
+    # ru_maxrss is KiB on Linux
+    summary['peak_rss_mb'] = rusage.ru_maxrss / 1024.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default=os.path.join(ROOT, 'api', 'data', 'dataset_pertanyaan_wedding.csv'))
+    parser.add_argument('--epochs', type=int, default=4)
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--accum', type=int, default=4)
+    parser.add_argument('--lr', type=float, default=3e-4)
+    parser.add_argument('--tolerance', type=float, default=0.02)
+    parser.add_argument('--quiet', action='store_true')
+    parser.add_argument('--out', default='bench_train_precision.json')
+    args = parser.parse_args()
+
+    bs = str(args.batch_size)
+    micro = str(max(1, args.batch_size // args.accum))
+    variants = {
+        'fp32': ['--batch_size', bs],
+        'bf16': ['--batch_size', bs, '--bf16'],
+        # same effective batch, 1/accum of the activation memory
+        'fp32_accum': ['--batch_size', micro, '--grad_accum_steps', str(args.accum)],
+        'fp32_checkpointing': ['--batch_size', bs, '--grad_checkpointing'],
+        'bf16_accum_checkpointing': ['--batch_size', micro, '--grad_accum_steps', str(args.accum), '--bf16', '--grad_checkpointing'],
+    }
+    results = {'epochs': args.epochs, 'tolerance': args.tolerance, 'variants': {}}
+    for name, extra in variants.items():
+        summary = run_variant(args, extra)
+        results['variants'][name] = summary
+        print(name, json.dumps({k: summary[k] for k in ('examples_per_s', 'peak_rss_mb', 'best_val_acc', 'effective_batch_size')}))
+
+    base = results['variants']['fp32']
+    failed = []
+    for name, summary in results['variants'].items():
+        summary['throughput_vs_fp32'] = summary['examples_per_s'] / base['examples_per_s'] if base['examples_per_s'] else None
+        summary['rss_vs_fp32'] = summary['peak_rss_mb'] / base['peak_rss_mb'] if base['peak_rss_mb'] else None
+        summary['val_acc_delta'] = summary['best_val_acc'] - base['best_val_acc']
+        if summary['val_acc_delta'] < -args.tolerance:
+            failed.append(name)
+    results['failed_tolerance'] = failed
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print('Saved', args.out)
+    if failed:
+        print('val_acc outside tolerance for:', ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""CPU scaling report for train_model: threads vs DDP processes.
+
+Each configuration runs in a fresh subprocess (so torch thread pools don't
+leak between runs) and reads back save_dir/train_summary.json.
+
+Usage (from ai-vercel/):
+    python scripts/bench_train_scaling.py --csv api/data/dataset_pertanyaan_wedding.csv --max_procs 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCRIPT = os.path.join(ROOT, 'transformers_swp', 'local_transformer_intent.py')
+
+
+def run_config(args, world_size, num_threads):
+    with tempfile.TemporaryDirectory() as save_dir:
+        cmd = [
+            sys.executable, SCRIPT, '--mode', 'train',
+            '--csv', args.csv, '--save_dir', save_dir,
+            '--epochs', str(args.epochs), '--batch_size', str(args.batch_size),
+            '--world_size', str(world_size), '--num_threads', str(num_threads),
+            '--num_workers', str(args.num_workers),
+        ]
+        t0 = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL if args.quiet else None)
+        wall = time.perf_counter() - t0
+        with open(os.path.join(save_dir, 'train_summary.json'), encoding='utf-8') as f:
+            summary = json.load(f)
+    summary['wall_s'] = wall
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default=os.path.join(ROOT, 'api', 'data', 'dataset_pertanyaan_wedding.csv'))
+    parser.add_argument('--max_procs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--batch_size', type=int, default=32, help='per-process batch size')
+    parser.add_argument('--num_workers', type=int, default=0)
+    parser.add_argument('--quiet', action='store_true')
+    parser.add_argument('--out', default='bench_train_scaling.json')
+    args = parser.parse_args()
+
+    counts = sorted({n for n in (1, 2, 4, 8, 16, 32, 64, args.max_procs) if n <= args.max_procs})
+    results = {'cpu_count': os.cpu_count(), 'epochs': args.epochs, 'batch_size': args.batch_size, 'threads': [], 'ddp': []}
+    for mode in ('threads', 'ddp'):
+        base = None
+        for n in counts:
+            world, threads = (1, n) if mode == 'threads' else (n, 1)
+            summary = run_config(args, world, threads)
+            rate = summary['examples_per_s']
+            if base is None:
+                base = rate
+            # efficiency = speedup / cores used
+            row = {'cores': n, 'world_size': world, 'num_threads': threads, 'examples_per_s': rate,
+                   'speedup': rate / base if base else None, 'efficiency': (rate / base) / n if base else None,
+                   'best_val_acc': summary['best_val_acc'], 'train_time_s': summary['train_time_s'], 'wall_s': summary['wall_s']}
+            results[mode].append(row)
+            print(mode, json.dumps(row))
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print('Saved', args.out)
+
+
+if __name__ == '__main__':
+    main()
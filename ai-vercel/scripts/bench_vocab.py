@@ -0,0 +1,100 @@
+"""Compare dict vs CompactVocab for SimpleTokenizer: memory and encode throughput.
+
+Usage (from ai-vercel/):
+    python scripts/bench_vocab.py --vocab_size 50000 --n_texts 20000
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TS_PATH = os.path.join(ROOT, 'transformers_swp')
+if TS_PATH not in sys.path:
+    sys.path.insert(0, TS_PATH)
+
+from compact_vocab import CompactVocab  # noqa: E402
+from local_transformer_intent import SimpleTokenizer  # noqa: E402
+
+
+def synthetic_corpus(vocab_size, n_texts, words_per_text, seed):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < vocab_size:
+        words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 12))))
+    words = sorted(words)
+    # each word appears at least twice so build_vocab(min_freq=2) keeps it
+    base = [' '.join(words[i:i + words_per_text]) for i in range(0, len(words), words_per_text)] * 2
+    queries = [' '.join(rng.choice(words) for _ in range(words_per_text)) for _ in range(n_texts)]
+    return base, queries
+
+
+def measure_build(texts, compact):
+    tracemalloc.start()
+    vocab = SimpleTokenizer.build_vocab(texts, min_freq=2, max_size=10 ** 9, compact=compact)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # retained size: measure a fresh copy in isolation
+    blob = pickle.dumps(vocab, protocol=pickle.HIGHEST_PROTOCOL)
+    tracemalloc.start()
+    clone = pickle.loads(blob)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del clone
+    return vocab, {'build_peak_bytes': peak, 'retained_bytes': retained, 'pickle_bytes': len(blob)}
+
+
+def measure_encode(tokenizer, queries, repeats):
+    best = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for q in queries:
+            tokenizer.encode(q)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return {'encode_texts_per_s': len(queries) / best if best else 0.0, 'encode_best_s': best}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vocab_size', type=int, default=50000)
+    parser.add_argument('--n_texts', type=int, default=20000)
+    parser.add_argument('--words_per_text', type=int, default=12)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='bench_vocab.json')
+    args = parser.parse_args()
+
+    base, queries = synthetic_corpus(args.vocab_size, args.n_texts, args.words_per_text, args.seed)
+    results = {'vocab_size': args.vocab_size, 'n_texts': args.n_texts, 'words_per_text': args.words_per_text}
+
+    for name, compact in (('dict', False), ('compact', True)):
+        vocab, mem = measure_build(base, compact)
+        tok = SimpleTokenizer(vocab)
+        res = dict(mem)
+        res.update(measure_encode(tok, queries, args.repeats))
+        if compact:
+            path = args.out + '.vocab.bin'
+            vocab.save(path)
+            mapped = SimpleTokenizer(CompactVocab.load(path))
+            res['mmap'] = measure_encode(mapped, queries, args.repeats)
+            res['file_bytes'] = os.path.getsize(path)
+            os.remove(path)
+        results[name] = res
+        print(name, json.dumps(res))
+
+    d, c = results['dict'], results['compact']
+    results['retained_ratio'] = c['retained_bytes'] / d['retained_bytes'] if d['retained_bytes'] else None
+    results['encode_slowdown'] = d['encode_texts_per_s'] / c['encode_texts_per_s'] if c['encode_texts_per_s'] else None
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print('Saved', args.out)
+
+
+if __name__ == '__main__':
+    main()
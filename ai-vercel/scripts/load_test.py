@@ -0,0 +1,249 @@
+"""Load generator for /api/process driven by the dataset corpus.
+
+Queries are dataset texts with template perturbations (city, budget and
+guest-count swaps, fillers, casing, typos), so the load exercises the
+same paths as real traffic without replaying identical strings.
+
+Two load models:
+  --rps N          open loop: requests are scheduled at a fixed rate and
+                   latency is measured from the scheduled time, so queueing
+                   behind a slow server is counted (no coordinated omission)
+  --concurrency N  closed loop: N workers send back-to-back
+
+and two targets:
+  --mode inproc    Flask test client inside this process (needs flask)
+  --mode http      a running server, e.g. --url http://127.0.0.1:5000/api/process
+
+Exits with status 1 when a --max_* / --min_* threshold is exceeded.
+
+Usage (from ai-vercel/):
+    python scripts/load_test.py --mode inproc --concurrency 4 --duration 20
+    python scripts/load_test.py --mode http --rps 50 --duration 60 --max_p95_ms 300 --max_error_rate 0.01
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CITIES = ['Bandung', 'Jakarta', 'Bogor', 'Bekasi', 'Depok', 'Tangerang', 'Cimahi', 'Sumedang', 'Garut', 'Surabaya', 'Yogyakarta']
+PREFIXES = ['', '', '', 'kak, ', 'min ', 'halo, ', 'permisi, ']
+SUFFIXES = ['', '', '', ' dong', ' ya', ' kak', '?', ' makasih']
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def load_corpus(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [r for r in csv.DictReader(f) if r.get('text')]
+    cities = sorted({r['lokasi'] for r in rows if r.get('lokasi')}) or CITIES
+    return [r['text'] for r in rows], sorted(set(cities) | set(CITIES))
+
+
+def perturb(text, rng, cities, typo_rate=0.1):
+    """A realistic variant of a dataset query."""
+    t = text
+    for c in cities:
+        if c.lower() in t.lower():
+            t = re.sub(re.escape(c), rng.choice(cities), t, flags=re.IGNORECASE)
+            break
+    # budgets: '50 juta', '50jt', '500rb' -> new amount in a random spelling
+    t = re.sub(r'\d+\s*(juta|jt)\b', lambda m: f"{rng.choice([10, 15, 25, 40, 50, 75, 100, 150])}{rng.choice([' juta', 'jt', ' jt'])}", t)
+    # guest counts
+    t = re.sub(r'\d+\s*(orang|tamu|pax)\b', lambda m: f"{rng.choice([50, 100, 200, 300, 500, 1000])} {m.group(1)}", t)
+    if rng.random() < 0.2:
+        t = t.lower() if rng.random() < 0.5 else t.capitalize()
+    if rng.random() < typo_rate and len(t) > 10:
+        i = rng.randrange(1, len(t) - 1)
+        t = t[:i] + t[i + 1:]
+    return rng.choice(PREFIXES) + t + rng.choice(SUFFIXES)
+
+
+def make_sender(mode, url, timeout):
+    """Return send(text) -> (status, body_bytes) for the chosen target."""
+    if mode == 'inproc':
+        from api.process import app
+        local = threading.local()
+
+        def send(text):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = app.test_client()
+            r = client.post('/api/process', json={'text': text})
+            return r.status_code, len(r.get_data())
+        return send
+
+    def send(text):
+        req = urllib.request.Request(url, data=json.dumps({'text': text}).encode('utf-8'), headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as f:
+                return f.status, len(f.read())
+        except urllib.error.HTTPError as e:
+            return e.code, 0
+    return send
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.statuses = {}
+        self.errors = {}
+        self.bytes = 0
+
+    def add(self, latency_s, status=None, nbytes=0, error=None):
+        with self.lock:
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                self.bytes += nbytes
+                if 200 <= status < 300:
+                    self.latencies.append(latency_s * 1000.0)
+
+
+def _one(send, text, recorder, t_sched):
+    try:
+        status, nbytes = send(text)
+        recorder.add(time.perf_counter() - t_sched, status, nbytes)
+    except Exception as e:
+        recorder.add(time.perf_counter() - t_sched, error=type(e).__name__)
+
+
+def run_open_loop(send, texts, rng, rps, duration, workers, recorder):
+    interval = 1.0 / rps
+    t0 = time.perf_counter()
+    n = 0
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        while True:
+            t_sched = t0 + n * interval
+            if t_sched - t0 >= duration:
+                break
+            delay = t_sched - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ex.submit(_one, send, rng.choice(texts), recorder, t_sched)
+            n += 1
+    return n, time.perf_counter() - t0
+
+
+def run_closed_loop(send, texts, seed, concurrency, duration, recorder):
+    t0 = time.perf_counter()
+    deadline = t0 + duration
+    counts = [0] * concurrency
+
+    def worker(i):
+        wrng = random.Random(seed + i)
+        while time.perf_counter() < deadline:
+            _one(send, wrng.choice(texts), recorder, time.perf_counter())
+            counts[i] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts), time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test /api/process with perturbed dataset queries')
+    parser.add_argument('--mode', choices=('inproc', 'http'), default='inproc')
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api/process')
+    parser.add_argument('--csv', default=os.path.join(ROOT, 'api', 'data', 'dataset_pertanyaan_wedding.csv'))
+    parser.add_argument('--rps', type=float, default=None, help='open-loop target rate (default: closed loop)')
+    parser.add_argument('--concurrency', type=int, default=4, help='closed-loop workers, or the thread pool size with --rps')
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--warmup', type=int, default=20, help='requests sent (and discarded) before measuring')
+    parser.add_argument('--n_queries', type=int, default=2000, help='distinct perturbed queries to draw from')
+    parser.add_argument('--typo_rate', type=float, default=0.1)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--max_p50_ms', type=float, default=None)
+    parser.add_argument('--max_p95_ms', type=float, default=None)
+    parser.add_argument('--max_p99_ms', type=float, default=None)
+    parser.add_argument('--max_error_rate', type=float, default=None)
+    parser.add_argument('--min_rps', type=float, default=None, help='minimum achieved successful requests/s')
+    parser.add_argument('--out', default='load_test.json')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    base, cities = load_corpus(args.csv)
+    texts = [perturb(rng.choice(base), rng, cities, args.typo_rate) for _ in range(args.n_queries)]
+    send = make_sender(args.mode, args.url, args.timeout)
+
+    warm = Recorder()
+    for t in texts[:args.warmup]:
+        _one(send, t, warm, time.perf_counter())
+
+    recorder = Recorder()
+    if args.rps:
+        sent, elapsed = run_open_loop(send, texts, rng, args.rps, args.duration, args.concurrency, recorder)
+    else:
+        sent, elapsed = run_closed_loop(send, texts, args.seed, args.concurrency, args.duration, recorder)
+
+    lat = recorder.latencies
+    ok = len(lat)
+    failed = sent - ok
+    result = {
+        'mode': args.mode,
+        'target': args.url if args.mode == 'http' else 'inproc',
+        'load': {'rps': args.rps} if args.rps else {'concurrency': args.concurrency},
+        'duration_s': elapsed,
+        'sent': sent,
+        'ok': ok,
+        'error_rate': failed / sent if sent else 0.0,
+        'statuses': {str(k): v for k, v in sorted(recorder.statuses.items())},
+        'exceptions': recorder.errors,
+        'throughput_rps': ok / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': sum(lat) / ok if ok else 0.0,
+            'p50': _percentile(lat, 50),
+            'p90': _percentile(lat, 90),
+            'p95': _percentile(lat, 95),
+            'p99': _percentile(lat, 99),
+            'max': max(lat) if lat else 0.0,
+        },
+        'mean_response_bytes': recorder.bytes / max(1, sum(recorder.statuses.values())),
+    }
+
+    checks = [
+        ('p50', args.max_p50_ms, result['latency_ms']['p50'], 'max'),
+        ('p95', args.max_p95_ms, result['latency_ms']['p95'], 'max'),
+        ('p99', args.max_p99_ms, result['latency_ms']['p99'], 'max'),
+        ('error_rate', args.max_error_rate, result['error_rate'], 'max'),
+        ('throughput_rps', args.min_rps, result['throughput_rps'], 'min'),
+    ]
+    failures = []
+    for name, limit, value, kind in checks:
+        if limit is None:
+            continue
+        if (kind == 'max' and value > limit) or (kind == 'min' and value < limit):
+            failures.append(f'{name}={value:.4g} ({kind} {limit})')
+    result['threshold_failures'] = failures
+
+    print(json.dumps(result, indent=2))
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print('Saved', args.out)
+    if failures:
+        print('FAIL:', '; '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
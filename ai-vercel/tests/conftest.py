@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# same import roots the app and scripts/ use: `from api import ...`, `from compact_vocab import ...`,
+# plus the repository's tools/ for `import update_intent`
+for p in (ROOT, os.path.join(ROOT, 'transformers_swp'), os.path.join(ROOT, '..', 'tools')):
+    if p not in sys.path:
+        sys.path.insert(0, p)
@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+from api import ai_stub, cascade
+
+
+class FakePipe:
+    def __init__(self, intent='cari_dekor', prob=0.8, overridden=False):
+        self.intent, self.prob, self.overridden = intent, prob, overridden
+
+    def predict(self, text):
+        probs = {lbl: 0.0 for lbl in ai_stub.INTENT_LIST}
+        probs[self.intent] = self.prob
+        return {'text': text, 'intent_pred': self.intent, 'probs': probs, 'overridden': self.overridden, 'slots': {}}
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    calls = {'rules': 0, 'model': 0, 'slots': 0}
+    model = {'intent': 'cari_venue', 'confidence': 0.9}
+
+    def rules(text):
+        calls['rules'] += 1
+        return 'cari_vendor', 1.0
+
+    def predict(text):
+        calls['model'] += 1
+        return {'text': text, 'intent_pred': model['intent'], 'probs': {model['intent']: 1.0}, 'confidence': model['confidence']}
+
+    def slots(text):
+        calls['slots'] += 1
+        return {'lokasi': 'Bandung'}
+
+    monkeypatch.setattr(ai_stub, 'ensure_initialized', lambda sync=True: None)
+    monkeypatch.setattr(ai_stub, 'predict_by_rules', rules)
+    monkeypatch.setattr(ai_stub, 'predict', predict)
+    monkeypatch.setattr(ai_stub, 'extract_slots_by_rule', slots)
+    monkeypatch.setattr(cascade, 'model_path', lambda: 'dataset_match')
+    monkeypatch.setattr(cascade, '_thresholds', dict(cascade.DEFAULT_THRESHOLDS))
+    monkeypatch.setattr(cascade, '_thresholds_model_path', None)
+    monkeypatch.setattr(cascade, '_transformer', None)
+    monkeypatch.setattr(cascade, '_transformer_tried', True)
+    monkeypatch.setattr(cascade, '_batcher', None)
+    return calls, model
+
+
+def test_rules_without_thresholds_are_skipped(stubbed):
+    calls, _ = stubbed
+    res = cascade.predict('cari venue di bandung')
+    assert res['stage'] == 'model' and res['intent_pred'] == 'cari_venue'
+    assert res['escalations'] == []
+    assert calls == {'rules': 0, 'model': 1, 'slots': 1}
+    assert res['slots'] == {'lokasi': 'Bandung'}
+
+
+def test_rules_answer_above_threshold(stubbed, monkeypatch):
+    calls, _ = stubbed
+    monkeypatch.setitem(cascade._thresholds, 'rules', {'*': 0.5})
+    res = cascade.predict('cari vendor')
+    assert res['stage'] == 'rules' and res['intent_pred'] == 'cari_vendor'
+    assert calls['model'] == 0 and calls['slots'] == 1
+
+
+def test_low_confidence_escalates_to_transformer(stubbed, monkeypatch):
+    _, model = stubbed
+    model['confidence'] = 0.3
+    monkeypatch.setattr(cascade, '_transformer', FakePipe())
+    res = cascade.predict('dekorasi rustic')
+    assert res['stage'] == 'transformer' and res['escalations'] == ['model']
+    assert res['stage_confidence'] == 0.8 and res['confidence'] == 0.8
+    # the transformer's own slots are kept
+    assert res['slots'] == {}
+
+
+def test_last_available_stage_answers_below_threshold(stubbed):
+    _, model = stubbed
+    model['confidence'] = 0.3
+    res = cascade.predict('halo')
+    assert res['stage'] == 'model' and res['escalations'] == []
+
+
+def test_skipped_stage_answers_when_nothing_else_can(stubbed, monkeypatch):
+    calls, _ = stubbed
+    monkeypatch.setitem(cascade._thresholds, 'model', {'*': None})
+    res = cascade.predict('halo')
+    assert res['stage'] == 'model'
+    assert calls['model'] == 1 and calls['rules'] == 0
+
+
+def test_overridden_transformer_reports_no_confidence(stubbed, monkeypatch):
+    _, model = stubbed
+    model['confidence'] = 0.3
+    monkeypatch.setattr(cascade, '_transformer', FakePipe('tanya_kemungkinan', 1.0, overridden=True))
+    res = cascade.predict('cukup ga 50 juta?')
+    assert res['stage'] == 'transformer'
+    assert res['confidence'] is None and res['stage_confidence'] is None
+
+
+def test_per_intent_threshold_wins_over_default(stubbed, monkeypatch):
+    monkeypatch.setitem(cascade._thresholds, 'model', {'*': 0.6, 'cari_venue': 0.95})
+    assert cascade._threshold('model', 'cari_venue') == 0.95
+    assert cascade._threshold('model', 'cari_dekor') == 0.6
+
+
+def test_thresholds_for_another_model_path_fall_back_to_defaults(stubbed, monkeypatch):
+    monkeypatch.setitem(cascade._thresholds, 'model', {'*': 0.99})
+    monkeypatch.setattr(cascade, '_thresholds_model_path', 'sklearn_model')
+    assert cascade._threshold('model', 'cari_venue') == cascade.DEFAULT_THRESHOLDS['model']['*']
+    monkeypatch.setattr(cascade, 'model_path', lambda: 'sklearn_model')
+    assert cascade._threshold('model', 'cari_venue') == 0.99
+
+
+def test_load_thresholds_merges_file_over_defaults(tmp_path, monkeypatch):
+    path = tmp_path / 'cascade_thresholds.json'
+    path.write_text(json.dumps({'model_path': 'sklearn_model', 'thresholds': {'model': {'*': 0.7}}}))
+    monkeypatch.setattr(cascade, 'THRESHOLDS_CANDIDATES', [None, str(tmp_path / 'missing.json'), str(path)])
+    monkeypatch.setattr(cascade, '_thresholds', None)
+    monkeypatch.setattr(cascade, '_thresholds_model_path', None)
+    loaded = cascade.load_thresholds()
+    assert loaded['model'] == {'*': 0.7}
+    assert loaded['rules'] == cascade.DEFAULT_THRESHOLDS['rules']
+    assert cascade._thresholds_model_path == 'sklearn_model'
@@ -0,0 +1,72 @@
+import pickle
+import struct
+import sys
+import types
+from array import array
+
+import pytest
+
+import compact_vocab
+from compact_vocab import CompactVocab
+
+VOCAB = {'[PAD]': 0, '[UNK]': 1, 'halo': 2, 'dekorasi': 3, 'katering': 4, 'ß': 5, 'jakarta': 6}
+
+
+def test_lookup_matches_dict():
+    v = CompactVocab.from_dict(VOCAB)
+    assert len(v) == len(VOCAB)
+    assert v.to_dict() == VOCAB
+    assert v['halo'] == 2 and v.get('ß') == 5
+    assert 'missing' not in v and v.get('missing', -1) == -1
+    assert v.get(3) is None
+    with pytest.raises(KeyError):
+        v['missing']
+
+
+def test_bytes_round_trip_is_stable():
+    data = CompactVocab.from_dict(VOCAB).to_bytes()
+    again = CompactVocab.from_bytes(data)
+    assert again.to_dict() == VOCAB
+    assert again.to_bytes() == data
+
+
+def test_save_and_mmap_load(tmp_path):
+    path = str(tmp_path / 'vocab.bin')
+    CompactVocab.from_dict(VOCAB).save(path)
+    v = CompactVocab.load(path)
+    assert v._mmap is not None
+    assert dict(v.items()) == VOCAB
+    assert not (tmp_path / 'vocab.bin.tmp').exists()
+
+
+def test_reduce_pickles_loaded_vocab(tmp_path):
+    path = str(tmp_path / 'vocab.bin')
+    CompactVocab.from_dict(VOCAB).save(path)
+    v = pickle.loads(pickle.dumps(CompactVocab.load(path)))
+    assert v.to_dict() == VOCAB and v._mmap is None
+
+
+def test_binary_search_without_table():
+    v = CompactVocab.from_dict(VOCAB)
+    bare = CompactVocab(v._offsets, v._ids, v._blob)
+    assert all(bare[k] == i for k, i in VOCAB.items())
+    assert 'missing' not in bare
+
+
+def test_file_is_little_endian():
+    data = CompactVocab.from_dict({'a': 7}).to_bytes()
+    magic, n, blob_len, table_size = struct.unpack_from('<8sQQQ', data)
+    assert (magic, n, blob_len) == (b'SWPVOCB2', 1, 1)
+    ids_at = struct.calcsize('<8sQQQ') + 4 * 2
+    assert struct.unpack_from('<I', data, ids_at) == (7,)
+
+
+def test_big_endian_host_swaps(monkeypatch):
+    if sys.byteorder != 'little':
+        pytest.skip('simulates a big-endian host on a little-endian one')
+    raw = array('I', [1, 2, 300]).tobytes()
+    monkeypatch.setattr(compact_vocab, 'sys', types.SimpleNamespace(byteorder='big'))
+    swapped = compact_vocab._le_array(memoryview(raw), 'I')
+    assert isinstance(swapped, array)
+    assert list(swapped) == [0x01000000, 0x02000000, 0x2c010000]
+    assert compact_vocab._le_bytes(swapped) == raw
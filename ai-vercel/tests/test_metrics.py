@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+
+from api import metrics
+
+
+def _hist(*counts, total, n):
+    h = [0] * len(metrics.BUCKETS) + [total, n]
+    for i, c in enumerate(counts):
+        h[i] = c
+    return h
+
+
+SNAP_A = {
+    'counters': [['api_requests_total', [['intent', 'cari_venue'], ['path', 'rules']], 2]],
+    'histograms': [['api_request_seconds', [], _hist(1, 1, total=0.0012, n=2)]],
+}
+SNAP_B = {
+    'counters': [
+        ['api_requests_total', [['intent', 'cari_venue'], ['path', 'rules']], 3],
+        ['api_errors_total', [['reason', 'internal_error']], 1],
+    ],
+    # one observation above the largest bucket: only in +Inf and _count
+    'histograms': [['api_request_seconds', [], _hist(0, 1, total=30.001, n=2)]],
+}
+
+
+def test_merge_sums_counters_and_buckets():
+    counters, histograms = metrics._merge([SNAP_A, SNAP_B])
+    assert counters[('api_requests_total', (('intent', 'cari_venue'), ('path', 'rules')))] == 5
+    assert counters[('api_errors_total', (('reason', 'internal_error'),))] == 1
+    h = histograms[('api_request_seconds', ())]
+    assert h[:2] == [1, 2] and h[-1] == 4 and abs(h[-2] - 30.0022) < 1e-9
+
+
+def test_render_exposition_format():
+    lines = metrics.render([SNAP_A, SNAP_B]).splitlines()
+    assert lines[:3] == [
+        '# HELP api_errors_total Failed /api/process requests by reason',
+        '# TYPE api_errors_total counter',
+        'api_errors_total{reason="internal_error"} 1',
+    ]
+    assert '# TYPE api_request_seconds histogram' in lines
+    assert 'api_request_seconds_bucket{le="0.0005"} 1' in lines
+    assert 'api_request_seconds_bucket{le="0.001"} 3' in lines
+    assert 'api_request_seconds_bucket{le="10.0"} 3' in lines
+    assert 'api_request_seconds_bucket{le="+Inf"} 4' in lines
+    assert 'api_request_seconds_count 4' in lines
+    assert 'api_requests_total{intent="cari_venue",path="rules"} 5' in lines
+
+
+def test_label_values_are_escaped():
+    snap = {'counters': [['x_total', [['q', 'a"b\\c\nd']], 1]], 'histograms': []}
+    assert 'x_total{q="a\\"b\\\\c\\nd"} 1' in metrics.render([snap]).splitlines()
+    assert '# TYPE x_total untyped' in metrics.render([snap])
+
+
+def test_exposition_skips_and_removes_dead_pids(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'MULTIPROC_DIR', str(tmp_path))
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    dead = tmp_path / f'metrics_{proc.pid}.json'
+    dead.write_text(json.dumps(SNAP_B))
+    alive = tmp_path / f'metrics_{os.getppid()}.json'
+    alive.write_text(json.dumps(SNAP_A))
+    (tmp_path / 'metrics_notapid.json').write_text('{}')
+    out = metrics.exposition().splitlines()
+    assert not dead.exists() and alive.exists()
+    assert 'api_errors_total{reason="internal_error"} 1' not in out
+    assert any(line.startswith('api_requests_total{intent="cari_venue",path="rules"}') for line in out)
+    assert (tmp_path / f'metrics_{os.getpid()}.json').exists()
+
+
+def test_server_timing_groups_stages():
+    header = metrics.server_timing({'vendor_load': 0.001, 'recommendation': 0.002, 'ai_predict': 0.004}, 0.01)
+    assert header == 'predict;dur=4.00, recommendation;dur=3.00, total;dur=10.00'
@@ -0,0 +1,82 @@
+import gzip
+import importlib
+import json
+import os
+
+from api import metrics, request_log
+from api.request_log import RequestLogger
+
+
+def _records(n, pad=80):
+    return [{'i': i, 'text': 'x' * pad} for i in range(n)]
+
+
+def test_writes_jsonl(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    log = RequestLogger(path, name='t_write', flush_interval_s=0.01)
+    for rec in _records(5):
+        assert log.log(rec)
+    assert log.flush()
+    log.close()
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['i'] for line in f] == list(range(5))
+    st = log.stats()
+    assert st['enqueued'] == st['written'] == 5 and st['dropped'] == 0
+
+
+def test_rotation_gzip_and_keep(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    log = RequestLogger(path, name='t_rotate', max_bytes=200, compress=True, keep=2, batch_size=1, flush_interval_s=0.01)
+    for rec in _records(12):
+        log.log(rec)
+    assert log.flush()
+    log.close()
+    rotated = sorted(f for f in os.listdir(tmp_path) if f != 'requests.jsonl')
+    assert log.stats()['rotations'] >= 3
+    assert len(rotated) == 2
+    for name in rotated:
+        assert name.endswith('.gz')
+        with gzip.open(tmp_path / name, 'rt', encoding='utf-8') as f:
+            assert all('i' in json.loads(line) for line in f)
+
+
+def test_full_queue_drops_and_counts(tmp_path):
+    log = RequestLogger(str(tmp_path / 'requests.jsonl'), name='t_drop', queue_size=2)
+    # writer stopped, so nothing drains the queue
+    log.close()
+    results = [log.log(rec) for rec in _records(3)]
+    assert results == [True, True, False]
+    assert log.stats()['dropped'] == 1
+    assert 'request_log_dropped_total{log="t_drop"} 1' in metrics.render().splitlines()
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv('REQUEST_LOG', raising=False)
+    try:
+        importlib.reload(request_log)
+        assert request_log.ENABLED is False
+        assert request_log.get_logger() is None
+        assert request_log.log_request({'text': 'halo'}) is False
+        monkeypatch.setenv('REQUEST_LOG', '1')
+        assert importlib.reload(request_log).ENABLED is True
+    finally:
+        monkeypatch.undo()
+        importlib.reload(request_log)
+
+
+def test_slow_log_drops_text_while_disabled(monkeypatch):
+    seen = []
+
+    class Fake:
+        def log(self, record):
+            seen.append(record)
+            return True
+
+    monkeypatch.setattr(request_log, 'get_slow_logger', Fake)
+    monkeypatch.setattr(request_log, 'SLOW_REQUEST_MS', 10.0)
+    monkeypatch.setattr(request_log, 'ENABLED', False)
+    assert request_log.log_slow({'text': 'halo', 'total_ms': 50}, 50)
+    monkeypatch.setattr(request_log, 'ENABLED', True)
+    assert request_log.log_slow({'text': 'halo', 'total_ms': 50}, 50)
+    assert not request_log.log_slow({'text': 'halo'}, 5)
+    assert seen == [{'total_ms': 50}, {'text': 'halo', 'total_ms': 50}]
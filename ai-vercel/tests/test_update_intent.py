@@ -0,0 +1,115 @@
+import gzip
+import json
+import os
+import shutil
+
+import update_intent
+from update_intent import fingerprint, iter_new_records, label_of, pending_reads
+
+
+def _append(path, *ids, partial=False):
+    with open(path, 'a', encoding='utf-8') as f:
+        for i in ids:
+            f.write(json.dumps({'i': i, 'text': f'teks {i}'}) + '\n')
+        if partial:
+            f.write('{"i": "half')
+
+
+def _rotate(path, suffix, mtime, compress=False):
+    dest = f'{path}.{suffix}'
+    os.replace(path, dest)
+    if compress:
+        with open(dest, 'rb') as src, gzip.open(dest + '.gz', 'wb') as out:
+            shutil.copyfileobj(src, out)
+        os.remove(dest)
+        dest += '.gz'
+    os.utime(dest, (mtime, mtime))
+    return dest
+
+
+def _run(path, state):
+    """One update_intent pass over `path`: the ids read and the state it stores."""
+    ids = []
+    for p, start in pending_reads(path, state):
+        state = dict(fingerprint(p), offset=start)
+        for rec, end in iter_new_records(p, start):
+            state['offset'] = end
+            ids.append(rec['i'])
+    return ids, state
+
+
+def test_reads_only_new_complete_lines(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    _append(path, 0, 1, partial=True)
+    ids, state = _run(path, None)
+    assert ids == [0, 1]
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('"}\n')
+    _append(path, 2)
+    ids, _ = _run(path, state)
+    assert ids == ['half', 2]
+
+
+def test_rotation_after_new_file_outgrew_offset(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    _append(path, 0, 1)
+    _, state = _run(path, None)
+    _append(path, 2)
+    _rotate(path, '20261019-100000', 1000)
+    # the new file is already longer than the stored offset
+    _append(path, 3, 4, 5, 6)
+    ids, state = _run(path, state)
+    assert ids == [2, 3, 4, 5, 6]
+    assert _run(path, state)[0] == []
+
+
+def test_rotation_to_gzip(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    _append(path, 0, 1)
+    _, state = _run(path, None)
+    _append(path, 2)
+    rotated = _rotate(path, '20261019-100000', 1000, compress=True)
+    _append(path, 3)
+    assert pending_reads(path, state) == [(rotated, state['offset']), (path, 0)]
+    assert _run(path, state)[0] == [2, 3]
+
+
+def test_half_compressed_file_is_skipped(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    _append(path, 0)
+    rotated = _rotate(path, '20261019-100000', 1000)
+    # the logger is still gzipping: plain file and partial .gz side by side
+    with open(rotated + '.gz', 'wb') as f:
+        f.write(b'\x1f\x8b')
+    _append(path, 1)
+    assert update_intent.log_files(path) == [rotated, path]
+
+
+def test_pruned_file_reads_everything_left(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    _append(path, 0)
+    _, state = _run(path, None)
+    old = _rotate(path, '20261019-100000', 1000)
+    _append(path, 1)
+    newer = _rotate(path, '20261019-110000', 2000)
+    _append(path, 2)
+    os.remove(old)
+    assert pending_reads(path, state) == [(newer, 0), (path, 0)]
+
+
+def test_legacy_integer_offset(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    _append(path, 0)
+    size = os.path.getsize(path)
+    _append(path, 1)
+    assert _run(path, size)[0] == [1]
+    # shorter than the stored offset: must be a new file
+    assert pending_reads(path, size * 10) == [(path, 0)]
+
+
+def test_label_of_pseudo_labels_model_sources_only():
+    rec = {'intent': 'cari_venue', 'model_prob': 0.95}
+    assert label_of(dict(rec, source='sklearn_model'), 0.9) == ('cari_venue', 'pseudo')
+    assert label_of(dict(rec, source='dataset_match'), 0.9) == (None, None)
+    assert label_of(dict(rec, source='sklearn_model', model_prob=0.5), 0.9) == (None, None)
+    assert label_of(dict(rec, label='cari_dekor'), 0.9) == ('cari_dekor', 'labelled')
@@ -0,0 +1,199 @@
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+
+# On-disk layout (little-endian):
+#   header  : magic(8) | n_tokens(uint64) | blob_len(uint64) | table_size(uint64)
+#   offsets : uint32[n_tokens + 1]  byte offsets of each token inside blob
+#   ids     : uint32[n_tokens]      vocabulary id of each (sorted) token
+#   table   : int32[table_size]     open-addressing slots -> token index, -1 = empty
+#   blob    : utf-8 bytes of all tokens, sorted bytewise, concatenated
+_MAGIC = b'SWPVOCB2'
+_HEADER = struct.Struct('<8sQQQ')
+
+
+def _le_bytes(a) -> bytes:
+    # array.tobytes() is native byte order; the file format is little-endian
+    if sys.byteorder == 'big':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _le_array(buf: memoryview, typecode: str):
+    """View of a little-endian uint32/int32 run; a swapped copy on big-endian hosts."""
+    if sys.byteorder == 'big':
+        a = array(typecode)
+        a.frombytes(buf)
+        a.byteswap()
+        return a
+    return buf.cast(typecode)
+
+
+def _slot_hash(raw: bytes) -> int:
+    # stable across processes (unlike hash()), so the table can be persisted
+    return zlib.crc32(raw)
+
+
+class CompactVocab(Mapping):
+    """Read-only `str -> int` vocabulary backed by flat arrays.
+
+    Tokens live in one sorted utf-8 blob indexed by an offsets array, and
+    lookups go through a persisted open-addressing table (crc32 + linear
+    probing), with binary search over the sorted blob as the fallback when no
+    table is present. There are no per-token Python objects, so the
+    structure pickles to a few contiguous buffers and, when opened with
+    `load(path)`, is mmap-ed and shared by forked workers through the page
+    cache instead of being copied into each process (on big-endian hosts the
+    arrays are byte-swapped into private copies; only the blob stays mapped).
+    """
+
+    def __init__(self, offsets, ids, blob, table=None, _mmap: Optional[mmap.mmap] = None):
+        self._offsets = offsets
+        self._ids = ids
+        self._blob = blob
+        self._table = table
+        self._mask = len(table) - 1 if table is not None and len(table) else 0
+        self._mmap = _mmap
+        self._n = len(ids)
+
+    # construction
+    @classmethod
+    def from_dict(cls, vocab: Dict[str, int]) -> 'CompactVocab':
+        items = sorted((tok.encode('utf-8'), int(idx)) for tok, idx in vocab.items())
+        offsets = array('I', [0])
+        ids = array('I')
+        parts = []
+        pos = 0
+        for raw, idx in items:
+            parts.append(raw)
+            pos += len(raw)
+            offsets.append(pos)
+            ids.append(idx)
+        # load factor <= 0.5 keeps probe chains short
+        size = 1
+        while size < 2 * len(items):
+            size *= 2
+        table = array('i', [-1]) * size
+        mask = size - 1
+        for i, (raw, _) in enumerate(items):
+            slot = _slot_hash(raw) & mask
+            while table[slot] != -1:
+                slot = (slot + 1) & mask
+            table[slot] = i
+        return cls(offsets, ids, b''.join(parts), table)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CompactVocab':
+        return cls._from_buffer(memoryview(data))
+
+    @classmethod
+    def load(cls, path: str) -> 'CompactVocab':
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls._from_buffer(memoryview(mm), _mmap=mm)
+
+    @classmethod
+    def _from_buffer(cls, buf: memoryview, _mmap: Optional[mmap.mmap] = None) -> 'CompactVocab':
+        magic, n, blob_len, table_size = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC:
+            raise ValueError('not a compact vocabulary file')
+        pos = _HEADER.size
+        offsets = _le_array(buf[pos:pos + 4 * (n + 1)], 'I')
+        pos += 4 * (n + 1)
+        ids = _le_array(buf[pos:pos + 4 * n], 'I')
+        pos += 4 * n
+        table = _le_array(buf[pos:pos + 4 * table_size], 'i') if table_size else None
+        pos += 4 * table_size
+        blob = buf[pos:pos + blob_len]
+        return cls(offsets, ids, blob, table, _mmap=_mmap)
+
+    # serialization
+    def to_bytes(self) -> bytes:
+        blob_len = self._offsets[self._n] if self._n else 0
+        table_size = len(self._table) if self._table is not None else 0
+        return b''.join([
+            _HEADER.pack(_MAGIC, self._n, blob_len, table_size),
+            _le_bytes(self._offsets),
+            _le_bytes(self._ids),
+            _le_bytes(self._table) if table_size else b'',
+            bytes(self._blob[:blob_len]),
+        ])
+
+    def save(self, path: str):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, path)
+
+    def __reduce__(self):
+        return (CompactVocab.from_bytes, (self.to_bytes(),))
+
+    # lookup
+    def _token_at(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def _find(self, key: str) -> int:
+        raw = key.encode('utf-8')
+        table = self._table
+        if table is not None and self._mask:
+            mask = self._mask
+            offsets = self._offsets
+            blob = self._blob
+            slot = _slot_hash(raw) & mask
+            while True:
+                i = table[slot]
+                if i < 0:
+                    return -1
+                start = offsets[i]
+                end = offsets[i + 1]
+                if end - start == len(raw) and blob[start:end] == raw:
+                    return i
+                slot = (slot + 1) & mask
+        lo, hi = 0, self._n
+        offsets = self._offsets
+        blob = self._blob
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = bytes(blob[offsets[mid]:offsets[mid + 1]])
+            if cur < raw:
+                lo = mid + 1
+            elif cur > raw:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def get(self, key, default=None):
+        if not isinstance(key, str):
+            return default
+        i = self._find(key)
+        return self._ids[i] if i >= 0 else default
+
+    def __getitem__(self, key) -> int:
+        i = self._find(key) if isinstance(key, str) else -1
+        if i < 0:
+            raise KeyError(key)
+        return self._ids[i]
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._n):
+            yield self._token_at(i).decode('utf-8')
+
+    def __len__(self) -> int:
+        return self._n
+
+    def to_dict(self) -> Dict[str, int]:
+        return {self._token_at(i).decode('utf-8'): self._ids[i] for i in range(self._n)}
+
+    def nbytes(self) -> int:
+        table_size = len(self._table) if self._table is not None else 0
+        return 4 * (2 * self._n + 1 + table_size) + len(self._blob)
@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import sys
+import time
+from array import array
+from typing import Dict, List
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+try:
+    from local_transformer_intent import LocalIntentPipeline, INTENT_LIST, INTENT_TO_ID
+except ImportError:
+    from .local_transformer_intent import LocalIntentPipeline, INTENT_LIST, INTENT_TO_ID
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from api.hashed_linear import HashedLinearModel, features  # noqa: E402
+
+
+def read_unlabeled(paths: List[str]) -> List[str]:
+    """Texts from .txt (one per line), .jsonl ({"text": ...}) or .csv (text column)."""
+    texts = []
+    for path in paths:
+        with open(path, newline='', encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                for line in f:
+                    try:
+                        t = json.loads(line).get('text')
+                    except (ValueError, AttributeError):
+                        continue
+                    if t:
+                        texts.append(t)
+            elif path.endswith('.csv'):
+                texts.extend(r['text'] for r in csv.DictReader(f) if r.get('text'))
+            else:
+                texts.extend(line.strip() for line in f if line.strip())
+    return texts
+
+
+def teacher_soft_labels(pipe: LocalIntentPipeline, texts: List[str], temperature: float = 2.0, batch_size: int = 256, max_len: int = 64) -> torch.Tensor:
+    """Teacher probabilities at `temperature` (raw model output, no rule overrides)."""
+    out = []
+    with torch.no_grad():
+        for i in range(0, len(texts), batch_size):
+            enc = pipe.tokenizer.encode_batch(texts[i:i + batch_size], max_len=max_len)
+            logits = pipe.model(enc['input_ids'].to(pipe.device), enc['attention_mask'].to(pipe.device))
+            out.append(torch.softmax(logits.float() / temperature, dim=-1).cpu())
+    return torch.cat(out) if out else torch.zeros(0, len(INTENT_LIST))
+
+
+class _Student(nn.Module):
+    def __init__(self, n_buckets: int, num_labels: int):
+        super().__init__()
+        self.bag = nn.EmbeddingBag(n_buckets, num_labels, mode='sum')
+        self.bias = nn.Parameter(torch.zeros(num_labels))
+        nn.init.zeros_(self.bag.weight)
+
+    def forward(self, idx, offsets, weights):
+        return self.bag(idx, offsets, per_sample_weights=weights) + self.bias
+
+
+def train_student(texts: List[str], soft: torch.Tensor, hard: torch.Tensor, n_buckets: int = 16384, word_ngrams: int = 2, char_ngrams: int = 0,
+                  temperature: float = 2.0, alpha: float = 0.7, epochs: int = 30, batch_size: int = 256, lr: float = 0.05, weight_decay: float = 1e-6, seed: int = 42) -> HashedLinearModel:
+    """Fit a hashed n-gram softmax regression to the teacher's soft labels.
+
+    Loss = alpha * T^2 * KL(teacher_T || student_T) + (1 - alpha) * CE on
+    rows that have a gold label (hard >= 0; unlabelled rows are -1).
+    """
+    torch.manual_seed(seed)
+    model = _Student(n_buckets, soft.size(1))
+    opt = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
+    feats = [features(t, n_buckets, word_ngrams, char_ngrams) for t in texts]
+    n = len(texts)
+    for _ in range(epochs):
+        perm = torch.randperm(n).tolist()
+        for i in range(0, n, batch_size):
+            b = perm[i:i + batch_size]
+            idx, offsets, weights = [], [], []
+            for j in b:
+                offsets.append(len(idx))
+                idx.extend(feats[j].keys())
+                weights.extend(feats[j].values())
+            logits = model(torch.tensor(idx, dtype=torch.long), torch.tensor(offsets, dtype=torch.long), torch.tensor(weights, dtype=torch.float))
+            loss = alpha * temperature ** 2 * F.kl_div(F.log_softmax(logits / temperature, dim=-1), soft[b], reduction='batchmean')
+            y = hard[b]
+            labelled = y >= 0
+            if alpha < 1.0 and labelled.any():
+                loss = loss + (1.0 - alpha) * F.cross_entropy(logits[labelled], y[labelled])
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+    weights = array('f', model.bag.weight.detach().contiguous().view(-1).tolist())
+    meta = {'temperature': temperature, 'alpha': alpha, 'epochs': epochs, 'train_examples': n}
+    return HashedLinearModel(INTENT_LIST, weights, model.bias.detach().tolist(), n_buckets, word_ngrams, char_ngrams, meta)
+
+
+def _latency_ms(fn, texts: List[str], n: int = 500) -> float:
+    texts = (texts * (n // max(1, len(texts)) + 1))[:n]
+    fn(texts[0])
+    t0 = time.perf_counter()
+    for t in texts:
+        fn(t)
+    return (time.perf_counter() - t0) * 1000.0 / len(texts)
+
+
+def _accuracy(pred: List[str], gold: List[str]) -> float:
+    return sum(p == g for p, g in zip(pred, gold)) / max(1, len(gold))
+
+
+def distill(csv_path: str, teacher_dir: str, out_path: str, unlabeled: List[str] = None, bucket_grid: List[int] = (4096, 16384, 65536), word_ngrams: int = 2, char_ngrams: int = 0,
+            temperature: float = 2.0, alpha: float = 0.7, epochs: int = 30, val_ratio: float = 0.1, seed: int = 42, max_bytes: int = None, report_path: str = None) -> Dict:
+    """Distill the transformer into hashed-linear students and export the best one.
+
+    The labelled CSV is split exactly like train_model (same seed and
+    val_ratio) so validation rows were never seen by the teacher. One
+    student is trained per n_buckets value; the most accurate one whose JSON
+    fits `max_bytes` is written to out_path for api/ai_stub.py.
+    """
+    from sklearn.model_selection import train_test_split
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    # split the unfiltered rows as train_model does, then drop empty texts, so no teacher-train row lands in val
+    train_rows, val_rows = train_test_split(rows, test_size=val_ratio, random_state=seed, shuffle=True)
+    train_rows = [r for r in train_rows if r.get('text')]
+    val_rows = [r for r in val_rows if r.get('text')]
+    extra = read_unlabeled(unlabeled or [])
+
+    teacher = LocalIntentPipeline(teacher_dir, device='cpu')
+    train_texts = [r['text'] for r in train_rows] + extra
+    # intents outside INTENT_LIST are treated as unlabelled (-1), not as class 0
+    hard = torch.tensor([INTENT_TO_ID.get(r.get('intent'), -1) for r in train_rows] + [-1] * len(extra), dtype=torch.long)
+    t0 = time.perf_counter()
+    soft = teacher_soft_labels(teacher, train_texts, temperature=temperature)
+    teacher_label_s = time.perf_counter() - t0
+
+    val_texts = [r['text'] for r in val_rows]
+    val_gold = [r['intent'] for r in val_rows]
+    teacher_val = [INTENT_LIST[int(i)] for i in teacher_soft_labels(teacher, val_texts, temperature=1.0).argmax(dim=-1)] if val_texts else []
+    teacher_bytes = sum(os.path.getsize(os.path.join(teacher_dir, f)) for f in ('model.pt', 'vocab.bin') if os.path.exists(os.path.join(teacher_dir, f)))
+    report = {
+        'csv': os.path.abspath(csv_path),
+        'labelled_train': len(train_rows),
+        'unlabelled': len(extra),
+        'val': len(val_rows),
+        'teacher_label_s': teacher_label_s,
+        'teacher': {
+            'accuracy': _accuracy(teacher_val, val_gold),
+            'latency_ms_per_query': _latency_ms(teacher.predict, val_texts or train_texts),
+            'model_bytes': teacher_bytes,
+        },
+        'students': [],
+    }
+    best = None
+    for n_buckets in bucket_grid:
+        t0 = time.perf_counter()
+        student = train_student(train_texts, soft, hard, n_buckets=n_buckets, word_ngrams=word_ngrams, char_ngrams=char_ngrams,
+                                temperature=temperature, alpha=alpha, epochs=epochs, seed=seed)
+        fit_s = time.perf_counter() - t0
+        pred = student.predict(val_texts)
+        size = len(json.dumps(student.to_dict()).encode('utf-8'))
+        row = {
+            'n_buckets': n_buckets,
+            'word_ngrams': word_ngrams,
+            'char_ngrams': char_ngrams,
+            'accuracy': _accuracy(pred, val_gold),
+            'teacher_agreement': _accuracy(pred, teacher_val),
+            'latency_ms_per_query': _latency_ms(student.predict_proba_one, val_texts or train_texts),
+            'model_bytes': size,
+            'fit_s': fit_s,
+        }
+        report['students'].append(row)
+        print(json.dumps(row))
+        if max_bytes and size > max_bytes:
+            continue
+        if best is None or row['accuracy'] > best[0]['accuracy']:
+            best = (row, student)
+
+    if best is not None:
+        row, student = best
+        student.meta.update({'val_accuracy': row['accuracy'], 'teacher_agreement': row['teacher_agreement'], 'teacher_dir': os.path.abspath(teacher_dir)})
+        parent = os.path.dirname(out_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        student.save(out_path)
+        report['exported'] = {'path': os.path.abspath(out_path), 'n_buckets': row['n_buckets']}
+        print(f"Exported student (n_buckets={row['n_buckets']}, acc={row['accuracy']:.4f}) to {out_path}")
+    else:
+        report['exported'] = None
+        print('No student fits --max_bytes; nothing exported')
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Distill the local transformer into a hashed n-gram student for ai_stub')
+    parser.add_argument('--csv', default='dataset_pertanyaan_wedding.csv')
+    parser.add_argument('--teacher_dir', default='models/local_transformer_intent')
+    parser.add_argument('--out', default='models/intent_distilled.json')
+    parser.add_argument('--unlabeled', action='append', default=[], help='extra unlabelled texts (.txt/.jsonl/.csv); repeatable')
+    parser.add_argument('--n_buckets', default='4096,16384,65536', help='comma-separated hash sizes to compare')
+    parser.add_argument('--word_ngrams', type=int, default=2)
+    parser.add_argument('--char_ngrams', type=int, default=0, help='add hashed char n-grams of this length (0 = off)')
+    parser.add_argument('--temperature', type=float, default=2.0)
+    parser.add_argument('--alpha', type=float, default=0.7, help='weight of the soft-label loss vs gold-label CE')
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--max_bytes', type=int, default=None, help='only export students whose JSON is at most this size')
+    parser.add_argument('--report', default='bench_distill.json')
+    args = parser.parse_args()
+    distill(args.csv, args.teacher_dir, args.out, unlabeled=args.unlabeled, bucket_grid=[int(b) for b in args.n_buckets.split(',') if b],
+            word_ngrams=args.word_ngrams, char_ngrams=args.char_ngrams, temperature=args.temperature, alpha=args.alpha,
+            epochs=args.epochs, max_bytes=args.max_bytes, report_path=args.report)
@@ -1,16 +1,31 @@
 import os
 import json
 import math
+import contextlib
 import random
+import time
 from typing import List, Dict, Tuple
 
 import torch
+import torch.distributed as dist
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
+import torch.utils.checkpoint
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import Dataset, DataLoader, DistributedSampler
 import csv
 
+try:
+    from compact_vocab import CompactVocab
+    from train_metrics import StepTimer, TrainMetricsLogger, make_profiler, metrics_path_for
+    from train_checkpoint import capture_rng, restore_rng, save_checkpoint, load_checkpoint, resolve_resume, checkpoint_dir_for
+except ImportError:
+    from .compact_vocab import CompactVocab
+    from .train_metrics import StepTimer, TrainMetricsLogger, make_profiler, metrics_path_for
+    from .train_checkpoint import capture_rng, restore_rng, save_checkpoint, load_checkpoint, resolve_resume, checkpoint_dir_for
+
 # Simple whitespace tokenizer + vocabulary builder
 class SimpleTokenizer:
+    # `vocab` may be a plain dict or a CompactVocab (same Mapping interface)
     def __init__(self, vocab: Dict[str, int], unk_token: str = "<unk>", pad_token: str = "<pad>"):
         self.vocab = vocab
         self.unk_token = unk_token
@@ -19,7 +34,7 @@ class SimpleTokenizer:
         self.pad_id = self.vocab.get(self.pad_token, 1)
 
     @staticmethod
-    def build_vocab(texts: List[str], min_freq: int = 2, max_size: int = 50000) -> Dict[str, int]:
+    def build_vocab(texts: List[str], min_freq: int = 2, max_size: int = 50000, compact: bool = False) -> Dict[str, int]:
         from collections import Counter
         counter = Counter()
         for t in texts:
@@ -35,6 +50,8 @@ class SimpleTokenizer:
             vocab[tok] = len(vocab)
             if len(vocab) >= max_size:
                 break
+        if compact:
+            return CompactVocab.from_dict(vocab)
         return vocab
 
     @staticmethod
@@ -46,6 +63,29 @@ class SimpleTokenizer:
         ids = [self.vocab.get(t, self.unk_id) for t in tokens]
         return ids
 
+    def encode_batch(self, texts: List[str], max_len: int = 64) -> Dict[str, torch.Tensor]:
+        """Encode and pad a batch in one pass.
+
+        Returns contiguous `[B, T]` `input_ids` and `attention_mask` tensors,
+        where T is the longest sequence in the batch (capped by max_len).
+        Empty texts keep one attended pad position so the encoder never sees
+        a fully masked row.
+        """
+        vocab_get = self.vocab.get
+        unk_id = self.unk_id
+        rows = [[vocab_get(t, unk_id) for t in self.tokenize_static(text)[:max_len]] for text in texts]
+        lengths = [len(r) for r in rows]
+        T = max(1, max(lengths, default=0))
+        padding = [self.pad_id] * T
+        flat: List[int] = []
+        for r in rows:
+            flat.extend(r)
+            flat.extend(padding[:T - len(r)])
+        input_ids = torch.tensor(flat, dtype=torch.long).view(len(rows), T)
+        lengths_t = torch.tensor(lengths, dtype=torch.long).clamp(min=1)
+        attention_mask = (torch.arange(T).unsqueeze(0) < lengths_t.unsqueeze(1)).long()
+        return {'input_ids': input_ids, 'attention_mask': attention_mask}
+
 # Positional encoding
 class PositionalEncoding(nn.Module):
     def __init__(self, d_model: int, max_len: int = 5000):
@@ -65,7 +105,7 @@ class PositionalEncoding(nn.Module):
 
 # Transformer encoder classifier
 class LocalTransformerClassifier(nn.Module):
-    def __init__(self, vocab_size: int, num_labels: int, d_model: int = 256, nhead: int = 8, num_layers: int = 4, dim_feedforward: int = 512, dropout: float = 0.1, pad_id: int = 1):
+    def __init__(self, vocab_size: int, num_labels: int, d_model: int = 256, nhead: int = 8, num_layers: int = 4, dim_feedforward: int = 512, dropout: float = 0.1, pad_id: int = 1, early_exit: bool = False):
         super().__init__()
         self.embed = nn.Embedding(vocab_size, d_model, padding_idx=pad_id)
         self.posenc = PositionalEncoding(d_model)
@@ -73,22 +113,127 @@ class LocalTransformerClassifier(nn.Module):
         self.encoder = nn.TransformerEncoder(encoder_layer, num_layers=num_layers)
         self.layernorm = nn.LayerNorm(d_model)
         self.classifier = nn.Linear(d_model, num_labels)
+        # one intermediate classifier after each encoder layer but the last
+        # (the last one is layernorm + classifier above)
+        self.exit_heads = nn.ModuleList(
+            [nn.Sequential(nn.LayerNorm(d_model), nn.Linear(d_model, num_labels)) for _ in range(num_layers - 1)]
+        ) if early_exit else None
+        # recompute encoder activations in backward instead of storing them
+        self.grad_checkpointing = False
 
-    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    @staticmethod
+    def _pool(x: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        # Pooling: mean over valid tokens
+        mask = attention_mask.unsqueeze(-1)  # [B, T, 1]
+        summed = (x * mask).sum(dim=1)
+        lengths = mask.sum(dim=1).clamp(min=1)
+        return summed / lengths
+
+    def _final_head(self, x: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.classifier(self._pool(self.layernorm(x), attention_mask))
+
+    def _layer(self, layer: nn.Module, x: torch.Tensor, key_padding_mask: torch.Tensor) -> torch.Tensor:
+        if self.grad_checkpointing and self.training and torch.is_grad_enabled():
+            return torch.utils.checkpoint.checkpoint(layer, x, src_key_padding_mask=key_padding_mask, use_reentrant=False)
+        return layer(x, src_key_padding_mask=key_padding_mask)
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor, return_all_exits: bool = False):
+        """Logits [B, num_labels]; with return_all_exits, a list of logits
+        from every exit head followed by the final classifier."""
         # input_ids: [B, T], attention_mask: [B, T] (1 for real, 0 for pad)
         x = self.embed(input_ids)  # [B, T, D]
         x = self.posenc(x)
         # Create key_padding_mask: True for pad positions
         key_padding_mask = attention_mask == 0  # [B, T]
-        x = self.encoder(x, src_key_padding_mask=key_padding_mask)
-        x = self.layernorm(x)
-        # Pooling: mean over valid tokens
-        mask = attention_mask.unsqueeze(-1)  # [B, T, 1]
-        summed = (x * mask).sum(dim=1)
-        lengths = mask.sum(dim=1).clamp(min=1)
-        pooled = summed / lengths
-        logits = self.classifier(pooled)
-        return logits
+        if return_all_exits and self.exit_heads is not None:
+            exits = []
+            for i, layer in enumerate(self.encoder.layers):
+                x = self._layer(layer, x, key_padding_mask)
+                if i < len(self.exit_heads):
+                    exits.append(self.exit_heads[i](self._pool(x, attention_mask)))
+            exits.append(self._final_head(x, attention_mask))
+            return exits
+        if self.grad_checkpointing and self.training and torch.is_grad_enabled():
+            for layer in self.encoder.layers:
+                x = self._layer(layer, x, key_padding_mask)
+        else:
+            x = self.encoder(x, src_key_padding_mask=key_padding_mask)
+        return self._final_head(x, attention_mask)
+
+    def fast_path_blockers(self) -> List[str]:
+        """Static reasons the encoder cannot take PyTorch's nested-tensor
+        fast path (empty list = eligible). Runtime conditions - eval mode,
+        no autograd, a padding mask - are provided by forward_fast."""
+        reasons = []
+        if not getattr(self.encoder, 'enable_nested_tensor', False) or not getattr(self.encoder, 'use_nested_tensor', True):
+            reasons.append('encoder built with enable_nested_tensor=False')
+        for i, layer in enumerate(self.encoder.layers):
+            if layer.norm_first:
+                reasons.append(f'layer {i}: norm_first=True')
+            if not layer.self_attn.batch_first:
+                reasons.append(f'layer {i}: batch_first=False')
+            if not getattr(layer, 'activation_relu_or_gelu', False):
+                reasons.append(f'layer {i}: activation is not relu/gelu')
+            if not layer.self_attn._qkv_same_embed_dim:
+                reasons.append(f'layer {i}: q/k/v dims differ')
+            if layer.self_attn.num_heads % 2 == 1:
+                reasons.append(f'layer {i}: odd number of heads')
+            if layer.norm1.eps != layer.norm2.eps:
+                reasons.append(f'layer {i}: norm eps differ')
+        return reasons
+
+    def forward_fast(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """Batched inference without paying for padding.
+
+        Runs under inference_mode in eval so nn.TransformerEncoder converts
+        the padded batch to a nested tensor (attention and feed-forward only
+        see real tokens) and pads the output back with zeros. Columns that
+        are padding in every row are trimmed first. Matches forward() up to
+        float tolerance; see scripts/bench_nested_fast_path.py.
+        """
+        if self.training:
+            raise RuntimeError('forward_fast is inference-only; call model.eval() first')
+        with torch.inference_mode():
+            T = max(1, int(attention_mask.sum(dim=1).max().item())) if attention_mask.numel() else 1
+            input_ids = input_ids[:, :T]
+            attention_mask = attention_mask[:, :T]
+            x = self.posenc(self.embed(input_ids))
+            x = self.encoder(x, src_key_padding_mask=attention_mask == 0)
+            return self._final_head(x, attention_mask)
+
+    @torch.no_grad()
+    def forward_early_exit(self, input_ids: torch.Tensor, attention_mask: torch.Tensor, threshold: float = 0.9):
+        """Adaptive-depth inference.
+
+        After each encoder layer the exit head scores the still-active rows;
+        rows whose max softmax probability reaches `threshold` stop there and
+        the rest continue with a smaller batch. Returns (logits [B, C],
+        exit_layer [B]) where exit_layer is 1-based.
+        """
+        if self.exit_heads is None:
+            raise ValueError('model was built without early_exit heads')
+        x = self.posenc(self.embed(input_ids))
+        key_padding_mask = attention_mask == 0
+        B = input_ids.size(0)
+        n_layers = len(self.encoder.layers)
+        out_logits = torch.empty(B, self.classifier.out_features, device=input_ids.device)
+        exit_layer = torch.full((B,), n_layers, dtype=torch.long, device=input_ids.device)
+        active = torch.arange(B, device=input_ids.device)
+        for i, layer in enumerate(self.encoder.layers):
+            x = layer(x, src_key_padding_mask=key_padding_mask)
+            if i < n_layers - 1:
+                logits = self.exit_heads[i](self._pool(x, attention_mask))
+                done = torch.softmax(logits.float(), dim=-1).max(dim=-1).values >= threshold
+            else:
+                logits = self._final_head(x, attention_mask)
+                done = torch.ones(active.size(0), dtype=torch.bool, device=input_ids.device)
+            out_logits[active[done]] = logits[done].float()
+            exit_layer[active[done]] = i + 1
+            keep = ~done
+            if not keep.any():
+                break
+            x, key_padding_mask, attention_mask, active = x[keep], key_padding_mask[keep], attention_mask[keep], active[keep]
+        return out_logits, exit_layer
 
 # Dataset loader for CSV
 INTENT_LIST = [
@@ -97,7 +242,8 @@ INTENT_LIST = [
 INTENT_TO_ID = {label: i for i, label in enumerate(INTENT_LIST)}
 
 class WeddingCSV(Dataset):
-    def __init__(self, csv_path: str = None, tokenizer: SimpleTokenizer = None, max_len: int = 64, rows: List[Dict] = None):
+    # encode=False yields raw {'text', 'label'} items for EncodeBatchCollate
+    def __init__(self, csv_path: str = None, tokenizer: SimpleTokenizer = None, max_len: int = 64, rows: List[Dict] = None, encode: bool = True):
         self.rows = []
         if rows is not None:
             self.rows = rows
@@ -108,6 +254,7 @@ class WeddingCSV(Dataset):
                     self.rows.append(r)
         self.tokenizer = tokenizer
         self.max_len = max_len
+        self.encode = encode
 
     def __len__(self):
         return len(self.rows)
@@ -117,6 +264,8 @@ class WeddingCSV(Dataset):
         text = r['text']
         intent = r['intent']
         y = INTENT_TO_ID.get(intent, 0)
+        if not self.encode:
+            return {'text': text, 'label': y}
         ids = self.tokenizer.encode(text, max_len=self.max_len)
         return {
             'input_ids': torch.tensor(ids, dtype=torch.long),
@@ -125,25 +274,43 @@ class WeddingCSV(Dataset):
 
 # Collate with padding
 def collate_fn(batch: List[Dict], pad_id: int = 1):
-    max_len = max(len(x['input_ids']) for x in batch)
-    input_ids = []
-    attention_mask = []
-    labels = []
-    for x in batch:
-        ids = x['input_ids']
-        pad_len = max_len - ids.size(0)
-        if pad_len > 0:
-            ids = torch.cat([ids, torch.full((pad_len,), pad_id, dtype=torch.long)])
-        input_ids.append(ids)
-        attention_mask.append((ids != pad_id).long())
-        labels.append(x['label'])
+    ids = [x['input_ids'] for x in batch]
+    lengths = torch.tensor([t.size(0) for t in ids], dtype=torch.long)
+    input_ids = nn.utils.rnn.pad_sequence(ids, batch_first=True, padding_value=pad_id)
+    attention_mask = (torch.arange(input_ids.size(1)).unsqueeze(0) < lengths.unsqueeze(1)).long()
     return {
-        'input_ids': torch.stack(input_ids),
-        'attention_mask': torch.stack(attention_mask),
-        'labels': torch.stack(labels)
+        'input_ids': input_ids,
+        'attention_mask': attention_mask,
+        'labels': torch.stack([x['label'] for x in batch])
     }
 
+
+class EncodeBatchCollate:
+    """Collate raw `{'text', 'label'}` items with `SimpleTokenizer.encode_batch`."""
+
+    def __init__(self, tokenizer: SimpleTokenizer, max_len: int = 64):
+        self.tokenizer = tokenizer
+        self.max_len = max_len
+
+    def __call__(self, batch: List[Dict]) -> Dict[str, torch.Tensor]:
+        out = self.tokenizer.encode_batch([x['text'] for x in batch], max_len=self.max_len)
+        out['labels'] = torch.tensor([x['label'] for x in batch], dtype=torch.long)
+        return out
+
 # Training loop
+def _dist_ready() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+def _all_reduce_sums(*values: float) -> List[float]:
+    # sum per-rank counters so every rank sees global metrics
+    if not _dist_ready():
+        return list(values)
+    t = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(t, op=dist.ReduceOp.SUM)
+    return t.tolist()
+
+
 def evaluate(model: LocalTransformerClassifier, loader: DataLoader, device: str, criterion=None):
     model.eval()
     total_loss = 0.0
@@ -162,108 +329,397 @@ def evaluate(model: LocalTransformerClassifier, loader: DataLoader, device: str,
             preds = logits.argmax(dim=-1)
             total_correct += (preds == labels).sum().item()
             total_examples += input_ids.size(0)
+    # under DDP each rank evaluates its own shard; aggregate before averaging
+    total_loss, total_correct, total_examples = _all_reduce_sums(total_loss, total_correct, total_examples)
     avg_loss = total_loss / total_examples if total_examples else 0.0
     acc = total_correct / total_examples if total_examples else 0.0
     return avg_loss, acc
 
 
-def train_model(csv_path: str, save_dir: str = "models/local_transformer_intent", epochs: int = 8, batch_size: int = 32, lr: float = 3e-4, max_len: int = 64, device: str = None, val_ratio: float = 0.1, seed: int = 42):
-    # Build tokenizer vocab from CSV texts
-    texts = []
-    rows = []
-    with open(csv_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            texts.append(r['text'])
-            rows.append(r)
-
-    vocab = SimpleTokenizer.build_vocab(texts, min_freq=2, max_size=50000)
-    tokenizer = SimpleTokenizer(vocab)
+def _free_port() -> int:
+    import socket
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _ddp_entry(rank: int, kwargs: Dict):
+    dist.init_process_group('gloo', rank=rank, world_size=kwargs['world_size'])
+    try:
+        train_model(**kwargs)
+    finally:
+        dist.destroy_process_group()
+
+
+def train_model(csv_path: str, save_dir: str = "models/local_transformer_intent", epochs: int = 8, batch_size: int = 32, lr: float = 3e-4, max_len: int = 64, device: str = None, val_ratio: float = 0.1, seed: int = 42, compact_vocab: bool = False, packed_dir: str = None, num_workers: int = 0, num_threads: int = None, world_size: int = 1, bf16: bool = False, grad_accum_steps: int = 1, grad_checkpointing: bool = False,
+                metrics_path: str = None, log_every: int = 50, profile_start: int = None, profile_steps: int = 5,
+                resume: str = None, checkpoint_every_steps: int = 0, keep_last: int = 3, model_config: Dict = None, exit_loss_weight: float = 0.5):
+    """Train the intent classifier and keep the best checkpoint in save_dir.
+
+    num_workers feeds batches from DataLoader worker processes, num_threads
+    sets torch intra-op threads per process, and world_size > 1 spawns that
+    many local CPU processes trained with DistributedDataParallel (gloo);
+    batch_size is per process. bf16 runs forward and loss under bfloat16
+    autocast, grad_accum_steps accumulates gradients over that many batches
+    per optimizer step (effective batch = batch_size * grad_accum_steps *
+    world_size), and grad_checkpointing recomputes encoder layers in the
+    backward pass to trade compute for memory.
+
+    Per-step data-wait/forward/backward/step timings, examples/s, tokens/s
+    and step-time percentiles are appended to metrics_path (default
+    `<save_dir>_metrics.jsonl`). profile_start=N records a torch.profiler
+    window of profile_steps steps starting at global step N and writes
+    Chrome traces to `<save_dir>_traces/`.
+
+    A full checkpoint (model, optimizer, scheduler, early-stopping counters,
+    RNG state) is written atomically to `<save_dir>/checkpoints/` after every
+    epoch and, with checkpoint_every_steps, after every N optimizer steps;
+    only the newest keep_last are kept. resume='auto' (or a path) continues
+    from one and reproduces the uninterrupted run bit-for-bit on the same
+    hardware and thread settings.
+
+    model_config overrides LocalTransformerClassifier hyperparameters
+    (d_model, nhead, num_layers, dim_feedforward, dropout) and is stored in
+    model.pt so LocalIntentPipeline rebuilds the same architecture;
+    model_config={'early_exit': True} adds a classifier after every encoder
+    layer, trained with the final loss plus exit_loss_weight times their
+    mean cross-entropy. Returns a summary dict, also written to
+    save_dir/train_summary.json (rank 0 only when distributed).
+    """
+    if world_size > 1 and not _dist_ready():
+        import torch.multiprocessing as mp
+        kwargs = dict(csv_path=csv_path, save_dir=save_dir, epochs=epochs, batch_size=batch_size, lr=lr, max_len=max_len, device='cpu', val_ratio=val_ratio, seed=seed,
+                      compact_vocab=compact_vocab, packed_dir=packed_dir, num_workers=num_workers, world_size=world_size,
+                      bf16=bf16, grad_accum_steps=grad_accum_steps, grad_checkpointing=grad_checkpointing,
+                      metrics_path=metrics_path, log_every=log_every, profile_start=profile_start, profile_steps=profile_steps,
+                      resume=resume, checkpoint_every_steps=checkpoint_every_steps, keep_last=keep_last, model_config=model_config, exit_loss_weight=exit_loss_weight,
+                      num_threads=num_threads or max(1, (os.cpu_count() or 1) // world_size))
+        os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+        os.environ.setdefault('MASTER_PORT', str(_free_port()))
+        mp.spawn(_ddp_entry, args=(kwargs,), nprocs=world_size, join=True)
+        return None
+
+    distributed = _dist_ready()
+    rank = dist.get_rank() if distributed else 0
+    world = dist.get_world_size() if distributed else 1
+    is_main = rank == 0
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    torch.manual_seed(seed)
+    loader_kwargs = {'num_workers': num_workers, 'persistent_workers': num_workers > 0}
 
-    # Split train/val
     from sklearn.model_selection import train_test_split
-    train_rows, val_rows = train_test_split(rows, test_size=val_ratio, random_state=seed, shuffle=True)
-
-    train_dataset = WeddingCSV(rows=train_rows, tokenizer=tokenizer, max_len=max_len)
-    val_dataset = WeddingCSV(rows=val_rows, tokenizer=tokenizer, max_len=max_len)
-
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, collate_fn=lambda b: collate_fn(b, tokenizer.pad_id))
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, collate_fn=lambda b: collate_fn(b, tokenizer.pad_id))
+    if packed_dir:
+        # pre-tokenized, mmap-ed arrays written by packed_dataset.pack_csv
+        try:
+            from packed_dataset import PackedWeddingDataset, PackedCollate, LengthBucketBatchSampler
+        except ImportError:
+            from .packed_dataset import PackedWeddingDataset, PackedCollate, LengthBucketBatchSampler
+        import numpy as np
+        packed = PackedWeddingDataset(packed_dir)
+        vocab = packed.load_vocab()
+        tokenizer = SimpleTokenizer(vocab)
+        train_idx, val_idx = train_test_split(np.arange(len(packed)), test_size=val_ratio, random_state=seed, shuffle=True)
+        if distributed:
+            # equal-sized shards so every rank runs the same number of steps
+            train_idx = train_idx[:len(train_idx) - len(train_idx) % world][rank::world]
+            val_idx = val_idx[rank::world]
+        collate = PackedCollate(tokenizer.pad_id)
+        train_loader = DataLoader(packed, batch_sampler=LengthBucketBatchSampler(packed.lengths, batch_size, indices=train_idx, shuffle=True, seed=seed), collate_fn=collate, **loader_kwargs)
+        val_loader = DataLoader(packed, batch_sampler=LengthBucketBatchSampler(packed.lengths, batch_size, indices=val_idx, shuffle=False), collate_fn=collate, **loader_kwargs)
+    else:
+        # Build tokenizer vocab from CSV texts
+        texts = []
+        rows = []
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for r in reader:
+                texts.append(r['text'])
+                rows.append(r)
+
+        vocab = SimpleTokenizer.build_vocab(texts, min_freq=2, max_size=50000, compact=compact_vocab)
+        tokenizer = SimpleTokenizer(vocab)
+
+        # Split train/val
+        train_rows, val_rows = train_test_split(rows, test_size=val_ratio, random_state=seed, shuffle=True)
+        if distributed:
+            val_rows = val_rows[rank::world]
+
+        train_dataset = WeddingCSV(rows=train_rows, tokenizer=tokenizer, max_len=max_len, encode=False)
+        val_dataset = WeddingCSV(rows=val_rows, tokenizer=tokenizer, max_len=max_len, encode=False)
+
+        collate = EncodeBatchCollate(tokenizer, max_len=max_len)
+        if distributed:
+            train_sampler = DistributedSampler(train_dataset, num_replicas=world, rank=rank, shuffle=True, seed=seed)
+            train_loader = DataLoader(train_dataset, batch_size=batch_size, sampler=train_sampler, collate_fn=collate, **loader_kwargs)
+        else:
+            train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, collate_fn=collate, **loader_kwargs)
+        val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, collate_fn=collate, **loader_kwargs)
 
     if device is None:
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
-    model = LocalTransformerClassifier(vocab_size=len(vocab), num_labels=len(INTENT_LIST), pad_id=tokenizer.pad_id)
+    model_config = dict(model_config or {})
+    model = LocalTransformerClassifier(vocab_size=len(vocab), num_labels=len(INTENT_LIST), pad_id=tokenizer.pad_id, **model_config)
+    model.grad_checkpointing = grad_checkpointing
     model.to(device)
+    # DDP wraps the training forward only; evaluation uses the plain module
+    # because validation shards may have different numbers of batches
+    train_module = DistributedDataParallel(model) if distributed else model
 
     optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
     criterion = nn.CrossEntropyLoss()
-    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='max', factor=0.5, patience=2, verbose=True)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='max', factor=0.5, patience=2, verbose=is_main)
 
+    accum = max(1, int(grad_accum_steps))
+    device_type = device.split(':')[0]
     best_val_acc = 0.0
     patience = 3
     bad_epochs = 0
+    epochs_run = 0
+    examples_seen = 0
+    global_step = 0  # micro-batches
+    optimizer_step = 0  # optimizer updates; checkpoint_every_steps counts these
+    start_epoch = 1
+    resume_skip = 0
+    resume_rng = None
+    resume_totals = None
+    early_stopped = False
+    ckpt_dir = checkpoint_dir_for(save_dir)
+    resume_path = resolve_resume(resume, save_dir)
+    if resume_path:
+        state = load_checkpoint(resume_path)
+        model.load_state_dict(state['model'])
+        optimizer.load_state_dict(state['optimizer'])
+        scheduler.load_state_dict(state['scheduler'])
+        best_val_acc = state['best_val_acc']
+        bad_epochs = state['bad_epochs']
+        examples_seen = state['examples_seen']
+        global_step = state['global_step']
+        # checkpoints from before the counter was stored only know micro-batches
+        optimizer_step = state.get('optimizer_step', global_step // accum)
+        early_stopped = state.get('early_stopped', False)
+        epochs_run = state['epoch'] if state['step_in_epoch'] is None else state['epoch'] - 1
+        if state['step_in_epoch'] is None:
+            start_epoch = state['epoch'] + 1
+            restore_rng(state['rng'])
+        else:
+            # mid-epoch: replay the epoch's shuffle, skip finished batches,
+            # then restore the RNG exactly as it was at the checkpoint
+            start_epoch = state['epoch']
+            resume_skip = state['step_in_epoch']
+            restore_rng(state['epoch_rng'])
+            resume_rng = state['rng']
+            # running totals are stored globally reduced; count them once
+            resume_totals = state['epoch_totals'] if is_main else [0.0, 0.0, 0.0]
+        if is_main:
+            print(f"Resumed from {resume_path} (epoch {state['epoch']}, step {global_step}, optimizer step {optimizer_step})")
+
+    def _checkpoint_state(epoch, step_in_epoch, epoch_rng=None, epoch_totals=None):
+        return {
+            'model': model.state_dict(),
+            'optimizer': optimizer.state_dict(),
+            'scheduler': scheduler.state_dict(),
+            'epoch': epoch,
+            'step_in_epoch': step_in_epoch,
+            'global_step': global_step,
+            'optimizer_step': optimizer_step,
+            'best_val_acc': best_val_acc,
+            'bad_epochs': bad_epochs,
+            'examples_seen': examples_seen,
+            'early_stopped': early_stopped,
+            'rng': capture_rng(),
+            'epoch_rng': epoch_rng,
+            'epoch_totals': epoch_totals,
+        }
 
-    for epoch in range(1, epochs + 1):
+    run_config = {
+        'csv_path': csv_path, 'packed_dir': packed_dir, 'save_dir': save_dir, 'epochs': epochs, 'batch_size': batch_size, 'lr': lr,
+        'max_len': max_len, 'device': device, 'seed': seed, 'vocab_size': len(vocab), 'num_workers': num_workers,
+        'num_threads': torch.get_num_threads(), 'world_size': world, 'bf16': bf16, 'grad_accum_steps': accum,
+        'grad_checkpointing': grad_checkpointing, 'resumed_from': resume_path, 'model_config': model_config,
+        'exit_loss_weight': exit_loss_weight if model.exit_heads is not None else None,
+    }
+    metrics = TrainMetricsLogger(metrics_path or metrics_path_for(save_dir), run_config, log_every=log_every, enabled=is_main)
+    prof = make_profiler(os.path.normpath(save_dir) + '_traces', profile_start, profile_steps) if is_main else None
+    if prof is not None:
+        prof.start()
+    timer = StepTimer(device)
+    train_start = time.perf_counter()
+
+    for epoch in range(start_epoch, epochs + 1):
+        if early_stopped:
+            break
         model.train()
+        if hasattr(train_loader.batch_sampler, 'set_epoch'):
+            train_loader.batch_sampler.set_epoch(epoch)
+        if hasattr(train_loader.sampler, 'set_epoch'):
+            train_loader.sampler.set_epoch(epoch)
         total_loss = 0.0
         total_correct = 0
         total_examples = 0
-        for batch in train_loader:
+        if resume_totals is not None:
+            total_loss, total_correct, total_examples = resume_totals
+            resume_totals = None
+        n_batches = len(train_loader)
+        optimizer.zero_grad()
+        # RNG as of epoch start determines the shuffle order for this epoch
+        epoch_rng = capture_rng()
+        timer.start()
+        for step, batch in enumerate(train_loader):
+            if step < resume_skip:
+                continue
+            if resume_rng is not None:
+                restore_rng(resume_rng)
+                resume_rng = None
+                timer.start()
             input_ids = batch['input_ids'].to(device)
             attention_mask = batch['attention_mask'].to(device)
             labels = batch['labels'].to(device)
-
-            optimizer.zero_grad()
-            logits = model(input_ids, attention_mask)
-            loss = criterion(logits, labels)
-            loss.backward()
-            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
-            optimizer.step()
-
-            total_loss += loss.item() * input_ids.size(0)
+            timer.mark('data_wait')
+
+            # the last group of an epoch may be shorter than grad_accum_steps
+            group_start = step - step % accum
+            group_size = min(accum, n_batches - group_start)
+            is_update = step + 1 == group_start + group_size
+            # skip the DDP gradient all-reduce on non-final micro-batches
+            sync_ctx = train_module.no_sync() if distributed and not is_update else contextlib.nullcontext()
+            with sync_ctx:
+                with torch.autocast(device_type=device_type, dtype=torch.bfloat16, enabled=bf16):
+                    if model.exit_heads is not None:
+                        # final CE + exit_loss_weight * mean CE of the intermediate heads
+                        all_logits = train_module(input_ids, attention_mask, return_all_exits=True)
+                        logits = all_logits[-1]
+                        exit_losses = [criterion(l, labels) for l in all_logits[:-1]]
+                        loss = criterion(logits, labels)
+                        if exit_losses:
+                            loss = loss + exit_loss_weight * sum(exit_losses) / len(exit_losses)
+                    else:
+                        logits = train_module(input_ids, attention_mask)
+                        loss = criterion(logits, labels)
+                timer.mark('forward')
+                (loss / group_size).backward()
+                timer.mark('backward')
+            if is_update:
+                torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+                optimizer.step()
+                optimizer.zero_grad()
+                optimizer_step += 1
+
+            loss_value = loss.item()
+            total_loss += loss_value * input_ids.size(0)
             preds = logits.argmax(dim=-1)
             total_correct += (preds == labels).sum().item()
             total_examples += input_ids.size(0)
-
+            global_step += 1
+            timer.mark('step')
+            metrics.record_step(timer.reset(), input_ids.size(0), int(attention_mask.sum().item()), loss_value)
+            if prof is not None:
+                prof.step()
+            # mid-epoch checkpoints only on optimizer-step boundaries (no pending accumulated grads)
+            if checkpoint_every_steps and is_update and optimizer_step % checkpoint_every_steps == 0 and step + 1 < n_batches:
+                totals = _all_reduce_sums(total_loss, total_correct, total_examples)
+                if is_main:
+                    save_checkpoint(ckpt_dir, _checkpoint_state(epoch, step + 1, epoch_rng, totals), keep_last)
+                timer.start()
+        resume_skip = 0
+        if resume_rng is not None:
+            # checkpoint sat on the epoch's last batch; nothing left to replay
+            restore_rng(resume_rng)
+            resume_rng = None
+
+        total_loss, total_correct, total_examples = _all_reduce_sums(total_loss, total_correct, total_examples)
         train_loss = total_loss / total_examples if total_examples else 0.0
         train_acc = total_correct / total_examples if total_examples else 0.0
+        examples_seen += int(total_examples)
+        epochs_run = epoch
 
         val_loss, val_acc = evaluate(model, val_loader, device, criterion)
         scheduler.step(val_acc)
+        metrics.record_epoch(epoch, {'train_loss': train_loss, 'train_acc': train_acc, 'val_loss': val_loss, 'val_acc': val_acc,
+                                     'lr': optimizer.param_groups[0]['lr']})
+        timer.start()
 
-        print(f"Epoch {epoch}: train_loss={train_loss:.4f} train_acc={train_acc:.4f} | val_loss={val_loss:.4f} val_acc={val_acc:.4f}")
+        if is_main:
+            print(f"Epoch {epoch}: train_loss={train_loss:.4f} train_acc={train_acc:.4f} | val_loss={val_loss:.4f} val_acc={val_acc:.4f}")
 
-        # Early stopping & save best
+        # Early stopping & save best (val_acc is global, so all ranks agree)
         if val_acc > best_val_acc:
             best_val_acc = val_acc
             bad_epochs = 0
-            os.makedirs(save_dir, exist_ok=True)
-            torch.save({'state_dict': model.state_dict(), 'vocab': vocab}, os.path.join(save_dir, 'model.pt'))
-            with open(os.path.join(save_dir, 'intent_labels.json'), 'w', encoding='utf-8') as f:
-                json.dump(INTENT_LIST, f, ensure_ascii=False)
-            print(f"Saved best model (val_acc={best_val_acc:.4f}) to {save_dir}")
+            if is_main:
+                os.makedirs(save_dir, exist_ok=True)
+                if isinstance(vocab, CompactVocab):
+                    # keep the vocabulary out of the pickle so it can be mmap-ed at load time
+                    vocab.save(os.path.join(save_dir, 'vocab.bin'))
+                    ckpt = {'state_dict': model.state_dict(), 'vocab_file': 'vocab.bin', 'config': model_config}
+                else:
+                    ckpt = {'state_dict': model.state_dict(), 'vocab': vocab, 'config': model_config}
+                torch.save(ckpt, os.path.join(save_dir, 'model.pt'))
+                with open(os.path.join(save_dir, 'intent_labels.json'), 'w', encoding='utf-8') as f:
+                    json.dump(INTENT_LIST, f, ensure_ascii=False)
+                print(f"Saved best model (val_acc={best_val_acc:.4f}) to {save_dir}")
         else:
             bad_epochs += 1
             if bad_epochs >= patience:
-                print(f"Early stopping triggered after {bad_epochs} bad epochs")
-                break
+                early_stopped = True
+                if is_main:
+                    print(f"Early stopping triggered after {bad_epochs} bad epochs")
+
+        if is_main:
+            save_checkpoint(ckpt_dir, _checkpoint_state(epoch, None), keep_last)
+        if early_stopped:
+            break
 
-    print(f"Training finished. Best val_acc={best_val_acc:.4f}")
+    train_time = time.perf_counter() - train_start
+    if prof is not None:
+        prof.stop()
+    if is_main:
+        print(f"Training finished. Best val_acc={best_val_acc:.4f}")
+    summary = {
+        'best_val_acc': best_val_acc,
+        'epochs_run': epochs_run,
+        'train_time_s': train_time,
+        'examples_per_s': examples_seen / train_time if train_time else 0.0,
+        'world_size': world,
+        'num_threads': torch.get_num_threads(),
+        'num_workers': num_workers,
+        'bf16': bf16,
+        'grad_accum_steps': accum,
+        'grad_checkpointing': grad_checkpointing,
+        'effective_batch_size': batch_size * accum * world,
+    }
+    metrics.close(summary)
+    if is_main:
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.path.join(save_dir, 'train_summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return summary if is_main else None
 
 # Inference wrapper
 class LocalIntentPipeline:
-    def __init__(self, model_dir: str = "models/local_transformer_intent", device: str = None):
+    def __init__(self, model_dir: str = "models/local_transformer_intent", device: str = None, exit_threshold: float = None, fast_path: bool = False):
         if device is None:
             device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.device = device
         ckpt = torch.load(os.path.join(model_dir, 'model.pt'), map_location=device)
-        self.vocab = ckpt['vocab']
+        if ckpt.get('vocab_file'):
+            self.vocab = CompactVocab.load(os.path.join(model_dir, ckpt['vocab_file']))
+        else:
+            self.vocab = ckpt['vocab']
         self.tokenizer = SimpleTokenizer(self.vocab)
-        self.model = LocalTransformerClassifier(vocab_size=len(self.vocab), num_labels=len(INTENT_LIST), pad_id=self.tokenizer.pad_id)
+        # older checkpoints carry no 'config' and use the default architecture
+        self.config = ckpt.get('config') or {}
+        self.model = LocalTransformerClassifier(vocab_size=len(self.vocab), num_labels=len(INTENT_LIST), pad_id=self.tokenizer.pad_id, **self.config)
         self.model.load_state_dict(ckpt['state_dict'])
         self.model.to(device)
         self.model.eval()
+        if exit_threshold is not None and self.model.exit_heads is None:
+            raise ValueError(f'exit_threshold given but {model_dir} was trained without --early_exit heads')
+        self.exit_threshold = exit_threshold
+        # opt-in nested-tensor encoder fast path for padded batches (LocalTransformerClassifier.forward_fast);
+        # ignored when the checkpoint's architecture cannot take it
+        self.fast_path = fast_path and not self.model.fast_path_blockers()
 
     @staticmethod
     def extract_slots_by_rule(text: str) -> Dict:
@@ -378,13 +834,36 @@ class LocalIntentPipeline:
         return slots
 
     def predict(self, text: str, max_len: int = 64) -> Dict:
-        ids = self.tokenizer.encode(text, max_len=max_len)
-        ids_t = torch.tensor(ids, dtype=torch.long).unsqueeze(0)
-        attn = (ids_t != self.tokenizer.pad_id).long()
+        return self.predict_batch([text], max_len=max_len)[0]
+
+    def predict_batch(self, texts: List[str], max_len: int = 64) -> List[Dict]:
+        """Classify several texts with a single padded forward pass.
+
+        Sequences are padded once (`SimpleTokenizer.encode_batch`) to the
+        longest one in the batch and the attention mask marks real tokens,
+        so results match per-text calls.
+        """
+        if not texts:
+            return []
+        enc = self.tokenizer.encode_batch(texts, max_len=max_len)
+        ids_t = enc['input_ids']
+        attn = enc['attention_mask']
         with torch.no_grad():
-            logits = self.model(ids_t.to(self.device), attn.to(self.device))
-            probs = torch.softmax(logits, dim=-1)[0].cpu().tolist()
-            pred_id = int(torch.argmax(logits, dim=-1)[0].cpu())
+            if self.exit_threshold is not None:
+                logits, exit_layers = self.model.forward_early_exit(ids_t.to(self.device), attn.to(self.device), self.exit_threshold)
+                exit_layers = exit_layers.cpu().tolist()
+            elif self.fast_path:
+                logits = self.model.forward_fast(ids_t.to(self.device), attn.to(self.device))
+                exit_layers = [None] * len(texts)
+            else:
+                logits = self.model(ids_t.to(self.device), attn.to(self.device))
+                exit_layers = [None] * len(texts)
+            # single device->host sync for the whole batch
+            probs_batch = torch.softmax(logits, dim=-1).cpu().tolist()
+        return [self._build_result(text, probs, layer) for text, probs, layer in zip(texts, probs_batch, exit_layers)]
+
+    def _build_result(self, text: str, probs: List[float], exit_layer: int = None) -> Dict:
+        pred_id = max(range(len(probs)), key=probs.__getitem__)
         slots = self.extract_slots_by_rule(text)
 
         # Conservative rule-based fallback for "tanya_kemungkinan".
@@ -415,7 +894,7 @@ class LocalIntentPipeline:
             overridden = True
             override_reason = f'rule:low_confidence_question({model_confidence:.2f})'
 
-        return {
+        result = {
             'text': text,
             'intent_pred': intent_pred,
             'probs': probs_dict,
@@ -423,6 +902,9 @@ class LocalIntentPipeline:
             'overridden': overridden,
             'override_reason': override_reason,
         }
+        if exit_layer is not None:
+            result['exit_layer'] = exit_layer
+        return result
 
 # CLI helpers
 def cli_train():
@@ -434,15 +916,39 @@ def cli_train():
     parser.add_argument('--batch_size', type=int, default=64)
     parser.add_argument('--lr', type=float, default=3e-4)
     parser.add_argument('--max_len', type=int, default=64)
+    parser.add_argument('--compact_vocab', action='store_true')
+    parser.add_argument('--packed_dir', default=None, help='train from a packed_dataset.py output dir instead of --csv')
+    parser.add_argument('--num_workers', type=int, default=0, help='DataLoader worker processes')
+    parser.add_argument('--num_threads', type=int, default=None, help='torch intra-op threads per process')
+    parser.add_argument('--world_size', type=int, default=1, help='local CPU processes for DDP (gloo)')
+    parser.add_argument('--bf16', action='store_true', help='bfloat16 autocast for forward + loss')
+    parser.add_argument('--grad_accum_steps', type=int, default=1)
+    parser.add_argument('--grad_checkpointing', action='store_true')
+    parser.add_argument('--metrics_path', default=None, help='JSONL metrics file (default: <save_dir>_metrics.jsonl)')
+    parser.add_argument('--log_every', type=int, default=50)
+    parser.add_argument('--profile_start', type=int, default=None, help='global step at which to start a torch.profiler window')
+    parser.add_argument('--profile_steps', type=int, default=5)
+    parser.add_argument('--resume', default=None, help="'auto' for the latest checkpoint in save_dir, or a checkpoint path")
+    parser.add_argument('--checkpoint_every_steps', type=int, default=0, help='also checkpoint every N optimizer steps (0 = per epoch only)')
+    parser.add_argument('--keep_last', type=int, default=3)
+    parser.add_argument('--early_exit', action='store_true', help='train intermediate classifier heads after each encoder layer')
+    parser.add_argument('--exit_loss_weight', type=float, default=0.5)
     args = parser.parse_args()
-    train_model(args.csv, args.save_dir, args.epochs, args.batch_size, args.lr, args.max_len)
+    train_model(args.csv, args.save_dir, args.epochs, args.batch_size, args.lr, args.max_len, compact_vocab=args.compact_vocab, packed_dir=args.packed_dir,
+                num_workers=args.num_workers, num_threads=args.num_threads, world_size=args.world_size,
+                bf16=args.bf16, grad_accum_steps=args.grad_accum_steps, grad_checkpointing=args.grad_checkpointing,
+                metrics_path=args.metrics_path, log_every=args.log_every, profile_start=args.profile_start, profile_steps=args.profile_steps,
+                resume=args.resume, checkpoint_every_steps=args.checkpoint_every_steps, keep_last=args.keep_last,
+                model_config={'early_exit': True} if args.early_exit else None, exit_loss_weight=args.exit_loss_weight)
 
 def cli_infer():
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('--model_dir', default='models/local_transformer_intent')
+    parser.add_argument('--exit_threshold', type=float, default=None, help='early-exit confidence (models trained with --early_exit)')
+    parser.add_argument('--fast_path', action='store_true', help='nested-tensor encoder fast path for padded batches')
     args = parser.parse_args()
-    pipe = LocalIntentPipeline(args.model_dir)
+    pipe = LocalIntentPipeline(args.model_dir, exit_threshold=args.exit_threshold, fast_path=args.fast_path)
     print("Ketik pertanyaan (ketik 'exit' untuk keluar):")
     while True:
         try:
@@ -465,11 +971,35 @@ if __name__ == '__main__':
     parser.add_argument('--lr', type=float, default=3e-4)
     parser.add_argument('--max_len', type=int, default=64)
     parser.add_argument('--model_dir', default='models/local_transformer_intent')
+    parser.add_argument('--exit_threshold', type=float, default=None, help='early-exit confidence (models trained with --early_exit)')
+    parser.add_argument('--fast_path', action='store_true', help='nested-tensor encoder fast path for padded batches')
+    parser.add_argument('--compact_vocab', action='store_true')
+    parser.add_argument('--packed_dir', default=None, help='train from a packed_dataset.py output dir instead of --csv')
+    parser.add_argument('--num_workers', type=int, default=0, help='DataLoader worker processes')
+    parser.add_argument('--num_threads', type=int, default=None, help='torch intra-op threads per process')
+    parser.add_argument('--world_size', type=int, default=1, help='local CPU processes for DDP (gloo)')
+    parser.add_argument('--bf16', action='store_true', help='bfloat16 autocast for forward + loss')
+    parser.add_argument('--grad_accum_steps', type=int, default=1)
+    parser.add_argument('--grad_checkpointing', action='store_true')
+    parser.add_argument('--metrics_path', default=None, help='JSONL metrics file (default: <save_dir>_metrics.jsonl)')
+    parser.add_argument('--log_every', type=int, default=50)
+    parser.add_argument('--profile_start', type=int, default=None, help='global step at which to start a torch.profiler window')
+    parser.add_argument('--profile_steps', type=int, default=5)
+    parser.add_argument('--resume', default=None, help="'auto' for the latest checkpoint in save_dir, or a checkpoint path")
+    parser.add_argument('--checkpoint_every_steps', type=int, default=0, help='also checkpoint every N optimizer steps (0 = per epoch only)')
+    parser.add_argument('--keep_last', type=int, default=3)
+    parser.add_argument('--early_exit', action='store_true', help='train intermediate classifier heads after each encoder layer')
+    parser.add_argument('--exit_loss_weight', type=float, default=0.5)
     args = parser.parse_args()
     if args.mode == 'train':
-        train_model(args.csv, args.save_dir, args.epochs, args.batch_size, args.lr, args.max_len)
+        train_model(args.csv, args.save_dir, args.epochs, args.batch_size, args.lr, args.max_len, compact_vocab=args.compact_vocab, packed_dir=args.packed_dir,
+                    num_workers=args.num_workers, num_threads=args.num_threads, world_size=args.world_size,
+                    bf16=args.bf16, grad_accum_steps=args.grad_accum_steps, grad_checkpointing=args.grad_checkpointing,
+                    metrics_path=args.metrics_path, log_every=args.log_every, profile_start=args.profile_start, profile_steps=args.profile_steps,
+                    resume=args.resume, checkpoint_every_steps=args.checkpoint_every_steps, keep_last=args.keep_last,
+                    model_config={'early_exit': True} if args.early_exit else None, exit_loss_weight=args.exit_loss_weight)
     else:
-        pipe = LocalIntentPipeline(args.model_dir)
+        pipe = LocalIntentPipeline(args.model_dir, exit_threshold=args.exit_threshold, fast_path=args.fast_path)
         print("Ketik pertanyaan (ketik 'exit' untuk keluar):")
         while True:
             try:
@@ -0,0 +1,155 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+
+# Simple cumulative histogram (Prometheus-style upper-bound buckets)
+class Histogram:
+    def __init__(self, buckets: List[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            cumulative = []
+            running = 0
+            for upper, c in zip(self.buckets + [float('inf')], self.counts):
+                running += c
+                cumulative.append(['+Inf' if upper == float('inf') else upper, running])
+            return {
+                'buckets': cumulative,
+                'count': self.count,
+                'sum': self.sum,
+                'mean': (self.sum / self.count) if self.count else 0.0,
+            }
+
+
+class MicroBatchServer:
+    """Dynamic batching front-end for `LocalIntentPipeline`.
+
+    Callers `submit()` a text and receive a Future. A background thread
+    collects pending requests until `max_batch` is reached or `max_wait_ms`
+    has passed since the first one arrived, then runs a single
+    `pipeline.predict_batch()` call and fans the results back out.
+    """
+
+    def __init__(self, pipeline, max_batch: int = 32, max_wait_ms: float = 5.0, max_queue: int = 4096, max_len: int = 64):
+        self.pipeline = pipeline
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_len = max_len
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        batch_buckets = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+        self.batch_size_hist = Histogram([b for b in batch_buckets if b < self.max_batch] + [self.max_batch])
+        self.queue_wait_hist = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000])
+        self.batch_latency_hist = Histogram([1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500])
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='micro-batch-worker', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # fail whatever is still queued so callers don't hang forever
+        while True:
+            try:
+                _, fut, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if not fut.done():
+                fut.set_exception(RuntimeError('micro-batch server stopped'))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def submit(self, text: str) -> Future:
+        if self._thread is None or self._stop.is_set():
+            raise RuntimeError('micro-batch server is not running; call start() first')
+        fut: Future = Future()
+        # raises queue.Full when saturated so callers can shed load
+        self._queue.put_nowait((text, fut, time.perf_counter()))
+        return fut
+
+    def predict(self, text: str, timeout: Optional[float] = None) -> Dict:
+        return self.submit(text).result(timeout)
+
+    def stats(self) -> Dict:
+        return {
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'batch_size': self.batch_size_hist.snapshot(),
+            'queue_wait_ms': self.queue_wait_hist.snapshot(),
+            'batch_latency_ms': self.batch_latency_hist.snapshot(),
+        }
+
+    def _collect(self) -> List:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            # drop requests whose callers already gave up
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_hist.observe((started - enqueued) * 1000.0)
+            self.batch_size_hist.observe(len(batch))
+            texts = [text for text, _, _ in batch]
+            try:
+                results = self.pipeline.predict_batch(texts, max_len=self.max_len)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+            finally:
+                self.batch_latency_hist.observe((time.perf_counter() - started) * 1000.0)
+            for (_, fut, _), res in zip(batch, results):
+                fut.set_result(res)
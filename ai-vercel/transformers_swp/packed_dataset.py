@@ -0,0 +1,203 @@
+import csv
+import json
+import os
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, Sampler
+
+try:
+    from local_transformer_intent import SimpleTokenizer, INTENT_TO_ID, INTENT_LIST
+    from compact_vocab import CompactVocab
+except ImportError:
+    from .local_transformer_intent import SimpleTokenizer, INTENT_TO_ID, INTENT_LIST
+    from .compact_vocab import CompactVocab
+
+# Packed layout inside `out_dir`:
+#   tokens.int32   all token ids back to back
+#   offsets.int64  row i spans tokens[offsets[i]:offsets[i + 1]]
+#   labels.int32   intent id per row (INTENT_LIST order)
+#   vocab.json | vocab.bin, meta.json
+_FLUSH_ROWS = 65536
+
+
+def _iter_csv(csv_path: str) -> Iterator[Dict]:
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for r in csv.DictReader(f):
+            if r.get('text'):
+                yield r
+
+
+def pack_csv(csv_path: str, out_dir: str, tokenizer: SimpleTokenizer = None, max_len: int = 64, min_freq: int = 2, max_size: int = 50000, compact_vocab: bool = False) -> Dict:
+    """Tokenize a wedding CSV once into memory-mappable int arrays.
+
+    The CSV is streamed twice (vocabulary, then ids) so memory stays bounded
+    by the vocabulary rather than the number of rows.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if tokenizer is None:
+        vocab = SimpleTokenizer.build_vocab((r['text'] for r in _iter_csv(csv_path)), min_freq=min_freq, max_size=max_size, compact=compact_vocab)
+        tokenizer = SimpleTokenizer(vocab)
+    vocab = tokenizer.vocab
+    if isinstance(vocab, CompactVocab):
+        vocab_file = 'vocab.bin'
+        vocab.save(os.path.join(out_dir, vocab_file))
+    else:
+        vocab_file = 'vocab.json'
+        with open(os.path.join(out_dir, vocab_file), 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, ensure_ascii=False)
+
+    paths = {name: os.path.join(out_dir, name) for name in ('tokens.int32', 'offsets.int64', 'labels.int32')}
+    n_rows = 0
+    n_tokens = 0
+    with open(paths['tokens.int32'], 'wb') as f_tok, open(paths['offsets.int64'], 'wb') as f_off, open(paths['labels.int32'], 'wb') as f_lab:
+        tok_buf, off_buf, lab_buf = array('i'), array('q', [0]), array('i')
+        for r in _iter_csv(csv_path):
+            ids = tokenizer.encode(r['text'], max_len=max_len)
+            tok_buf.extend(ids)
+            n_tokens += len(ids)
+            off_buf.append(n_tokens)
+            lab_buf.append(INTENT_TO_ID.get(r.get('intent'), 0))
+            n_rows += 1
+            if len(lab_buf) >= _FLUSH_ROWS:
+                tok_buf.tofile(f_tok)
+                off_buf.tofile(f_off)
+                lab_buf.tofile(f_lab)
+                tok_buf, off_buf, lab_buf = array('i'), array('q'), array('i')
+        tok_buf.tofile(f_tok)
+        off_buf.tofile(f_off)
+        lab_buf.tofile(f_lab)
+
+    meta = {
+        'source': os.path.abspath(csv_path),
+        'n_rows': n_rows,
+        'n_tokens': n_tokens,
+        'max_len': max_len,
+        'vocab_file': vocab_file,
+        'vocab_size': len(vocab),
+        'pad_id': tokenizer.pad_id,
+        'labels': INTENT_LIST,
+    }
+    with open(os.path.join(out_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+class PackedWeddingDataset(Dataset):
+    """Read-only view over a `pack_csv` directory.
+
+    Items are `{'input_ids': int32 ndarray view, 'label': int}`; nothing is
+    tokenized or copied per sample, the arrays are mmap-ed from disk.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        with open(os.path.join(data_dir, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        n = self.meta['n_rows']
+        self.tokens = self._memmap('tokens.int32', np.int32, self.meta['n_tokens'])
+        self.offsets = self._memmap('offsets.int64', np.int64, n + 1)
+        self.labels = self._memmap('labels.int32', np.int32, n)
+        self.lengths = np.diff(self.offsets).astype(np.int32)
+        self.pad_id = self.meta.get('pad_id', 1)
+
+    def _memmap(self, name: str, dtype, count: int):
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.data_dir, name), dtype=dtype, mode='r', shape=(count,))
+
+    def load_vocab(self):
+        path = os.path.join(self.data_dir, self.meta['vocab_file'])
+        if path.endswith('.bin'):
+            return CompactVocab.load(path)
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def __len__(self):
+        return int(self.meta['n_rows'])
+
+    def __getitem__(self, idx):
+        start = self.offsets[idx]
+        end = self.offsets[idx + 1]
+        return {'input_ids': self.tokens[start:end], 'label': int(self.labels[idx])}
+
+
+class PackedCollate:
+    """Pad packed int32 slices straight into one preallocated batch buffer."""
+
+    def __init__(self, pad_id: int = 1):
+        self.pad_id = pad_id
+
+    def __call__(self, batch: List[Dict]) -> Dict[str, torch.Tensor]:
+        lengths = np.fromiter((len(x['input_ids']) for x in batch), dtype=np.int64, count=len(batch))
+        T = max(1, int(lengths.max()) if len(batch) else 1)
+        input_ids = np.full((len(batch), T), self.pad_id, dtype=np.int64)
+        for i, x in enumerate(batch):
+            input_ids[i, :lengths[i]] = x['input_ids']
+        attention_mask = (np.arange(T)[None, :] < np.maximum(lengths, 1)[:, None]).astype(np.int64)
+        return {
+            'input_ids': torch.from_numpy(input_ids),
+            'attention_mask': torch.from_numpy(attention_mask),
+            'labels': torch.tensor([x['label'] for x in batch], dtype=torch.long),
+        }
+
+
+class LengthBucketBatchSampler(Sampler):
+    """Batch indices of similar length together to cut padding waste.
+
+    Indices are shuffled, cut into pools of `batch_size * bucket_multiplier`,
+    sorted by length inside each pool and split into batches; batch order is
+    shuffled again. Call `set_epoch()` for a fresh, reproducible shuffle.
+    """
+
+    def __init__(self, lengths: Sequence[int], batch_size: int, indices: Optional[Sequence[int]] = None, shuffle: bool = True, bucket_multiplier: int = 50, drop_last: bool = False, seed: int = 42):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.indices = np.arange(len(self.lengths)) if indices is None else np.asarray(indices, dtype=np.int64)
+        self.shuffle = shuffle
+        self.pool_size = batch_size * max(1, bucket_multiplier)
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        order = rng.permutation(self.indices) if self.shuffle else self.indices
+        batches = []
+        for p in range(0, len(order), self.pool_size):
+            pool = order[p:p + self.pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind='stable')]
+            for b in range(0, len(pool), self.batch_size):
+                batch = pool[b:b + self.batch_size]
+                if len(batch) < self.batch_size and self.drop_last:
+                    continue
+                batches.append(batch.tolist())
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return iter(batches)
+
+    def __len__(self):
+        if self.drop_last:
+            # each pool drops its own remainder
+            full, rest = divmod(len(self.indices), self.pool_size)
+            return full * (self.pool_size // self.batch_size) + rest // self.batch_size
+        full, rest = divmod(len(self.indices), self.pool_size)
+        return full * -(-self.pool_size // self.batch_size) + -(-rest // self.batch_size)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Pre-tokenize a wedding CSV into packed int arrays')
+    parser.add_argument('--csv', default='dataset_pertanyaan_wedding.csv')
+    parser.add_argument('--out_dir', default='data/packed_wedding')
+    parser.add_argument('--max_len', type=int, default=64)
+    parser.add_argument('--min_freq', type=int, default=2)
+    parser.add_argument('--compact_vocab', action='store_true')
+    args = parser.parse_args()
+    meta = pack_csv(args.csv, args.out_dir, max_len=args.max_len, min_freq=args.min_freq, compact_vocab=args.compact_vocab)
+    print(json.dumps(meta, ensure_ascii=False, indent=2))
@@ -0,0 +1,83 @@
+import glob
+import os
+import random
+import re
+from typing import Dict, Optional
+
+import torch
+
+_CKPT_RE = re.compile(r'ckpt_e(\d+)_s(\d+)\.pt$')
+
+
+def checkpoint_dir_for(save_dir: str) -> str:
+    return os.path.join(save_dir, 'checkpoints')
+
+
+def capture_rng() -> Dict:
+    state = {'torch': torch.get_rng_state(), 'python': random.getstate()}
+    try:
+        import numpy as np
+        state['numpy'] = np.random.get_state()
+    except ImportError:
+        pass
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng(state: Dict):
+    torch.set_rng_state(state['torch'])
+    random.setstate(state['python'])
+    if 'numpy' in state:
+        import numpy as np
+        np.random.set_state(state['numpy'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def save_checkpoint(ckpt_dir: str, state: Dict, keep_last: int = 3) -> str:
+    """Atomically write a full training checkpoint and prune old ones.
+
+    The file is written to a temp name in the same directory and moved into
+    place with os.replace, so a kill mid-write never leaves a truncated
+    checkpoint behind. Only the newest `keep_last` checkpoints are kept.
+    """
+    os.makedirs(ckpt_dir, exist_ok=True)
+    name = f"ckpt_e{state['epoch']:04d}_s{state['global_step']:09d}.pt"
+    path = os.path.join(ckpt_dir, name)
+    tmp = path + '.tmp'
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+    if keep_last and keep_last > 0:
+        for old in list_checkpoints(ckpt_dir)[:-keep_last]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+def list_checkpoints(ckpt_dir: str):
+    paths = [p for p in glob.glob(os.path.join(ckpt_dir, 'ckpt_e*_s*.pt')) if _CKPT_RE.search(p)]
+    return sorted(paths, key=lambda p: tuple(int(x) for x in _CKPT_RE.search(p).groups()))
+
+
+def resolve_resume(resume: Optional[str], save_dir: str) -> Optional[str]:
+    # 'auto' (or 'latest') picks the newest checkpoint under save_dir, if any
+    if not resume:
+        return None
+    if resume in ('auto', 'latest'):
+        found = list_checkpoints(checkpoint_dir_for(save_dir))
+        return found[-1] if found else None
+    if os.path.isdir(resume):
+        found = list_checkpoints(resume)
+        return found[-1] if found else None
+    return resume
+
+
+def load_checkpoint(path: str) -> Dict:
+    # full checkpoints carry optimizer and RNG state, not just tensors
+    try:
+        return torch.load(path, map_location='cpu', weights_only=False)
+    except TypeError:
+        return torch.load(path, map_location='cpu')
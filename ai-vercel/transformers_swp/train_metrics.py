@@ -0,0 +1,170 @@
+import json
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import torch
+
+PHASES = ('data_wait', 'forward', 'backward', 'step')
+
+
+def metrics_path_for(save_dir: str) -> str:
+    # models/local_transformer_intent -> models/local_transformer_intent_metrics.jsonl
+    base = os.path.normpath(save_dir)
+    return base + '_metrics.jsonl'
+
+
+def _percentiles(values: List[float], qs=(50, 90, 99)) -> Dict[str, float]:
+    if not values:
+        return {f'p{q}': 0.0 for q in qs}
+    ordered = sorted(values)
+    out = {}
+    for q in qs:
+        k = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+        out[f'p{q}'] = ordered[k]
+    return out
+
+
+class StepTimer:
+    """Wall-clock phase timer for one training step.
+
+    On CUDA each boundary synchronizes so kernel time is charged to the
+    phase that launched it; on CPU it is plain perf_counter arithmetic.
+    """
+
+    def __init__(self, device: str = 'cpu'):
+        self._sync = device.startswith('cuda') and torch.cuda.is_available()
+        self.last = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def mark(self, phase: str):
+        if self._sync:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last)
+        self.last = now
+
+    def reset(self) -> Dict[str, float]:
+        phases, self.phases = self.phases, {}
+        return phases
+
+
+class TrainMetricsLogger:
+    """Collects per-step timings and appends JSONL records for run comparison.
+
+    Record types: `run_start`, `steps` (every `log_every` steps), `epoch` and
+    `run_end`. All records carry the same `run_id`.
+    """
+
+    def __init__(self, path: Optional[str], config: Dict, log_every: int = 50, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled and bool(path)
+        self.log_every = max(1, log_every)
+        self.run_id = uuid.uuid4().hex[:12]
+        self.global_step = 0
+        self._reset_epoch()
+        self._reset_window()
+        if self.enabled:
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+        self._write({'type': 'run_start', 'config': config})
+
+    def _reset_epoch(self):
+        self.epoch_steps: List[float] = []
+        self.epoch_phases = {p: 0.0 for p in PHASES}
+        self.epoch_examples = 0
+        self.epoch_tokens = 0
+        self.epoch_start = time.perf_counter()
+
+    def _reset_window(self):
+        self.window_steps: List[float] = []
+        self.window_examples = 0
+        self.window_tokens = 0
+        self.window_start = time.perf_counter()
+
+    def _write(self, record: Dict):
+        if not self.enabled:
+            return
+        record = dict(record, run_id=self.run_id, ts=time.time())
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def record_step(self, phases: Dict[str, float], examples: int, tokens: int, loss: float = None):
+        self.global_step += 1
+        step_time = sum(phases.values())
+        for p, v in phases.items():
+            self.epoch_phases[p] = self.epoch_phases.get(p, 0.0) + v
+        self.epoch_steps.append(step_time)
+        self.epoch_examples += examples
+        self.epoch_tokens += tokens
+        self.window_steps.append(step_time)
+        self.window_examples += examples
+        self.window_tokens += tokens
+        if self.global_step % self.log_every == 0:
+            elapsed = time.perf_counter() - self.window_start
+            self._write({
+                'type': 'steps',
+                'step': self.global_step,
+                'loss': loss,
+                'examples_per_s': self.window_examples / elapsed if elapsed else 0.0,
+                'tokens_per_s': self.window_tokens / elapsed if elapsed else 0.0,
+                'step_time_s': _percentiles(self.window_steps),
+                'last_phases_s': phases,
+            })
+            self._reset_window()
+
+    def record_epoch(self, epoch: int, metrics: Dict) -> Dict:
+        elapsed = time.perf_counter() - self.epoch_start
+        total_phase = sum(self.epoch_phases.values()) or 1.0
+        record = {
+            'type': 'epoch',
+            'epoch': epoch,
+            'steps': len(self.epoch_steps),
+            'wall_s': elapsed,
+            'examples_per_s': self.epoch_examples / elapsed if elapsed else 0.0,
+            'tokens_per_s': self.epoch_tokens / elapsed if elapsed else 0.0,
+            'step_time_s': _percentiles(self.epoch_steps),
+            'phase_s': self.epoch_phases,
+            'phase_share': {p: v / total_phase for p, v in self.epoch_phases.items()},
+        }
+        record.update(metrics)
+        self._write(record)
+        self._reset_epoch()
+        self._reset_window()
+        return record
+
+    def close(self, summary: Dict):
+        self._write(dict(summary, type='run_end', steps=self.global_step))
+
+
+def make_profiler(trace_dir: str, start_step: Optional[int], active_steps: int = 5):
+    """Opt-in torch.profiler window that writes a Chrome trace per window.
+
+    Returns None when profiling is off (start_step is None) so callers can
+    skip `prof.step()` entirely.
+    """
+    if start_step is None:
+        return None
+    os.makedirs(trace_dir, exist_ok=True)
+
+    def _on_trace_ready(prof):
+        path = os.path.join(trace_dir, f'trace_step{prof.step_num}.json')
+        prof.export_chrome_trace(path)
+        print(f'Wrote profiler trace to {path}')
+
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    warmup = 1 if start_step >= 1 else 0
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=max(0, start_step - warmup), warmup=warmup, active=max(1, active_steps), repeat=1),
+        on_trace_ready=_on_trace_ready,
+        record_shapes=True,
+        with_stack=False,
+    )
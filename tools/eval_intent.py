@@ -1,12 +1,25 @@
 import os
+import sys
 import json
+import time
+import subprocess
+import hashlib
+import argparse
 import joblib
+import numpy as np
 import pandas as pd
+from sklearn.base import clone
 from sklearn.model_selection import StratifiedKFold, cross_validate
-from sklearn.metrics import classification_report, accuracy_score
+from sklearn.metrics import classification_report, accuracy_score, f1_score
 
 CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'transformers', 'dataset_pertanyaan_wedding.csv')
 MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'intent_tfidf_logreg.joblib')
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'models', 'feature_cache')
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'intent_cv_results.json')
+BENCH_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'intent_bench_results.json')
+AI_VERCEL = os.path.join(os.path.dirname(__file__), '..', 'ai-vercel')
+TRANSFORMER_DIR = os.path.join(os.path.dirname(__file__), '..', 'models', 'local_transformer_intent')
+BENCH_TARGETS = ('joblib', 'ai_stub', 'transformer')
 
 
 def load_data(path):
@@ -17,14 +30,266 @@ def load_data(path):
     return df
 
 
+def classifier_grid(base_clf=None):
+    """Named classifiers evaluated on the same cached fold features."""
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+    from sklearn.naive_bayes import ComplementNB
+    from sklearn.svm import LinearSVC
+    grid = {
+        'logreg_C0.3': LogisticRegression(max_iter=1000, solver='saga', C=0.3),
+        'logreg_C1': LogisticRegression(max_iter=1000, solver='saga', C=1.0),
+        'logreg_C3': LogisticRegression(max_iter=1000, solver='saga', C=3.0),
+        'linear_svc': LinearSVC(C=1.0),
+        'complement_nb': ComplementNB(alpha=0.3),
+        'sgd_log': SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42),
+    }
+    if base_clf is not None:
+        grid = dict({'saved_model': clone(base_clf)}, **grid)
+    return grid
+
+
+class FoldFeatureCache:
+    """Vectorizer output per CV fold, memoized in-process and on disk as .npz.
+
+    The key covers the data, the vectorizer parameters and the fold split,
+    so the n-gram extraction runs once per fold no matter how many
+    classifiers are evaluated or how often the script is rerun.
+    """
+
+    def __init__(self, cache_dir, vectorizer, X, y, cv):
+        self.cache_dir = cache_dir
+        self.vectorizer = vectorizer
+        self.X = X
+        self.y = y
+        self.splits = list(cv.split(X, y))
+        h = hashlib.sha1()
+        h.update(json.dumps(sorted((k, repr(v)) for k, v in vectorizer.get_params().items())).encode('utf-8'))
+        h.update(repr(cv).encode('utf-8'))
+        for t, lbl in zip(X, y):
+            h.update(t.encode('utf-8') + b'\0' + lbl.encode('utf-8') + b'\n')
+        self.key = h.hexdigest()[:16]
+        self._mem = {}
+        self.hits = 0
+        self.misses = 0
+        self.vectorize_s = 0.0
+        self.cold_vectorize_s = self._load_meta().get('cold_vectorize_s', {})
+
+    def _path(self, fold, part):
+        return os.path.join(self.cache_dir, f'{self.key}_fold{fold}_{part}.npz')
+
+    def _meta_path(self):
+        return os.path.join(self.cache_dir, f'{self.key}_meta.json')
+
+    def _load_meta(self):
+        try:
+            with open(self._meta_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, fold):
+        from scipy import sparse
+        if fold in self._mem:
+            return self._mem[fold]
+        tr, te = self.splits[fold]
+        p_tr, p_te = self._path(fold, 'train'), self._path(fold, 'test')
+        if os.path.exists(p_tr) and os.path.exists(p_te):
+            Xtr, Xte = sparse.load_npz(p_tr), sparse.load_npz(p_te)
+            self.hits += 1
+        else:
+            t0 = time.perf_counter()
+            vec = clone(self.vectorizer)
+            Xtr = vec.fit_transform(self.X[tr])
+            Xte = vec.transform(self.X[te])
+            el = time.perf_counter() - t0
+            self.vectorize_s += el
+            self.cold_vectorize_s[str(fold)] = el
+            self.misses += 1
+            os.makedirs(self.cache_dir, exist_ok=True)
+            sparse.save_npz(p_tr, Xtr.tocsr())
+            sparse.save_npz(p_te, Xte.tocsr())
+            with open(self._meta_path(), 'w', encoding='utf-8') as f:
+                json.dump({'cold_vectorize_s': self.cold_vectorize_s, 'params': {k: repr(v) for k, v in self.vectorizer.get_params().items()}}, f, indent=2)
+        out = (Xtr, Xte, self.y[tr], self.y[te])
+        self._mem[fold] = out
+        return out
+
+
+def _fit_score(name, clf, fold, Xtr, Xte, ytr, yte):
+    t0 = time.perf_counter()
+    clf = clone(clf).fit(Xtr, ytr)
+    fit_s = time.perf_counter() - t0
+    pred = clf.predict(Xte)
+    return name, fold, accuracy_score(yte, pred), f1_score(yte, pred, average='macro'), fit_s
+
+
+def evaluate_grid(cache, grid, n_jobs=-1, backend='loky'):
+    """Cross-validate every classifier in `grid` on the cached fold features."""
+    from joblib import Parallel, delayed
+    folds = {i: cache.get(i) for i in range(len(cache.splits))}
+    tasks = [(name, clf, i) for name, clf in grid.items() for i in folds]
+    t0 = time.perf_counter()
+    if backend == 'sequential':
+        out = [_fit_score(name, clf, i, *folds[i]) for name, clf, i in tasks]
+    else:
+        out = Parallel(n_jobs=n_jobs, backend=backend)(delayed(_fit_score)(name, clf, i, *folds[i]) for name, clf, i in tasks)
+    wall = time.perf_counter() - t0
+    per = {}
+    for name, fold, acc, f1, fit_s in out:
+        r = per.setdefault(name, {'acc': [], 'f1': [], 'fit_s': 0.0})
+        r['acc'].append(acc)
+        r['f1'].append(f1)
+        r['fit_s'] += fit_s
+    results = {}
+    for name, r in per.items():
+        accs, f1s = np.array(r['acc']), np.array(r['f1'])
+        results[name] = {
+            'cv_accuracy_mean': float(accs.mean()),
+            'cv_accuracy_std': float(accs.std()),
+            'cv_f1_macro_mean': float(f1s.mean()),
+            'cv_f1_macro_std': float(f1s.std()),
+            'cv_accuracy_folds': [float(x) for x in accs],
+            'cv_f1_macro_folds': [float(x) for x in f1s],
+            'fit_s_total': r['fit_s'],
+        }
+    return results, wall
+
+
+def _rss_mb():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB on Linux
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _percentiles(values, qs=(50, 95, 99)):
+    arr = np.asarray(values, dtype=float)
+    return {f'p{q}': float(np.percentile(arr, q)) for q in qs} if len(arr) else {}
+
+
+def _load_target(target, args):
+    """(predict_one, predict_many, to_label) for one benchmark target."""
+    if target == 'joblib':
+        m = joblib.load(args.model)
+        return (lambda t: m.predict([t])[0]), m.predict, (lambda r: r)
+    if target == 'ai_stub':
+        if AI_VERCEL not in sys.path:
+            sys.path.insert(0, os.path.abspath(AI_VERCEL))
+        from api import ai_stub
+        ai_stub.ensure_initialized(sync=True)
+        return ai_stub.predict, (lambda ts: [ai_stub.predict(t) for t in ts]), (lambda r: r['intent_pred'])
+    if target == 'transformer':
+        ts_path = os.path.abspath(os.path.join(AI_VERCEL, 'transformers_swp'))
+        if ts_path not in sys.path:
+            sys.path.insert(0, ts_path)
+        from local_transformer_intent import LocalIntentPipeline
+        pipe = LocalIntentPipeline(args.transformer_dir, device='cpu')
+        return pipe.predict, pipe.predict_batch, (lambda r: r['intent_pred'])
+    raise ValueError(f'unknown target {target}')
+
+
+def bench_worker(target, args):
+    """Runs in a fresh process so load time and peak RSS belong to one model."""
+    df = load_data(args.csv)
+    from sklearn.model_selection import train_test_split
+    _, X_test, _, y_test = train_test_split(df['text'].values, df['intent'].values, test_size=0.2, random_state=42, stratify=df['intent'].values)
+    texts = [str(t) for t in X_test]
+    baseline_rss = _rss_mb()
+    t0 = time.perf_counter()
+    predict_one, predict_many, to_label = _load_target(target, args)
+    load_s = time.perf_counter() - t0
+
+    predict_one(texts[0])  # warm-up
+    lat = []
+    queries = (texts * (args.n_queries // max(1, len(texts)) + 1))[:args.n_queries]
+    for t in queries:
+        t1 = time.perf_counter()
+        predict_one(t)
+        lat.append((time.perf_counter() - t1) * 1000.0)
+
+    throughput = {}
+    for bs in [int(b) for b in args.batch_sizes.split(',') if b]:
+        batch = (texts * (bs // max(1, len(texts)) + 1))[:bs]
+        n = 0
+        t1 = time.perf_counter()
+        while time.perf_counter() - t1 < args.min_time:
+            predict_many(batch)
+            n += bs
+        throughput[str(bs)] = n / (time.perf_counter() - t1)
+
+    preds = [to_label(r) for r in predict_many(texts)]
+    return {
+        'target': target,
+        'accuracy': float(accuracy_score(y_test, preds)),
+        'f1_macro': float(f1_score(y_test, preds, average='macro')),
+        'load_s': load_s,
+        'latency_ms': dict(_percentiles(lat), mean=float(np.mean(lat))),
+        'throughput_qps': throughput,
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': _rss_mb(),
+        'model_rss_mb': _rss_mb() - baseline_rss,
+        'n_queries': len(lat),
+    }
+
+
+def run_benchmark(args):
+    """Benchmark each target in its own subprocess and write one JSON report."""
+    results = {'csv': os.path.abspath(args.csv), 'batch_sizes': args.batch_sizes, 'targets': {}}
+    for target in [t.strip() for t in args.targets.split(',') if t.strip()]:
+        print(f'Benchmarking {target}...')
+        cmd = [sys.executable, os.path.abspath(__file__), '--bench_worker', target, '--csv', args.csv, '--model', args.model,
+               '--transformer_dir', args.transformer_dir, '--batch_sizes', args.batch_sizes,
+               '--n_queries', str(args.n_queries), '--min_time', str(args.min_time)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        try:
+            res = json.loads(proc.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            tail = (proc.stderr or proc.stdout).strip().splitlines()
+            res = {'target': target, 'error': tail[-1] if tail else 'no output', 'returncode': proc.returncode}
+        results['targets'][target] = res
+        print(json.dumps(res))
+    with open(args.bench_out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print('\nSaved benchmark results to', args.bench_out)
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Evaluate the TF-IDF intent model and a classifier grid with cached fold features')
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--classifiers', default=None, help='comma-separated subset of the grid (default: all)')
+    parser.add_argument('--cache_dir', default=CACHE_DIR)
+    parser.add_argument('--no_cache', action='store_true', help='plain cross_validate of the saved pipeline (old behaviour)')
+    parser.add_argument('--n_jobs', type=int, default=-1)
+    parser.add_argument('--backend', choices=['loky', 'threading', 'multiprocessing', 'sequential'], default='loky',
+                        help='joblib backend for fold/classifier jobs')
+    parser.add_argument('--compare_uncached', action='store_true', help='also time full-pipeline cross_validate per classifier')
+    parser.add_argument('--out', default=RESULTS_PATH)
+    parser.add_argument('--benchmark', action='store_true', help='measure latency, throughput, load time and peak RSS instead of CV')
+    parser.add_argument('--targets', default=','.join(BENCH_TARGETS), help='benchmark targets: joblib, ai_stub, transformer')
+    parser.add_argument('--transformer_dir', default=TRANSFORMER_DIR)
+    parser.add_argument('--batch_sizes', default='1,8,32,128')
+    parser.add_argument('--n_queries', type=int, default=500, help='single-query latency samples')
+    parser.add_argument('--min_time', type=float, default=1.0, help='seconds per batched throughput measurement')
+    parser.add_argument('--bench_out', default=BENCH_PATH)
+    parser.add_argument('--bench_worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bench_worker:
+        print(json.dumps(bench_worker(args.bench_worker, args)))
+        return
+    if args.benchmark:
+        run_benchmark(args)
+        return
+
     print('Loading data...')
-    df = load_data(CSV_PATH)
+    df = load_data(args.csv)
     X = df['text'].values
     y = df['intent'].values
 
-    print('Loading model from', MODEL_PATH)
-    model = joblib.load(MODEL_PATH)
+    print('Loading model from', args.model)
+    model = joblib.load(args.model)
 
     # Show per-class report on a held-out test split (use 80/20 same split as before)
     from sklearn.model_selection import train_test_split
@@ -34,31 +299,76 @@ def main():
     print('\nPer-class classification report (test set):\n')
     print(classification_report(y_test, y_pred, digits=4))
 
-    # Run 5-fold stratified cross-validation for accuracy and macro F1
-    print('\nRunning 5-fold cross-validation (accuracy, f1_macro)...')
-    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-    scoring = ['accuracy', 'f1_macro']
-    scores = cross_validate(model, X, y, cv=cv, scoring=scoring, n_jobs=-1, return_train_score=False)
-    accs = scores['test_accuracy']
-    f1s = scores['test_f1_macro']
-
-    results = {
-        'cv_accuracy_mean': float(accs.mean()),
-        'cv_accuracy_std': float(accs.std()),
-        'cv_f1_macro_mean': float(f1s.mean()),
-        'cv_f1_macro_std': float(f1s.std()),
-        'cv_accuracy_folds': [float(x) for x in accs],
-        'cv_f1_macro_folds': [float(x) for x in f1s],
-    }
+    cv = StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=42)
+    if args.no_cache:
+        print(f'\nRunning {args.folds}-fold cross-validation (accuracy, f1_macro)...')
+        t0 = time.perf_counter()
+        scores = cross_validate(model, X, y, cv=cv, scoring=['accuracy', 'f1_macro'], n_jobs=args.n_jobs, return_train_score=False)
+        accs = scores['test_accuracy']
+        f1s = scores['test_f1_macro']
+        results = {
+            'cv_accuracy_mean': float(accs.mean()),
+            'cv_accuracy_std': float(accs.std()),
+            'cv_f1_macro_mean': float(f1s.mean()),
+            'cv_f1_macro_std': float(f1s.std()),
+            'cv_accuracy_folds': [float(x) for x in accs],
+            'cv_f1_macro_folds': [float(x) for x in f1s],
+            'timing': {'wall_s': time.perf_counter() - t0, 'cached': False},
+        }
+    else:
+        # everything before the classifier (tfidf, or hash + idf for stream-mode models)
+        vectorizer = model[:-1]
+        grid = classifier_grid(model.steps[-1][1])
+        if args.classifiers:
+            wanted = [c.strip() for c in args.classifiers.split(',') if c.strip()]
+            grid = {k: v for k, v in grid.items() if k in wanted or k == 'saved_model'}
+        cache = FoldFeatureCache(args.cache_dir, vectorizer, X, y, cv)
+        print(f'\nVectorizing {args.folds} folds (cache key {cache.key})...')
+        t0 = time.perf_counter()
+        for i in range(args.folds):
+            cache.get(i)
+        vec_wall = time.perf_counter() - t0
+        print(f'  {cache.misses} computed, {cache.hits} loaded from cache in {vec_wall:.2f}s')
+        print(f'Cross-validating {len(grid)} classifiers ({args.backend}, n_jobs={args.n_jobs})...')
+        grid_results, grid_wall = evaluate_grid(cache, grid, n_jobs=args.n_jobs, backend=args.backend)
+
+        cold = sum(cache.cold_vectorize_s.values())
+        fit_total = sum(r['fit_s_total'] for r in grid_results.values())
+        timing = {
+            'cached': True,
+            'cache_key': cache.key,
+            'cache_hits': cache.hits,
+            'cache_misses': cache.misses,
+            'vectorize_wall_s': vec_wall,
+            'grid_wall_s': grid_wall,
+            'wall_s': vec_wall + grid_wall,
+            # what the same grid costs when every classifier refits the vectorizer per fold
+            'uncached_estimate_s': cold * len(grid) + fit_total,
+            'classifier_fit_s_total': fit_total,
+        }
+        timing['saved_s_estimate'] = timing['uncached_estimate_s'] - timing['wall_s']
+        if args.compare_uncached:
+            from sklearn.pipeline import Pipeline
+            t1 = time.perf_counter()
+            for name, clf in grid.items():
+                pipe = Pipeline([('vec', clone(vectorizer)), ('clf', clone(clf))])
+                cross_validate(pipe, X, y, cv=cv, scoring=['accuracy', 'f1_macro'], n_jobs=args.n_jobs)
+            timing['uncached_measured_s'] = time.perf_counter() - t1
+            timing['saved_s_measured'] = timing['uncached_measured_s'] - timing['wall_s']
+
+        # top-level keys keep the previous intent_cv_results.json layout for the saved model
+        results = dict(grid_results.get('saved_model', {}))
+        results.pop('fit_s_total', None)
+        results['grid'] = grid_results
+        results['timing'] = timing
 
     print('\nCross-validation results:')
     print(json.dumps(results, indent=2))
 
     # Save results
-    outp = os.path.join(os.path.dirname(__file__), '..', 'models', 'intent_cv_results.json')
-    with open(outp, 'w', encoding='utf-8') as f:
+    with open(args.out, 'w', encoding='utf-8') as f:
         json.dump(results, f, ensure_ascii=False, indent=2)
-    print('\nSaved cross-validation results to', outp)
+    print('\nSaved cross-validation results to', args.out)
 
 if __name__ == '__main__':
     main()
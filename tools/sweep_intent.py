@@ -0,0 +1,250 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import itertools
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'transformers', 'dataset_pertanyaan_wedding.csv')
+OUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+TS_PATH = os.path.join(os.path.dirname(__file__), '..', 'ai-vercel', 'transformers_swp')
+
+# Default search spaces; override with --space space.json using the same shape.
+DEFAULT_SPACES = {
+    'transformer': {
+        'd_model': [128, 256],
+        'nhead': [4, 8],
+        'num_layers': [1, 2, 4],
+        'dim_feedforward': [256, 512],
+        'lr': [1e-4, 3e-4, 1e-3],
+        'batch_size': [32],
+    },
+    'tfidf': {
+        'ngram_range': [[1, 1], [1, 2], [1, 3]],
+        'max_features': [5000, 20000, 50000],
+        'C': [0.3, 1.0, 3.0, 10.0],
+    },
+}
+TRANSFORMER_ARCH_KEYS = ('d_model', 'nhead', 'num_layers', 'dim_feedforward', 'dropout')
+
+_worker_cpus = None
+
+
+def _pin_worker(slots):
+    """Pool initializer: claim a disjoint CPU set and size thread pools to it."""
+    global _worker_cpus
+    cpus = slots.get()
+    _worker_cpus = cpus
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (AttributeError, OSError):
+        pass
+    n = str(len(cpus))
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = n
+
+
+def expand_space(space, search='grid', n_trials=None, seed=42):
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if search == 'random':
+        rng = random.Random(seed)
+        rng.shuffle(grid)
+    if n_trials:
+        grid = grid[:n_trials]
+    # transformer needs d_model divisible by nhead
+    return [p for p in grid if 'nhead' not in p or p.get('d_model', 256) % p['nhead'] == 0]
+
+
+def _load_rows(csv_path):
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [(r['text'], r['intent']) for r in csv.DictReader(f) if r.get('text') and r.get('intent')]
+
+
+def _latency_ms(predict_one, texts, n=200):
+    texts = (texts * (n // max(1, len(texts)) + 1))[:n]
+    predict_one(texts[0])  # warm-up
+    t0 = time.perf_counter()
+    for t in texts:
+        predict_one(t)
+    return (time.perf_counter() - t0) * 1000.0 / len(texts)
+
+
+def run_tfidf_trial(trial_id, params, budget, csv_path, seed):
+    from sklearn.model_selection import train_test_split
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.metrics import accuracy_score
+    from threadpoolctl import threadpool_limits
+    import joblib
+
+    rows = _load_rows(csv_path)
+    X = [t for t, _ in rows]
+    y = [i for _, i in rows]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
+    # budget = fraction of the training split used at this rung
+    n_train = max(len(set(y_train)) * 2, int(len(X_train) * budget))
+    X_train, y_train = X_train[:n_train], y_train[:n_train]
+    threads = len(_worker_cpus) if _worker_cpus else 1
+    # multinomial saga ignores n_jobs (it only parallelizes one-vs-rest); the BLAS
+    # pools are the only threads, so cap those to the worker's CPU set
+    pipeline = Pipeline([
+        ('tfidf', TfidfVectorizer(ngram_range=tuple(params['ngram_range']), max_features=params['max_features'])),
+        ('clf', LogisticRegression(max_iter=1000, solver='saga', C=params['C'])),
+    ])
+    t0 = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        pipeline.fit(X_train, y_train)
+    fit_s = time.perf_counter() - t0
+    acc = accuracy_score(y_test, pipeline.predict(X_test))
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'model.joblib')
+        joblib.dump(pipeline, path)
+        size = os.path.getsize(path)
+    latency = _latency_ms(lambda t: pipeline.predict([t]), X_test)
+    return {'trial_id': trial_id, 'params': params, 'budget': budget, 'accuracy': float(acc),
+            'latency_ms_per_query': latency, 'model_bytes': size, 'fit_s': fit_s, 'cpus': list(_worker_cpus or [])}
+
+
+def run_transformer_trial(trial_id, params, budget, csv_path, seed):
+    if TS_PATH not in sys.path:
+        sys.path.insert(0, TS_PATH)
+    import torch
+    from local_transformer_intent import train_model, LocalIntentPipeline
+
+    threads = len(_worker_cpus) if _worker_cpus else 1
+    torch.set_num_threads(threads)
+    arch = {k: params[k] for k in TRANSFORMER_ARCH_KEYS if k in params}
+    with tempfile.TemporaryDirectory() as save_dir:
+        summary = train_model(csv_path, save_dir=save_dir, epochs=int(budget), batch_size=params.get('batch_size', 32),
+                              lr=params.get('lr', 3e-4), device='cpu', seed=seed, num_threads=threads,
+                              model_config=arch, metrics_path=os.path.join(save_dir, 'metrics.jsonl'))
+        size = sum(os.path.getsize(os.path.join(save_dir, f)) for f in ('model.pt', 'vocab.bin') if os.path.exists(os.path.join(save_dir, f)))
+        pipe = LocalIntentPipeline(save_dir, device='cpu')
+        texts = [t for t, _ in _load_rows(csv_path)[:200]]
+        latency = _latency_ms(pipe.predict, texts)
+    return {'trial_id': trial_id, 'params': params, 'budget': budget, 'accuracy': float(summary['best_val_acc']),
+            'latency_ms_per_query': latency, 'model_bytes': size, 'fit_s': summary['train_time_s'], 'cpus': list(_worker_cpus or [])}
+
+
+TRIAL_FNS = {'tfidf': run_tfidf_trial, 'transformer': run_transformer_trial}
+
+
+def successive_halving(model, configs, csv_path, n_procs, cpus_per_trial, min_budget, max_budget, eta, seed, log):
+    """Run every config at min_budget, keep the best 1/eta, repeat with eta x budget.
+
+    Trials in a rung run in parallel on a process pool whose workers are each
+    pinned to a disjoint set of `cpus_per_trial` CPUs.
+    """
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    n_procs = max(1, min(n_procs, len(available) // max(1, cpus_per_trial)))
+    ctx = mp.get_context('spawn')
+    fn = TRIAL_FNS[model]
+    survivors = list(enumerate(configs))
+    budget = min_budget
+    results = []
+    rung = 0
+    # the manager process serves the CPU-slot queue; shut it down with the pool
+    with ctx.Manager() as manager:
+        slots = manager.Queue()
+        for i in range(n_procs):
+            slots.put(available[i * cpus_per_trial:(i + 1) * cpus_per_trial] or available[:1])
+        with ProcessPoolExecutor(max_workers=n_procs, mp_context=ctx, initializer=_pin_worker, initargs=(slots,)) as pool:
+            while survivors:
+                futures = {pool.submit(fn, tid, params, budget, csv_path, seed): (tid, params) for tid, params in survivors}
+                rung_results = []
+                for fut, (tid, params) in futures.items():
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        res = {'trial_id': tid, 'params': params, 'budget': budget, 'accuracy': float('-inf'), 'error': repr(e)}
+                    res['rung'] = rung
+                    rung_results.append(res)
+                    log(res)
+                results.extend(rung_results)
+                if budget >= max_budget or len(survivors) == 1:
+                    break
+                rung_results.sort(key=lambda r: r['accuracy'], reverse=True)
+                keep = max(1, len(rung_results) // eta)
+                kept_ids = {r['trial_id'] for r in rung_results[:keep]}
+                survivors = [(tid, p) for tid, p in survivors if tid in kept_ids]
+                budget = round(min(max_budget, budget * eta), 4)
+                rung += 1
+    return results
+
+
+def leaderboard(results):
+    # best (highest-budget) result per trial, ranked by accuracy then latency
+    best = {}
+    for r in results:
+        cur = best.get(r['trial_id'])
+        if cur is None or (r['budget'], r.get('rung', 0)) > (cur['budget'], cur.get('rung', 0)):
+            best[r['trial_id']] = r
+    return sorted(best.values(), key=lambda r: (-r['accuracy'], r.get('latency_ms_per_query', float('inf'))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter sweep for the intent models')
+    parser.add_argument('--model', choices=sorted(TRIAL_FNS), default='tfidf')
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--space', default=None, help='JSON file mapping param -> list of values')
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--n_trials', type=int, default=None)
+    parser.add_argument('--n_procs', type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument('--cpus_per_trial', type=int, default=1)
+    parser.add_argument('--eta', type=int, default=3, help='successive halving keep ratio 1/eta')
+    parser.add_argument('--min_budget', type=float, default=None, help='epochs (transformer) or train fraction (tfidf) for the first rung')
+    parser.add_argument('--max_budget', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out_dir', default=None)
+    args = parser.parse_args()
+
+    space = DEFAULT_SPACES[args.model]
+    if args.space:
+        with open(args.space, encoding='utf-8') as f:
+            space = json.load(f)
+    configs = expand_space(space, args.search, args.n_trials, args.seed)
+    if args.model == 'transformer':
+        min_budget, max_budget = args.min_budget or 1, args.max_budget or 9
+    else:
+        min_budget, max_budget = args.min_budget or 0.1, args.max_budget or 1.0
+
+    out_dir = args.out_dir or os.path.join(OUT_DIR, f'sweep_{args.model}_{time.strftime("%Y%m%d_%H%M%S")}')
+    os.makedirs(out_dir, exist_ok=True)
+    trials_path = os.path.join(out_dir, 'trials.jsonl')
+    print(f'Sweeping {len(configs)} {args.model} configs on {args.n_procs} procs x {args.cpus_per_trial} cpus -> {out_dir}')
+
+    def log(res):
+        with open(trials_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(res) + '\n')
+        if 'error' in res:
+            print(f"[rung {res.get('rung', 0)}] trial {res['trial_id']} failed: {res['error']}")
+            return
+        print(f"[rung {res.get('rung', 0)}] trial {res['trial_id']} budget={res['budget']} acc={res['accuracy']:.4f} "
+              f"lat={res['latency_ms_per_query']:.2f}ms {res['params']}")
+
+    t0 = time.perf_counter()
+    results = successive_halving(args.model, configs, args.csv, args.n_procs, args.cpus_per_trial,
+                                 min_budget, max_budget, args.eta, args.seed, log)
+    board = leaderboard(results)
+    with open(os.path.join(out_dir, 'leaderboard.json'), 'w', encoding='utf-8') as f:
+        json.dump({'model': args.model, 'space': space, 'wall_s': time.perf_counter() - t0, 'leaderboard': board}, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(out_dir, 'leaderboard.csv'), 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['rank', 'trial_id', 'accuracy', 'latency_ms_per_query', 'model_bytes', 'budget', 'params'])
+        for i, r in enumerate(board, 1):
+            w.writerow([i, r['trial_id'], r['accuracy'], r.get('latency_ms_per_query'), r.get('model_bytes'), r['budget'], json.dumps(r['params'])])
+    print('\nTop 5:')
+    for r in board[:5]:
+        print(json.dumps({k: r.get(k) for k in ('trial_id', 'accuracy', 'latency_ms_per_query', 'model_bytes', 'params')}))
+    print('Saved leaderboard to', out_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,11 @@
 import os
+import sys
 import json
+import time
+import zlib
+import argparse
 import joblib
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -10,7 +15,9 @@ from sklearn.metrics import classification_report, accuracy_score
 
 CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'transformers', 'dataset_pertanyaan_wedding.csv')
 OUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
-os.makedirs(OUT_DIR, exist_ok=True)
+BATCH_MODEL = 'intent_tfidf_logreg.joblib'
+# separate file so a stream run never replaces the batch model; served through the manifest
+STREAM_MODEL = 'intent_hashing_sgd.joblib'
 
 def load_data(path):
     df = pd.read_csv(path)
@@ -23,16 +30,16 @@ def load_data(path):
     return df
 
 
-def main():
-    print('Loading dataset from', CSV_PATH)
-    df = load_data(CSV_PATH)
+def train_batch(args):
+    print('Loading dataset from', args.csv)
+    df = load_data(args.csv)
     print('Total samples:', len(df))
 
     X = df['text'].values
     y = df['intent'].values
 
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
+        X, y, test_size=args.test_size, random_state=42, stratify=y
     )
     print('Train samples:', len(X_train), 'Test samples:', len(X_test))
 
@@ -50,21 +57,203 @@ def main():
     report = classification_report(y_test, y_pred, output_dict=True)
 
     results = {
+        'mode': 'batch',
         'accuracy': acc,
         'report': report,
         'n_train': len(X_train),
         'n_test': len(X_test),
     }
 
-    model_path = os.path.join(OUT_DIR, 'intent_tfidf_logreg.joblib')
-    metrics_path = os.path.join(OUT_DIR, 'intent_metrics.json')
+    save(pipeline, results, args.out_dir)
+    print('Done. Accuracy:', acc)
+
+
+def save(pipeline, results, out_dir, model_name=BATCH_MODEL, metrics_name='intent_metrics.json'):
+    os.makedirs(out_dir, exist_ok=True)
+    model_path = os.path.join(out_dir, model_name)
+    metrics_path = os.path.join(out_dir, metrics_name)
     print('Saving model to', model_path)
-    joblib.dump(pipeline, model_path)
+    # write-then-rename so a running ai_stub never loads a half-written file
+    joblib.dump(pipeline, model_path + '.tmp')
+    os.replace(model_path + '.tmp', model_path)
     with open(metrics_path, 'w', encoding='utf-8') as f:
         json.dump(results, f, ensure_ascii=False, indent=2)
+    print('Saved metrics to', metrics_path)
+
+
+def publish(out_dir, model_name):
+    """Point the intent manifest at `model_name` so ai_stub and update_intent pick it up.
+
+    Logged retrieval rows and log offsets of the current version are kept.
+    """
+    from update_intent import read_manifest, write_manifest
+    manifest = read_manifest(out_dir) or {'version': 0, 'log_offsets': {}, 'retrieval_rows': 0}
+    version = manifest['version'] + 1
+    manifest.update({
+        'version': version,
+        'name': f'{os.path.splitext(model_name)[0]}_{time.strftime("%Y%m%d_%H%M%S")}',
+        'model': model_name,
+        'published': time.time(),
+    })
+    write_manifest(out_dir, manifest)
+    print('Published', manifest['name'], 'in the intent manifest')
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KiB on Linux
+        return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    except Exception:
+        return None
+
+
+def _iter_chunks(path, chunksize):
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=['text', 'intent']):
+        chunk = chunk.dropna()
+        yield chunk['text'].astype(str).values, chunk['intent'].astype(str).values
+
+
+def _is_test(texts, test_pct):
+    # deterministic hash split: a row lands in the same side on every pass
+    return np.fromiter((zlib.crc32(t.encode('utf-8')) % 100 < test_pct for t in texts), dtype=bool, count=len(texts))
+
 
+def _report_from_confusion(confusion):
+    # classification_report-shaped dict computed from (true, pred) counts
+    labels = sorted({t for t, _ in confusion} | {p for _, p in confusion})
+    report = {}
+    for lbl in labels:
+        tp = confusion.get((lbl, lbl), 0)
+        pred = sum(c for (t, p), c in confusion.items() if p == lbl)
+        support = sum(c for (t, p), c in confusion.items() if t == lbl)
+        prec = tp / pred if pred else 0.0
+        rec = tp / support if support else 0.0
+        f1 = 2 * prec * rec / (prec + rec) if prec + rec else 0.0
+        report[lbl] = {'precision': prec, 'recall': rec, 'f1-score': f1, 'support': support}
+    if labels:
+        report['macro avg'] = {k: sum(report[l][k] for l in labels) / len(labels) for k in ('precision', 'recall', 'f1-score')}
+    return report
+
+
+def train_stream(args):
+    """Out-of-core training: HashingVectorizer + SGDClassifier.partial_fit.
+
+    The CSV is read in chunks of --chunksize rows, so memory is bounded by one
+    chunk plus the n_features-sized idf/weight arrays, never by the file.
+    Pass 0 collects the label set and, with --idf, document frequencies for a
+    streaming idf estimate; then --epochs passes of partial_fit follow. A
+    stable ~20% hash split of the texts is held out for evaluation. The
+    model is written to STREAM_MODEL and published through the manifest.
+    """
+    from scipy import sparse
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+    from sklearn.linear_model import SGDClassifier
+
+    test_pct = int(round(args.test_size * 100))
+    hasher = HashingVectorizer(ngram_range=(1, 2), n_features=args.n_features, alternate_sign=False,
+                               norm=None if args.idf else 'l2')
+
+    print('Pass 0: scanning labels' + (' and document frequencies' if args.idf else ''), 'from', args.csv)
+    t0 = time.perf_counter()
+    classes = set()
+    df_counts = np.zeros(args.n_features, dtype=np.int64) if args.idf else None
+    n_docs = 0
+    for texts, intents in _iter_chunks(args.csv, args.chunksize):
+        classes.update(intents)
+        if args.idf:
+            train_texts = texts[~_is_test(texts, test_pct)]
+            X = hasher.transform(train_texts)
+            df_counts += np.bincount(X.indices, minlength=args.n_features)
+            n_docs += X.shape[0]
+    classes = np.array(sorted(classes))
+    print(f'  {len(classes)} classes, {time.perf_counter() - t0:.1f}s')
+
+    steps = [('hash', hasher)]
+    if args.idf:
+        idf = TfidfTransformer(norm='l2', use_idf=True, smooth_idf=True)
+        idf.fit(sparse.csr_matrix((1, args.n_features)))
+        # smooth idf exactly as TfidfTransformer computes it, from streamed counts
+        idf.idf_ = np.log((1 + n_docs) / (1 + df_counts)) + 1
+        steps.append(('idf', idf))
+    clf = SGDClassifier(loss='log_loss', alpha=args.alpha, random_state=42)
+    rng = np.random.RandomState(42)
+
+    n_seen = 0
+    t_train = time.perf_counter()
+    for epoch in range(args.epochs):
+        t_epoch = time.perf_counter()
+        rows = 0
+        for i, (texts, intents) in enumerate(_iter_chunks(args.csv, args.chunksize)):
+            keep = ~_is_test(texts, test_pct)
+            texts, intents = texts[keep], intents[keep]
+            if not len(texts):
+                continue
+            order = rng.permutation(len(texts))
+            X = hasher.transform(texts[order])
+            if args.idf:
+                X = idf.transform(X)
+            clf.partial_fit(X, intents[order], classes=classes)
+            rows += len(texts)
+            if (i + 1) % args.log_every == 0:
+                el = time.perf_counter() - t_epoch
+                print(f'  epoch {epoch + 1} chunk {i + 1}: {rows} rows, {rows / el:.0f} rows/s, peak RSS {_peak_rss_mb() or 0:.0f} MB')
+        n_seen += rows
+        el = time.perf_counter() - t_epoch
+        print(f'Epoch {epoch + 1}/{args.epochs}: {rows} rows in {el:.1f}s ({rows / el if el else 0:.0f} rows/s)')
+    train_s = time.perf_counter() - t_train
+    steps.append(('clf', clf))
+    pipeline = Pipeline(steps)
+
+    print('Evaluating on the held-out hash split...')
+    confusion = {}
+    n_test = 0
+    for texts, intents in _iter_chunks(args.csv, args.chunksize):
+        test = _is_test(texts, test_pct)
+        if not test.any():
+            continue
+        for t, p in zip(intents[test], pipeline.predict(texts[test])):
+            confusion[(t, p)] = confusion.get((t, p), 0) + 1
+        n_test += int(test.sum())
+    acc = sum(c for (t, p), c in confusion.items() if t == p) / max(1, n_test)
+    results = {
+        'mode': 'stream',
+        'accuracy': acc,
+        'report': _report_from_confusion(confusion),
+        'n_train': n_seen // max(1, args.epochs),
+        'n_test': n_test,
+        'n_features': args.n_features,
+        'idf': bool(args.idf),
+        'epochs': args.epochs,
+        'chunksize': args.chunksize,
+        'train_s': train_s,
+        'train_rows_per_s': n_seen / train_s if train_s else 0.0,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+    save(pipeline, results, args.out_dir, STREAM_MODEL, 'intent_hashing_sgd_metrics.json')
+    publish(args.out_dir, STREAM_MODEL)
     print('Done. Accuracy:', acc)
-    print('Saved metrics to', metrics_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the TF-IDF intent model used by ai_stub')
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--out_dir', default=OUT_DIR)
+    parser.add_argument('--mode', choices=['batch', 'stream'], default='batch',
+                        help='batch: in-memory TfidfVectorizer + LogisticRegression; stream: chunked HashingVectorizer + SGD partial_fit')
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--n_features', type=int, default=2 ** 20)
+    parser.add_argument('--idf', action='store_true', help='stream mode: estimate idf in a first pass')
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--alpha', type=float, default=1e-5)
+    parser.add_argument('--test_size', type=float, default=0.2)
+    parser.add_argument('--log_every', type=int, default=10, help='stream mode: progress line every N chunks')
+    args = parser.parse_args()
+    if args.mode == 'stream':
+        train_stream(args)
+    else:
+        train_batch(args)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,301 @@
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import random
+import hashlib
+import argparse
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'transformers', 'dataset_pertanyaan_wedding.csv')
+MODELS_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+MANIFEST_NAME = 'intent_manifest.json'
+VERSIONS_DIR = 'intent_versions'
+SLOT_KEYS = ('tema', 'lokasi', 'budget_min', 'budget_max', 'jumlah_tamu', 'tipe_acara', 'venue', 'waktu')
+# prediction paths (request log `source`) whose `model_prob` is a real class probability
+MODEL_SOURCES = ('sklearn_model', 'distilled_model', 'transformer')
+
+
+def read_manifest(models_dir):
+    path = os.path.join(models_dir, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(models_dir, manifest):
+    # readers either see the old manifest or the new one, never a partial file
+    path = os.path.join(models_dir, MANIFEST_NAME)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _open_log(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def iter_new_records(log_path, offset):
+    """(record, end_offset) for complete JSONL lines after byte `offset`.
+
+    Offsets of .gz files count uncompressed bytes.
+    """
+    with _open_log(log_path) as f:
+        f.seek(offset)
+        while True:
+            line = f.readline()
+            if not line or not line.endswith(b'\n'):
+                # a line still being written is picked up next run
+                return
+            offset += len(line)
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict):
+                yield rec, offset
+
+
+def fingerprint(path):
+    """Identity of a log file: inode plus a hash of its first complete line."""
+    head = None
+    try:
+        with _open_log(path) as f:
+            line = f.readline()
+        if line.endswith(b'\n'):
+            head = hashlib.sha1(line).hexdigest()
+    except (OSError, EOFError):
+        pass
+    return {'inode': os.stat(path).st_ino, 'head': head}
+
+
+def _same_file(fp, state):
+    if state.get('head') is None:
+        # nothing complete was in the file last time; only the inode identifies it
+        return state.get('inode') is not None and fp['inode'] == state['inode']
+    # compressing a rotated file changes its inode but not its first line
+    return fp['head'] == state['head']
+
+
+def log_files(log_path):
+    """Rotated siblings of `log_path` (api/request_log.py naming), oldest
+    first, then `log_path` itself if it exists."""
+    parent = os.path.dirname(log_path) or '.'
+    prefix = os.path.basename(log_path) + '.'
+    try:
+        names = [f for f in os.listdir(parent) if f.startswith(prefix) and not f.endswith('.tmp')]
+    except OSError:
+        names = []
+    # a plain file next to its .gz twin is still being compressed; the .gz is partial
+    names = [f for f in names if not (f.endswith('.gz') and f[:-3] in names)]
+    files = sorted((os.path.join(parent, f) for f in names), key=os.path.getmtime)
+    if os.path.exists(log_path):
+        files.append(log_path)
+    return files
+
+
+def pending_reads(log_path, state):
+    """(path, start_offset) still to read for one log.
+
+    `state` is what the last run stored for it ({'offset', 'inode', 'head'},
+    or a bare offset from older manifests). The file it describes is found
+    again by fingerprint, so rotation (rename + new file) is detected even
+    once the new file has grown past the old offset: the rotated file's tail
+    is drained from the stored offset and every newer file is read from 0.
+    """
+    files = log_files(log_path)
+    if isinstance(state, int):
+        # pre-fingerprint manifest: trust the offset only if the live file could still be the same
+        if files and files[-1] == log_path and os.path.getsize(log_path) >= state:
+            return [(log_path, state)]
+        return [(p, 0) for p in files]
+    if state:
+        for i in range(len(files) - 1, -1, -1):
+            if _same_file(fingerprint(files[i]), state):
+                return [(files[i], state.get('offset', 0))] + [(p, 0) for p in files[i + 1:]]
+    # first run, or the file we stopped in has since been pruned
+    return [(p, 0) for p in files]
+
+
+def label_of(rec, min_confidence):
+    """(label, source) for a logged request: human label first, else a
+    confident model prediction as pseudo-label, else (None, None).
+
+    Only records answered by a probabilistic model (`source` in
+    MODEL_SOURCES with a `model_prob`) are pseudo-labelled; rule, keyword
+    and dataset-match answers would only feed the heuristics back as labels.
+    """
+    for key in ('label', 'intent_gold'):
+        if rec.get(key):
+            return str(rec[key]), 'labelled'
+    pred = rec.get('intent') or rec.get('intent_pred')
+    prob = rec.get('model_prob')
+    if pred and rec.get('source') in MODEL_SOURCES and prob is not None and float(prob) >= min_confidence:
+        return str(pred), 'pseudo'
+    return None, None
+
+
+def text_hash(text):
+    return hashlib.sha1(text.strip().lower().encode('utf-8')).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally update the intent model and retrieval rows from request logs')
+    parser.add_argument('--logs', action='append', required=True,
+                        help='request log JSONL (repeatable), as written by api/request_log.py when the API runs with REQUEST_LOG=1 '
+                             '(off by default); only lines added since the last run are read, including rotated files')
+    parser.add_argument('--models_dir', default=MODELS_DIR)
+    parser.add_argument('--base_model', default=None, help='partial_fit-capable joblib pipeline to start from (default: current manifest version)')
+    parser.add_argument('--min_confidence', type=float, default=0.9, help='pseudo-label threshold for unlabelled requests')
+    parser.add_argument('--no_pseudo', action='store_true', help='only use human-labelled records')
+    parser.add_argument('--replay_csv', default=CSV_PATH, help='labelled rows mixed in to limit forgetting')
+    parser.add_argument('--replay_ratio', type=float, default=1.0, help='replayed rows per new row')
+    parser.add_argument('--passes', type=int, default=2)
+    parser.add_argument('--min_new', type=int, default=1, help='do not publish with fewer new rows than this')
+    parser.add_argument('--keep_versions', type=int, default=5)
+    args = parser.parse_args()
+    # only the update itself needs these; the log and offset helpers above import without them
+    import joblib
+    import numpy as np
+    import pandas as pd
+
+    t0 = time.perf_counter()
+    manifest = read_manifest(args.models_dir) or {'version': 0, 'log_offsets': {}, 'retrieval_rows': 0}
+    base_path = args.base_model or (manifest.get('model') and os.path.join(args.models_dir, manifest['model'])) \
+        or os.path.join(args.models_dir, 'intent_tfidf_logreg.joblib')
+    print('Loading base model from', base_path)
+    pipeline = joblib.load(base_path)
+    clf = pipeline.steps[-1][1]
+    if not hasattr(clf, 'partial_fit'):
+        sys.exit(f'{type(clf).__name__} has no partial_fit; train a streaming model first: python tools/train_intent.py --mode stream')
+    classes = set(str(c) for c in clf.classes_)
+    # hashing/idf front-ends are stateless at update time; only the classifier learns
+    features = pipeline[:-1]
+
+    # retrieval rows are cumulative; texts already in them were learned by an earlier version
+    prev_rows = manifest.get('retrieval_extra') and os.path.join(args.models_dir, manifest['retrieval_extra'])
+    prev_lines = []
+    if prev_rows and os.path.exists(prev_rows):
+        with open(prev_rows, encoding='utf-8') as f:
+            prev_lines = [line for line in f if line.strip()]
+    seen = set()
+    for line in prev_lines:
+        try:
+            seen.add(text_hash(json.loads(line).get('text') or ''))
+        except (ValueError, AttributeError):
+            continue
+
+    texts, labels, new_rows = [], [], []
+    stats = {'read': 0, 'labelled': 0, 'pseudo': 0, 'skipped_unlabelled': 0, 'skipped_unknown_class': 0, 'duplicates': 0}
+    offsets = dict(manifest.get('log_offsets', {}))
+    for log_path in args.logs:
+        key = os.path.abspath(log_path)
+        for path, start in pending_reads(log_path, offsets.get(key)):
+            state = dict(fingerprint(path), offset=start)
+            offsets[key] = state
+            for rec, end in iter_new_records(path, start):
+                state['offset'] = end
+                stats['read'] += 1
+                text = (rec.get('text') or '').strip()
+                label, source = label_of(rec, args.min_confidence)
+                if not text or label is None or (source == 'pseudo' and args.no_pseudo):
+                    stats['skipped_unlabelled'] += 1
+                    continue
+                if label not in classes:
+                    stats['skipped_unknown_class'] += 1
+                    continue
+                h = text_hash(text)
+                if h in seen:
+                    stats['duplicates'] += 1
+                    continue
+                seen.add(h)
+                stats[source] += 1
+                texts.append(text)
+                labels.append(label)
+                row = {'text': text, 'intent': label, 'source': source}
+                slots = rec.get('slots') or {}
+                for k in SLOT_KEYS:
+                    v = slots.get(k)
+                    if v not in (None, '', []):
+                        row[k] = v if not isinstance(v, list) else ', '.join(str(x) for x in v)
+                new_rows.append(row)
+    print('Read', json.dumps(stats))
+
+    if len(texts) < args.min_new:
+        print(f'Only {len(texts)} new rows (< --min_new {args.min_new}); nothing published')
+        return
+
+    train_texts, train_labels = list(texts), list(labels)
+    if args.replay_csv and os.path.exists(args.replay_csv) and args.replay_ratio > 0:
+        df = pd.read_csv(args.replay_csv, usecols=['text', 'intent']).dropna()
+        df = df[df['intent'].astype(str).isin(classes)]
+        n = min(len(df), int(len(texts) * args.replay_ratio))
+        if n:
+            sample = df.sample(n=n, random_state=manifest['version'])
+            train_texts += sample['text'].astype(str).tolist()
+            train_labels += sample['intent'].astype(str).tolist()
+
+    X = features.transform(train_texts)
+    y = np.asarray(train_labels)
+    rng = random.Random(manifest['version'])
+    idx = list(range(len(y)))
+    for _ in range(args.passes):
+        rng.shuffle(idx)
+        clf.partial_fit(X[idx], y[idx], classes=clf.classes_)
+
+    version = manifest['version'] + 1
+    vname = f'v{version:04d}_{time.strftime("%Y%m%d_%H%M%S")}'
+    vdir = os.path.join(args.models_dir, VERSIONS_DIR, vname)
+    os.makedirs(vdir, exist_ok=True)
+    joblib.dump(pipeline, os.path.join(vdir, 'model.joblib'))
+    # retrieval rows are cumulative: previous version's extra rows + this batch
+    rows_path = os.path.join(vdir, 'retrieval_extra.jsonl')
+    n_rows = 0
+    with open(rows_path, 'w', encoding='utf-8') as out:
+        for line in prev_lines:
+            out.write(line if line.endswith('\n') else line + '\n')
+            n_rows += 1
+        for row in new_rows:
+            out.write(json.dumps(row, ensure_ascii=False) + '\n')
+            n_rows += 1
+    meta = {
+        'version': version,
+        'name': vname,
+        'parent': manifest.get('name'),
+        'created': time.time(),
+        'new_rows': len(texts),
+        'replayed_rows': len(train_texts) - len(texts),
+        'stats': stats,
+        'update_s': time.perf_counter() - t0,
+    }
+    with open(os.path.join(vdir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    rel = os.path.relpath(vdir, args.models_dir)
+    write_manifest(args.models_dir, {
+        'version': version,
+        'name': vname,
+        'model': os.path.join(rel, 'model.joblib'),
+        'retrieval_extra': os.path.join(rel, 'retrieval_extra.jsonl'),
+        'retrieval_rows': n_rows,
+        'log_offsets': offsets,
+        'published': time.time(),
+    })
+    print(f'Published {vname}: {len(texts)} new rows ({stats["labelled"]} labelled, {stats["pseudo"]} pseudo), '
+          f'{n_rows} retrieval rows, {meta["update_s"]:.1f}s')
+
+    # prune old versions, never the one just published
+    vroot = os.path.join(args.models_dir, VERSIONS_DIR)
+    versions = sorted(d for d in os.listdir(vroot) if d.startswith('v'))
+    for old in versions[:-max(1, args.keep_versions)]:
+        shutil.rmtree(os.path.join(vroot, old), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()